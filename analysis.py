@@ -532,7 +532,10 @@ def rv(p, jd=None, e=None, reteanom=False, tol=1e-8):
         To compute the barycentric radial velocity of the host star,
         scale the returned values by the mass ratio -m/(m+M).
 
-        SEE ALSO: :func:`getobj`, :func:`rvstar`
+        If 'p' is a 2D array of elements (one planet per row), the
+        calculation is passed to :func:`rv_batch`.
+
+        SEE ALSO: :func:`getobj`, :func:`rvstar`, :func:`rv_batch`
     """
     # 2008-08-13 12:59 IJC: Created with help from Debra Fischer,
     #    Murray & Dermott, and Beauge et al. 2008 in "Extrasolar
@@ -543,6 +546,13 @@ def rv(p, jd=None, e=None, reteanom=False, tol=1e-8):
     # 2012-10-15 17:20 IJMC: First input can now be a list of
     #                        elements.  Added option to pass in
     #                        eccentric anomaly.
+    # 2026-10-16 14:10 IJMC: Kepler's equation now solved by the vectorized
+    #                        :func:`eccentricanomaly`; fixed undefined mean
+    #                        motion when 'e' is passed in.
+    # 2026-10-17 18:15 IJMC: 2D element arrays are passed to :func:`rv_batch`.
+
+    if np.ndim(p)==2:
+        return rv_batch(p, jd, e=e, reteanom=reteanom, tol=tol)
     
     jd = array(jd, copy=True, subok=True)
     if jd.shape==():  
@@ -582,14 +592,10 @@ def rv(p, jd=None, e=None, reteanom=False, tol=1e-8):
     if ecc > 1:
         ecc = 1. - tol
 
+    n = 2.*pi/per    # mean motion
     if e is None:
-        n = 2.*pi/per    # mean motion
         m = n*(jd - tau) # mean anomaly
-        e = []
-        for element in m: # compute eccentric anomaly
-            def kep(e): return element - e + ecc*sin(e)
-            e.append(optimize.brentq(kep, element-1, element+1,  xtol=tol, disp=False))
-            #e.append(optimize.newton(kep, 0, tol=tol))
+        e = eccentricanomaly(ecc, manom=m, tol=tol)
     else:
         pass
 
@@ -644,9 +650,18 @@ def rvstar(p, jd=None, e=None, reteanom=False, tol=1e-8):
           Positive radial velocities are directed _AWAY_ from the
           observer.
 
-        :SEE_ALSO: :func:`rv`, :func:`getobj`
+          If 'p' is a 2D array of elements (one planet per row), the
+          calculation is passed to :func:`rvstar_batch`.
+
+        :SEE_ALSO: :func:`rv`, :func:`getobj`, :func:`rvstar_batch`
     """
     # 2012-10-15 22:34 IJMC: Created from function 'rv'
+    # 2026-10-16 14:10 IJMC: Kepler's equation now solved by the vectorized
+    #                        :func:`eccentricanomaly`.
+    # 2026-10-17 18:15 IJMC: 2D element arrays are passed to :func:`rvstar_batch`.
+
+    if np.ndim(p)==2:
+        return rvstar_batch(p, jd, e=e, reteanom=reteanom, tol=tol)
 
     jd = array(jd, copy=True, subok=True)
     if jd.shape==():  
@@ -692,11 +707,7 @@ def rvstar(p, jd=None, e=None, reteanom=False, tol=1e-8):
     if e is None:
         n = 2.*pi/per    # mean motion
         m = n*(jd - tau) # mean anomaly
-        e = np.zeros(m.shape)
-        for ii,element in enumerate(m): # compute eccentric anomaly
-            def kep(e): return element - e + ecc*sin(e)
-            e[ii] = optimize.brentq(kep, element-1, element+1,  xtol=tol, disp=False)
-            #e.append(optimize.newton(kep, 0, tol=tol))
+        e = eccentricanomaly(ecc, manom=m, tol=tol)
     else:
         pass
 
@@ -717,6 +728,139 @@ def rvstar(p, jd=None, e=None, reteanom=False, tol=1e-8):
 
 
 
+def _rvelements(elements, tol=1e-8):
+    """Parse an (nplanet x 5 or 6) array of orbital elements for
+    :func:`rv_batch` and :func:`rvstar_batch`.
+
+    :RETURNS:
+      (per, t_peri, ecc, amplitude, long_peri, gamma), each an
+      (nplanet x 1) array (so they broadcast against an epoch
+      vector).  Eccentricities are forced into [0, 1).
+    """
+    # 2026-10-17 18:15 IJMC: Created
+    # 2026-10-17 21:15 IJMC: Also clip ecc == 1 (infinite sqrt(1-e^2)).
+    elements = np.array(elements, dtype=float, copy=True, ndmin=2)
+    if elements.ndim<>2 or elements.shape[1] not in (5, 6):
+        raise ValueError("Orbital elements must be an (nplanet x 5) or (nplanet x 6) array.")
+    if elements.shape[1]==5:
+        elements = np.hstack((elements, np.zeros((elements.shape[0], 1))))
+    elements[:,2] = np.abs(elements[:,2])
+    elements[elements[:,2] >= 1, 2] = 1. - tol
+    return [col.reshape(-1, 1) for col in elements.T]
+
+def rv_batch(elements, jd, e=None, reteanom=False, tol=1e-8):
+    """Compute unprojected astrocentric RVs (in m/s) of many planets
+    at many epochs at once.
+
+    :INPUTS:
+      elements : 2D NumPy array
+        (nplanet x 5 or 6) array; each row is [period, t_peri, ecc,
+        a, long_peri, gamma], as for :func:`rv` (long_peri in radians,
+        'a' in AU, gamma ignored).
+
+      jd : 1D NumPy array
+        Dates of observation (in same time system as t_peri).
+
+      e : None or 2D NumPy array
+        (nplanet x nepoch) eccentric anomalies (can be precomputed to
+        save time)
+
+      reteanom : bool
+        If True, also return the eccentric anomalies.
+
+    :RETURNS:
+      (nplanet x nepoch) array of radial velocities.
+
+    :NOTES:
+      Kepler's equation is solved for all planets and epochs in a
+      single call to :func:`eccentricanomaly`.  Unlike :func:`rv`,
+      there is no check on the range of 'jd'.
+
+    :SEE_ALSO: :func:`rv`, :func:`rvstar_batch`
+    """
+    # 2026-10-17 18:15 IJMC: Created
+    per, tau, ecc, a, omega, gamma = _rvelements(elements, tol=tol)
+    jd = np.array(jd, dtype=float, copy=False).ravel()
+
+    n = 2.*pi/per    # mean motion
+    if e is None:
+        e = eccentricanomaly(ecc, manom=n*(jd - tau), tol=tol)
+    else:
+        e = np.array(e, copy=False)
+
+    f = 2. * arctan(  sqrt((1+ecc)/(1.-ecc)) * tan(e/2.)  )
+    K = n * a / sqrt(1-ecc**2)
+    vzms = -K * ( cos(f+omega) + ecc*cos(omega) ) * AU/day
+
+    if reteanom:
+        ret = vzms, e
+    else:
+        ret = vzms
+    return ret
+
+def rvstar_batch(elements, jd, e=None, reteanom=False, tol=1e-8, sumplanets=False):
+    """Compute stellar radial velocities induced by many planets (or
+    candidate orbits) at many epochs at once.
+
+    :INPUTS:
+      elements : 2D NumPy array
+        (nplanet x 5 or 6) array; each row is [period, t_peri, ecc,
+        K, long_peri, gamma], as for :func:`rvstar` (long_peri in
+        degrees, gamma set to zero if omitted).
+
+      jd : 1D NumPy array
+        Dates of observation (in same time system as t_peri).
+
+      e : None or 2D NumPy array
+        (nplanet x nepoch) eccentric anomalies (can be precomputed to
+        save time)
+
+      reteanom : bool
+        If True, also return the eccentric anomalies.
+
+      sumplanets : bool
+        If True, return the total stellar RV of a multi-planet system
+        (the sum over all rows, including each row's gamma -- so set
+        gamma for only one of them).
+
+    :RETURNS:
+      (nplanet x nepoch) array of radial velocities, or an
+      nepoch-vector if sumplanets is True.
+
+    :EXAMPLE:
+      ::
+
+        import analysis as an
+        # RV curves of 10^4 circular orbits spanning a grid in period:
+        jd = np.linspace(0, 100, 500)
+        per = np.logspace(0, 2, 10000)
+        grid = np.vstack((per, 0*per, 0*per, 1+0*per, 0*per)).T
+        models = an.rvstar_batch(grid, jd)
+
+    :SEE_ALSO: :func:`rvstar`, :func:`rv_batch`
+    """
+    # 2026-10-17 18:15 IJMC: Created
+    per, tau, ecc, k, omega, gamma = _rvelements(elements, tol=tol)
+    omega = omega * np.pi/180.
+    jd = np.array(jd, dtype=float, copy=False).ravel()
+
+    if e is None:
+        e = eccentricanomaly(ecc, manom=2.*pi/per*(jd - tau), tol=tol)
+    else:
+        e = np.array(e, copy=False)
+
+    f = 2. * arctan(  sqrt((1+ecc)/(1.-ecc)) * tan(e/2.)  )
+    vrstar = k * (np.cos(f + omega) + ecc*np.cos(omega)) + gamma
+    if sumplanets:
+        vrstar = vrstar.sum(0)
+
+    if reteanom:
+        ret = vrstar, e
+    else:
+        ret = vrstar
+    return ret
+
+
 def dopspec(starspec, planetspec, starrv, planetrv, disp, starphase=[], planetphase=[], wlscale=True):
     """ Generate combined time series spectra using planet and star
     models, planet and star RV profiles.
@@ -3024,7 +3168,7 @@ def fftfilter1d(vec, bandwidth, retfilter=False):
     return ret
 
 
-def stdres(data, bins=None, oversamp=None, dataindex=None):
+def stdres(data, bins=None, oversamp=None, dataindex=None, retbeta=False):
     """Compute the standard deviation in the residuals of a data
     series after average-binning by specified amounts.
 
@@ -3048,8 +3192,27 @@ def stdres(data, bins=None, oversamp=None, dataindex=None):
          be increasing intervals of dataindex (rather than the number
          of points to bin down by).
 
+      retbeta - bool
+         If True, also return the red-noise factor 'beta' for each
+         bin size: the ratio of the binned RMS to that expected for
+         white noise, sigma_1/sqrt(N) * sqrt(M/(M-1)), where sigma_1
+         is the unbinned RMS, N the number of points per bin and M
+         the number of bins (Winn et al. 2008, ApJ 683, 1076).
+
+    :RETURNS:
+      RMS of the binned data for each entry in 'bins' (or the tuple
+      (rms, beta) if retbeta is True).
+
+    :NOTES:
+      All bin sums are computed from the cumulative sum of the data,
+      so each bin size costs only O(ndata/binsize) work per shift (or
+      a binary search, for 'dataindex'); the full range
+      bins=arange(1, ndata/2) costs O(ndata log ndata) rather than
+      O(ndata^2).  Bins containing non-finite data are ignored when
+      'dataindex' is set, as are empty bins.
+
     :REQUIREMENTS:
-       :doc:`tools`, :doc:`numpy`
+       :doc:`numpy`
 
     :EXAMPLE:
       ::
@@ -3084,10 +3247,12 @@ def stdres(data, bins=None, oversamp=None, dataindex=None):
     # 2012-03-20 14:33 IJMC: Added oversamp option.
     # 2012-03-22 09:21 IJMC: Added dataindex option.
     # 2012-04-30 06:50 IJMC: Changed calling syntax to errxy.
+    # 2026-10-17 18:40 IJMC: Rewritten with cumulative sums (no more
+    #                        binarray/errxy loops); added retbeta option.
+    #                        Uniform-index mode now averages (rather than
+    #                        sums) the binned data, as in 'dataindex' mode.
 
-    from tools import errxy
-    from numpy import isfinite
-
+    data = np.array(data, dtype=float, copy=False).ravel()
     ndata = data.size
     if bins is None:
         bins = arange(1, sqrt(int(ndata)))
@@ -3095,39 +3260,67 @@ def stdres(data, bins=None, oversamp=None, dataindex=None):
 
     nout = len(bins)
     if oversamp is None:
-        invoversamp = 1
         oversamp = 1
-    else:
-        invoversamp = 1./oversamp
+    oversamp = int(oversamp)
+
+    def maskedstd(vals, valid):
+        # Standard deviation along each row, of the 'valid' elements only:
+        nvalid = valid.sum(1)
+        vals = np.where(valid, vals, 0.)
+        mu = vals.sum(1) / nvalid
+        return np.sqrt((np.where(valid, vals - mu.reshape(-1, 1), 0.)**2).sum(1) / nvalid)
 
     ret = zeros(nout, dtype=float)
+    expected = zeros(nout, dtype=float)
+    olderr = np.seterr(divide='ignore', invalid='ignore')
     if dataindex is None:
+        sigma1 = data.std()
+        cumdata = np.concatenate(([0.], np.cumsum(data - data.mean())))
         for jj, binfactor in enumerate(bins):
+            binfactor = int(binfactor)
             if binfactor > 0:
-                sample_shifts = arange(0., binfactor, binfactor * invoversamp).astype(int)
-                for kk in range(oversamp):
-                    ret[jj] += binarray(data[sample_shifts[kk]::], binfactor).std()
-
+                sample_shifts = arange(0., binfactor, float(binfactor) / oversamp).astype(int)[0:oversamp]
+                nbin = (ndata - sample_shifts) / binfactor
+                edges = sample_shifts.reshape(-1, 1) + binfactor * arange(nbin.max() + 1)
+                valid = arange(nbin.max()) < nbin.reshape(-1, 1)
+                binmeans = np.diff(cumdata[np.minimum(edges, ndata)], axis=1) / binfactor
+                ret[jj] = maskedstd(binmeans, valid).sum()
+                expected[jj] = (sigma1 / np.sqrt(binfactor) * np.sqrt(nbin / (nbin - 1.))).sum()
             else:
-                ret[jj] = data.std()*oversamp
+                ret[jj] = sigma1 * oversamp
+                expected[jj] = sigma1 * oversamp
 
     else:
+        order = np.argsort(dataindex, kind='mergesort')
+        dataindex = np.array(dataindex, dtype=float, copy=False).ravel()[order]
+        data = data[order]
+        finite = np.isfinite(data)
+        sigma1 = data[finite].std()
+        cumdata = np.concatenate(([0.], np.cumsum(np.where(finite, data - data[finite].mean(), 0.))))
+        cumfinite = np.concatenate(([0], np.cumsum(finite)))
         startval = dataindex.min()
         endval  = dataindex.max()
-
         for jj, binwidth in enumerate(bins):
             if binwidth > 0:
                 thesebins = arange(startval, endval+binwidth, binwidth) - binwidth/2.
-                for kk in range(oversamp):
-                    di2,d2,edi2,ed2 = errxy(dataindex, data, thesebins + binwidth*kk/oversamp, xerr=None, yerr=None, xmode=None,ymode='mean')
-                    if isfinite(d2).all():
-                        ret[jj] += d2.std()
-                    else:
-                        ret[jj] += d2[isfinite(d2)].std()
+                edges = thesebins + (binwidth * arange(oversamp) / oversamp).reshape(-1, 1)
+                # Bins are (left, right], as in :func:`tools.errxy`:
+                ind = np.searchsorted(dataindex, edges, side='right')
+                npts = np.diff(ind, axis=1)
+                valid = (npts > 0) * (np.diff(cumfinite[ind], axis=1)==npts)
+                binmeans = np.diff(cumdata[ind], axis=1) / np.maximum(npts, 1)
+                ret[jj] = maskedstd(binmeans, valid).sum()
+                nbin = valid.sum(1)
+                nper = np.where(valid, npts, 0).sum(1) / (1. * nbin)
+                expected[jj] = (sigma1 / np.sqrt(nper) * np.sqrt(nbin / (nbin - 1.))).sum()
             else:
-                ret[jj] = data.std()*oversamp
+                ret[jj] = sigma1 * oversamp
+                expected[jj] = sigma1 * oversamp
 
+    np.seterr(**olderr)
     ret /= oversamp
+    if retbeta:
+        ret = ret, ret / (expected / oversamp)
     return ret
          
 
@@ -3154,13 +3347,13 @@ def allanvariance(data, dt=1):
 
     return (alvar*0.5)
     
-def trueanomaly(ecc, eanom=None, manom=None):
+def trueanomaly(ecc, eanom=None, manom=None, tol=1e-8):
     """Calculate (Keplerian, orbital) true anomaly.
 
     One optional input must be given.
 
     :INPUT:
-       ecc -- scalar.  orbital eccentricity.
+       ecc -- scalar or Numpy array.  orbital eccentricity.
 
     :OPTIONAL_INPUTS:
        eanom -- scalar or Numpy array.  Eccentric anomaly.  See
@@ -3168,11 +3361,15 @@ def trueanomaly(ecc, eanom=None, manom=None):
 
        manom -- scalar or sequence.  Mean anomaly, equal to 
                 2*pi*(t - t0)/period
+
+       tol -- scalar.  Convergence tolerance for Kepler's equation
+              (only used with manom).
     """
     # 2011-04-22 14:35 IJC: Created
+    # 2026-10-16 14:10 IJMC: Added 'tol' option.
 
     if manom is not None:
-        eanom = eccentricanomaly(ecc, manom=manom)
+        eanom = eccentricanomaly(ecc, manom=manom, tol=tol)
 
     if eanom is not None:
         ret = 2. * np.arctan(  np.sqrt((1+ecc)/(1.-ecc)) * np.tan(eanom/2.)  )
@@ -3181,13 +3378,14 @@ def trueanomaly(ecc, eanom=None, manom=None):
 
     return ret
 
-def eccentricanomaly(ecc, manom=None, tanom=None, tol=1e-8):
+def eccentricanomaly(ecc, manom=None, tanom=None, tol=1e-8, maxiter=100):
     """Calculate (Keplerian, orbital) eccentric anomaly.
 
     One optional input must be given.
 
     :INPUT:
-       ecc -- scalar.  orbital eccentricity.
+       ecc -- scalar or Numpy array.  orbital eccentricity.  If an
+              array, it must broadcast against manom (or tanom).
 
     :OPTIONAL_INPUTS:
 
@@ -3196,26 +3394,54 @@ def eccentricanomaly(ecc, manom=None, tanom=None, tol=1e-8):
 
        tanom -- scalar or Numpy array.  True anomaly.  See
                :func:`trueanomaly`.
+
+       tol -- scalar.  Convergence tolerance (in radians) when solving
+              Kepler's equation.
+
+       maxiter -- int.  Maximum number of iterations.
+
+    :NOTES:
+       Kepler's equation is solved for all elements at once using
+       Halley's method, starting from the guess of Danby (1988):
+       E0 = M + 0.85*e*sign(sin M).  Elements drop out of the
+       iteration as soon as they converge; this typically takes no
+       more than 3-4 iterations, even for eccentricities near unity.
     """
     # 2011-04-22 14:35 IJC: Created
-
-    
+    # 2026-10-16 14:10 IJMC: Vectorized: Halley's method with a convergence
+    #                        mask replaces the element-by-element loop.
 
     ret = None
     if manom is not None:
-        if not hasattr(manom, '__iter__'):
-            mwasscalar = True
-            manom = [manom]
-        else:
-            mwasscalar = False
-        # Solve Kepler's equation for each element of mean anomaly:
-        e = np.zeros(len(manom)) # Initialize eccentric anomaly
-        for ii,element in enumerate(manom):
-            def kep(e): return element - e + ecc*sin(e)
-            e[ii] = optimize.newton(kep, 0., tol=tol)
-
+        manom = np.array(manom, dtype=float, copy=False)
+        ecc = np.array(ecc, dtype=float, copy=False)
+        mwasscalar = manom.ndim==0 and ecc.ndim==0
+        outshape = np.broadcast(manom, ecc).shape
+        manom, ecc = [np.array(val, dtype=float).ravel() for val in \
+                          np.broadcast_arrays(manom, ecc)]
+
+        # Reduce mean anomaly to [-pi, pi), and start from a good guess:
+        mred = (manom + np.pi) % (2*np.pi) - np.pi
+        e = mred + 0.85 * ecc * np.sign(np.sin(mred))
+
+        # Solve Kepler's equation for all elements of mean anomaly:
+        active = np.arange(e.size)
+        niter = 0
+        while active.size > 0 and niter < maxiter:
+            ea, ecca = e[active], ecc[active]
+            esine = ecca * np.sin(ea)
+            f0 = ea - esine - mred[active]
+            f1 = 1. - ecca * np.cos(ea)
+            de = -f0 / (f1 - 0.5 * f0 * esine / f1)
+            e[active] = ea + de
+            active = active[np.abs(de) > tol]
+            niter += 1
+
+        e += (manom - mred)
         if mwasscalar:
             e = e[0]
+        else:
+            e = e.reshape(outshape)
         ret = e
     
     elif tanom is not None:
@@ -3443,6 +3669,36 @@ def generic_mcmc(*arg, **kw):
                     each pair of values passed, we set the parameters
                     values so: allparams[pair[1]] = allparams[pair[0]]
 
+        nchain : int
+                Number of independent chains to run in lockstep.  If
+                "params" is 2D (nchain x npar), each row is the
+                starting point of one chain.  If "params" is 1D and
+                nchain>1, each chain starts one random step away from
+                "params".
+
+        batch : bool
+                Only used when running multiple chains.  If True,
+                "func" (or each of the multiple functions) accepts a
+                2D (nchain x npar) array of parameters and returns a
+                stack of nchain models, so that all chains are
+                evaluated in a single call per step.  If False, "func"
+                is called once per chain.
+
+        adapt : None or int
+                If an int, use adaptive Metropolis proposals (Haario
+                et al. 2001) for the first 'adapt' iterations: the
+                covariance of the chain so far (of the free
+                parameters, i.e. not held fixed or set by
+                'jointpars') is accumulated as the chain runs, and
+                once enough steps have been taken proposals are drawn
+                from (2.38^2/nfree) times that covariance.  After
+                'adapt' iterations the proposal covariance is frozen,
+                so only the steps after that form a proper Markov
+                chain; treat the first 'adapt' steps as burn-in.  The
+                input 'stepsize' is used until adaptation begins.
+                This replaces the separate tuning runs of
+                :func:`scale_mcmc_stepsize`.
+
     :OUTPUTS:
         allparams : 2D array
                 Contains all parameters at each step
@@ -3452,10 +3708,17 @@ def generic_mcmc(*arg, **kw):
                 Number of accepted steps
         chisq: 1D array
                 Chi-squared value at each step
+
+        When running multiple chains, 'allparams' is instead a 3D
+        array of shape (nchain x nout x npar) -- suitable for passing
+        directly to :func:`tools.gelman_rubin` -- 'numaccept' is an
+        nchain-vector, and 'chisq' is 2D (nchain x nout).  'bestp'
+        is the best parameter set found by any chain.
     
     :REFERENCES:
         Numerical Recipes, 3rd Edition (Section 15.8)
         Wikipedia
+        Haario, Saksman & Tamminen 2001, Bernoulli, 7, 223 (for 'adapt')
 
     :NOTES:
         If you need an efficient MCMC algorithm, you should be using
@@ -3469,12 +3732,15 @@ def generic_mcmc(*arg, **kw):
     # 2011-06-27 17:39 IJMC: Now link joint parameters for initial chisq. 
     # 2011-09-16 13:31 IJMC: Fixed bug for nextp when nfits==1
     # 2011-11-02 22:08 IJMC: Now cast numit as an int
+    # 2026-10-17 17:05 IJMC: Added multi-chain ('nchain', 'batch') mode.
+    # 2026-10-17 17:30 IJMC: Added adaptive-covariance ('adapt') option.
 
     import numpy as np
     
     # Parse keywords/optional inputs:
     defaults = dict(args=(), nstep=1, posdef=None, holdfixed=None, \
-                        jointpars=None, verbose=False)
+                        jointpars=None, verbose=False, nchain=1, batch=False, \
+                        adapt=None)
     for key in defaults:
         if (not kw.has_key(key)):
             kw[key] = defaults[key]
@@ -3492,6 +3758,8 @@ def generic_mcmc(*arg, **kw):
         stepsize = np.array(stepsize, copy=True)
         weights = 1./sigma**2
         nfits = 1
+        if kw['nchain']>1 or np.ndim(params)==2:
+            return _generic_mcmc_multi(params, [func], [stepsize], [z], [weights], [args], numit, kw)
 
     elif len(arg)==3:
         params, allargs, numit = arg[0:3]
@@ -3509,6 +3777,8 @@ def generic_mcmc(*arg, **kw):
             multiweights.append(1./these_args[3]**2)
             multiargs.append(args[ii])
             npars.append(stepsizes[-1].shape[0])
+        if kw['nchain']>1 or np.ndim(params)==2:
+            return _generic_mcmc_multi(params, funcs, stepsizes, zs, multiweights, multiargs, numit, kw)
     else:
         print "Must pass either 3 or 6 parameters as input."
         print "You passed %i." % len(arg)
@@ -3570,10 +3840,17 @@ def generic_mcmc(*arg, **kw):
     if verbose:
         print currchisq
 
+    if kw['adapt']:
+        if nfits==1:
+            stepsizes = [stepsize]
+        proposal = _adaptiveproposal(stepsizes, holdfixed, jointpars, verbose=verbose)
+
     #Run Metropolis-Hastings Monte Carlo algorithm 'numit' times
     for j in range(numit):
         #Take step in random direction for adjustable parameters
-        if nfits==1:
+        if kw['adapt'] and proposal.ready:
+            nextp = params + proposal.draw()
+        elif nfits==1:
             if len(stepsize.shape)==1:
                 nextp    = np.array([np.random.normal(params,stepsize)]).ravel()
             else:
@@ -3627,6 +3904,9 @@ def generic_mcmc(*arg, **kw):
                         bestp     = np.copy(params)
                         bestchisq = currchisq
 
+        if kw['adapt'] and j < kw['adapt']:
+            proposal.update(params)
+
         if (j%nstep)==0:
             allparams[:, j/nstep] = params
             allchi[j/nstep] = currchisq
@@ -3635,6 +3915,231 @@ def generic_mcmc(*arg, **kw):
 
 
 
+class _adaptiveproposal:
+    """Adaptive Metropolis proposal distribution for :func:`generic_mcmc`.
+
+    The mean and covariance of the free parameters are accumulated
+    with Welford's algorithm (generalized to blocks of samples, for
+    multiple chains); proposals are drawn from (2.38^2/nfree) times
+    that covariance, plus a small multiple of the initial step
+    variances to keep it positive definite.
+
+    :INPUTS:
+      stepsizes : sequence of 1D or 2D arrays
+        Initial step sizes (or covariance matrices) for each block of
+        parameters, as passed to :func:`generic_mcmc`.
+
+      holdfixed : None, boolean mask, or sequence of indices
+        parameters held fixed (these never move)
+
+      jointpars : None, or sequence of 2-tuples
+        parameters set equal to others (these never move independently)
+
+      verbose : bool
+        If True, report when the adapted covariance cannot be used.
+
+    Parameters with zero initial step size are also treated as fixed.
+    If no parameters are free, the proposal never becomes 'ready'.
+    """
+    # 2026-10-17 17:30 IJMC: Created
+    # 2026-10-17 20:10 IJMC: Zero step sizes now mean 'fixed'; guard
+    #                        against no free parameters; warn when
+    #                        the covariance can't be factored.
+
+    def __init__(self, stepsizes, holdfixed=None, jointpars=None, regularize=1e-6, verbose=False):
+        var0 = []
+        for stepsize in stepsizes:
+            if stepsize.ndim==1:
+                var0.append(stepsize**2)
+            else:
+                var0.append(np.diag(stepsize))
+        var0 = np.concatenate(var0)
+        npar = var0.size
+        free = np.ones(npar, dtype=bool)
+        if holdfixed is not None:
+            free[holdfixed] = False
+        if jointpars is not None:
+            for jp in jointpars:
+                free[jp[1]] = False
+        free *= var0 > 0
+        self.npar = npar
+        self.free = free.nonzero()[0]
+        self.nfree = self.free.size
+        self.minsamples = np.max([50, 10 * self.nfree])
+        self.scale = 2.38**2 / np.max([1, self.nfree])
+        self.verbose = verbose
+        self.warned = False
+        self.eps = regularize * var0[self.free]
+        self.count = 0
+        self.mean = np.zeros(self.nfree, dtype=float)
+        self.m2 = np.zeros((self.nfree, self.nfree), dtype=float)
+        self.ready = False
+        self.chol = None
+
+    def update(self, params):
+        """Add one parameter vector, or a 2D stack of them, to the
+        running mean and covariance."""
+        if self.nfree==0:
+            return
+        x = np.array(params, dtype=float, copy=False, ndmin=2)[:, self.free]
+        nb = x.shape[0]
+        bmean = x.mean(0)
+        resid = x - bmean
+        delta = bmean - self.mean
+        ntot = self.count + nb
+        self.mean += delta * nb / ntot
+        self.m2 += np.dot(resid.T, resid) + np.outer(delta, delta) * self.count * nb / ntot
+        self.count = ntot
+        if self.count >= self.minsamples:
+            cov = self.scale * (self.m2 / (self.count - 1.) + np.diag(self.eps))
+            try:
+                self.chol = np.linalg.cholesky(cov)
+                self.ready = True
+            except np.linalg.LinAlgError:
+                if self.verbose and not self.warned:
+                    print "Adaptive MCMC: sample covariance is not positive definite after %i samples; still using the input step sizes." % self.count
+                    self.warned = True
+
+    def draw(self, nchain=None):
+        """Draw one step (or 'nchain' steps) from the current proposal."""
+        if nchain is None:
+            steps = np.zeros(self.npar, dtype=float)
+            steps[self.free] = np.dot(self.chol, np.random.normal(0., 1., self.nfree))
+        else:
+            steps = np.zeros((nchain, self.npar), dtype=float)
+            steps[:, self.free] = np.dot(np.random.normal(0., 1., (nchain, self.nfree)), self.chol.T)
+        return steps
+
+
+def _generic_mcmc_multi(params, funcs, stepsizes, zs, weights, args, numit, kw):
+    """Lockstep multi-chain mode of :func:`generic_mcmc` (which see).
+
+    :INPUTS:
+      params : 1D or 2D (nchain x npar) array
+        starting parameters
+
+      funcs, stepsizes, zs, weights, args : sequences
+        one entry for each function being fit; 'weights' are
+        1/sigma^2.  Each function's parameters occupy consecutive
+        columns of 'params', in order.
+
+      numit : int
+        number of iterations to perform
+
+      kw : dict
+        keyword options passed to :func:`generic_mcmc`
+    """
+    # 2026-10-17 17:05 IJMC: Created
+
+    nstep = kw['nstep']
+    batch = kw['batch']
+    verbose = kw['verbose']
+    jointpars = kw['jointpars']
+
+    nfits = len(funcs)
+    npars = [stepsize.shape[0] for stepsize in stepsizes]
+    bounds = np.concatenate(([0], np.cumsum(npars)))
+    npar = bounds[-1]
+
+    def takesteps(nchain):
+        steps = np.zeros((nchain, npar), dtype=float)
+        for ii in xrange(nfits):
+            i0, i1 = bounds[ii], bounds[ii+1]
+            if stepsizes[ii].ndim==1:
+                steps[:, i0:i1] = np.random.normal(0., 1., (nchain, npars[ii])) * stepsizes[ii]
+            else:
+                steps[:, i0:i1] = np.random.multivariate_normal(np.zeros(npars[ii]), stepsizes[ii], nchain)
+        return steps
+
+    def allchisq(pp):
+        chisq = np.zeros(pp.shape[0], dtype=float)
+        for ii in xrange(nfits):
+            thesep = pp[:, bounds[ii]:bounds[ii+1]]
+            if batch:
+                zmodel = np.array(funcs[ii](thesep, *args[ii]), copy=False)
+            else:
+                zmodel = np.array([funcs[ii](thisp, *args[ii]) for thisp in thesep])
+            chisq += (((zmodel - zs[ii])**2) * weights[ii]).reshape(pp.shape[0], -1).sum(1)
+        return chisq
+
+    params = np.array(params, dtype=float, copy=True)
+    if params.ndim==1:
+        nchain = int(kw['nchain'])
+        original_params = params.copy()
+        params = params + takesteps(nchain)
+    else:
+        nchain = params.shape[0]
+        original_params = params[0].copy()
+
+    # Set indicated parameters to be positive definite, held fixed,
+    # and linked together:
+    posdef = kw['posdef']
+    if posdef=='all':
+        posdef = np.arange(npar)
+    elif posdef is None:
+        posdef = np.zeros(npar, dtype=bool)
+    else:
+        posdef = np.array(posdef)
+    holdfixed = kw['holdfixed']
+    if holdfixed is None:
+        holdfixed = np.zeros(npar, dtype=bool)
+    else:
+        holdfixed = np.array(holdfixed)
+
+    def constrain(pp):
+        pp[:, posdef] = np.abs(pp[:, posdef])
+        pp[:, holdfixed] = original_params[holdfixed]
+        if jointpars is not None:
+            for jp in jointpars:
+                pp[:, jp[1]] = pp[:, jp[0]]
+        return pp
+
+    params = constrain(params)
+
+    #Initial setup
+    numit = int(numit)
+    nout = numit/nstep
+    numaccept = np.zeros(nchain, dtype=int)
+    allparams = np.zeros((nchain, nout, npar), dtype=float)
+    allchi = np.zeros((nchain, nout), dtype=float)
+    currchisq = allchisq(params)
+    ibest = currchisq.argmin()
+    bestp, bestchisq = params[ibest].copy(), currchisq[ibest]
+
+    if verbose:
+        print currchisq
+
+    if kw['adapt']:
+        proposal = _adaptiveproposal(stepsizes, holdfixed, jointpars, verbose=verbose)
+
+    #Run all chains 'numit' times, in lockstep:
+    for j in xrange(numit):
+        if kw['adapt'] and proposal.ready:
+            nextp = constrain(params + proposal.draw(nchain))
+        else:
+            nextp = constrain(params + takesteps(nchain))
+        nextchisq = allchisq(nextp)
+
+        # Accept if (uniform deviate) <= exp(-0.5 * delta-chisq):
+        accept = np.log(np.random.uniform(0, 1, nchain)) <= 0.5 * (currchisq - nextchisq)
+        params[accept] = nextp[accept]
+        currchisq[accept] = nextchisq[accept]
+        numaccept += accept
+
+        ibest = currchisq.argmin()
+        if currchisq[ibest] < bestchisq:
+            bestp, bestchisq = params[ibest].copy(), currchisq[ibest]
+
+        if kw['adapt'] and j < kw['adapt']:
+            proposal.update(params)
+
+        if (j%nstep)==0 and j/nstep < nout:
+            allparams[:, j/nstep] = params
+            allchi[:, j/nstep] = currchisq
+
+    return allparams, bestp, numaccept, allchi
+
+
 def scale_mcmc_stepsize(accept, func, params, stepsize, z, sigma, numit=1000, scales=[0.1, 0.3, 1., 3., 10.], args=(), nstep=1, posdef=None, holdfixed=None, retall=False, jointpars=None):
     """Run :func:`generic_mcmc` and scale the input stepsize to match
     the desired input acceptance rate.
@@ -3654,6 +4159,10 @@ def scale_mcmc_stepsize(accept, func, params, stepsize, z, sigma, numit=1000, sc
 
     :REQUIREMENTS:
        :doc:`pylab` (for :func:`pylab.interp`)
+
+    :SEE_ALSO:
+       The 'adapt' option of :func:`generic_mcmc`, which tunes the
+       proposals during burn-in instead of in separate runs.
           """
     # 2011-06-13 16:06 IJMC: Created
 
@@ -3834,8 +4343,9 @@ def prayerbead(*arg, **kw):
                    (NOT YET IMPLEMENTED!)
 
       step -- int > 0
-                   Stepsize for permutation steps.  1 by default.
-                   (NOT YET IMPLEMENTED!)
+                   Stepsize for permutation steps.  1 by default.  If
+                   larger, only every step-th cyclic shift of the
+                   residuals is fit (shifts 0, step, 2*step, ...).
 
       verbose -- bool
                    Print various status lines to console.
@@ -3849,6 +4359,26 @@ def prayerbead(*arg, **kw):
       threads -- int
                    Number of threads to use (via multiprocessing.Pool)
 
+      chunksize -- int
+                   Number of consecutive shifts sent to a worker at a
+                   time (default: enough for ~4 chunks per thread).
+
+      warmstart -- bool
+                   If True (default), each fit in a chunk starts from
+                   the result of the previous shift; otherwise every
+                   fit starts from the best-fit parameters.
+
+    :RETURNS:
+      allfits -- 2D NumPy array of shape (nshift x nparam), where row
+                   'i' holds the parameters fit to the residuals
+                   cyclically shifted by i*step points (row 0 is the
+                   best fit to the unshifted data).
+
+    :NOTES:
+      The residuals, weights and best-fit model are placed in shared
+      memory once, and the worker processes receive only the indices
+      of the shifts they should fit -- so memory use grows only
+      linearly with the number of data points.
                    
     :EXAMPLE: 
       ::
@@ -3863,10 +4393,13 @@ def prayerbead(*arg, **kw):
     # 2012-09-17 14:08 IJMC: Fixed bug when shifting weights (thanks
     #                        to P. Cubillos)
     # 2014-05-01 20:52 IJMC: Now allow multiprocessing via 'threads' keyword!
+    # 2026-10-17 17:55 IJMC: Shared-memory arrays, chunked & warm-started
+    #                        fits, closed the Pool; implemented 'step'.
     
     #from kapteyn import kmpfit
     import phasecurves as pc
     from multiprocessing import Pool
+    from multiprocessing.sharedctypes import RawArray
 
     if kw.has_key('axis'):
         axis = kw['axis']
@@ -3883,10 +4416,20 @@ def prayerbead(*arg, **kw):
     else:
         verbose = None
 
-    if kw.has_key('step'):
-        step = kw.pop('step')
+    if kw.has_key('step') and kw['step'] is not None:
+        step = int(kw.pop('step'))
     else:
-        step = None
+        step = 1
+
+    if kw.has_key('chunksize'):
+        chunksize = kw.pop('chunksize')
+    else:
+        chunksize = None
+
+    if kw.has_key('warmstart'):
+        warmstart = kw.pop('warmstart')
+    else:
+        warmstart = True
 
     if kw.has_key('maxiter'):
         maxiter = kw.pop('maxiter')
@@ -3908,11 +4451,10 @@ def prayerbead(*arg, **kw):
     else:
         ftol = 1e-12
 
-    #pdb.set_trace()
     if kw.has_key('threads'):
-        pool = Pool(processes=kw['threads'])
+        threads = kw.pop('threads')
     else:
-        pool = None
+        threads = None
 
     guessparams = arg[0]
     modelfunction = arg[1]
@@ -3963,34 +4505,79 @@ def prayerbead(*arg, **kw):
     fitter_args = (modelfunction,) + helperargs + (data, weights, kw)
     fmin_fit = fmin(pc.errfunc, guessparams, args=fitter_args, full_output=True, disp=False, maxiter=maxiter, maxfun=maxfun)
     bestparams = np.array(fmin_fit[0], copy=True)
-    bestmodel = modelfunction(*((guessparams,) + helperargs))
-    residuals = data - bestmodel
-    allfits = np.zeros((ndata, nparam), dtype=float)
+    bestmodel = modelfunction(*((bestparams,) + helperargs))
+
+    # Put the (large) arrays into shared memory, once:
+    shared = dict(modelfunction=modelfunction, helperargs=helperargs, \
+                      bestparams=bestparams, maxiter=maxiter, maxfun=maxfun, \
+                      xtol=xtol, ftol=ftol, ndata=ndata, kw=kw, \
+                      verbose=verbose, warmstart=warmstart)
+    for key, val in [('bestmodel', bestmodel), ('residuals', data - bestmodel), \
+                         ('weights', weights)]:
+        val = np.array(val, dtype=float, copy=False).ravel()
+        shared[key] = RawArray('d', val.size)
+        np.frombuffer(shared[key])[:] = val
+
+    shifts = np.arange(step, ndata, step)
+    allfits = np.zeros((shifts.size + 1, nparam), dtype=float)
     allfits[0] = bestparams
     if verbose: print "Finished prayer bead step ",
 
-        
-    #pdb.set_trace()
-    if pool is None:
-        allfits[1:] = np.array(map(pb_helperfunction, [[ii, bestmodel, bestparams, residuals, weights, modelfunction, helperargs, maxiter, maxfun, xtol, ftol, ndata, kw, verbose] for ii in xrange(1, ndata)])) 
+    if chunksize is None:
+        chunksize = int(np.ceil(shifts.size / (4. * (threads or 1))))
+    chunksize = np.max([1, chunksize])
+    chunks = [shifts[ii:ii+chunksize] for ii in xrange(0, shifts.size, chunksize)]
+
+    if threads is None:
+        pb_initializer(shared)
+        fits = map(pb_helperfunction, chunks)
     else:
-        allfits[1:] = np.array(pool.map(pb_helperfunction, [[ii, bestmodel, bestparams, residuals, weights, modelfunction, helperargs, maxiter, maxfun, xtol, ftol, ndata, kw, verbose] for ii in xrange(1, ndata)])) 
+        pool = Pool(processes=threads, initializer=pb_initializer, initargs=(shared,))
+        try:
+            fits = pool.map(pb_helperfunction, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    _pb_shared.clear()
+
+    if shifts.size > 0:
+        allfits[1:] = np.concatenate(fits)
 
     return allfits
 
-def pb_helperfunction(inputs):
-    """Helper function for :func:`prayerbead`. Not for general use."""
+_pb_shared = dict()
+
+def pb_initializer(shared):
+    """Helper function for :func:`prayerbead`: store the shared inputs
+    (in each worker process).  Not for general use."""
+    # 2026-10-17 17:55 IJMC: Created
+    _pb_shared.clear()
+    _pb_shared.update(shared)
+    for key in ['bestmodel', 'residuals', 'weights']:
+        _pb_shared[key] = np.frombuffer(shared[key])
+
+def pb_helperfunction(shifts):
+    """Helper function for :func:`prayerbead`: fit the data for each
+    of a sequence of cyclic residual shifts. Not for general use."""
     # 2014-05-01 20:35 IJMC: Created
+    # 2026-10-17 17:55 IJMC: Now takes a chunk of shifts, and uses the
+    #                        inputs stored by :func:`pb_initializer`.
     import phasecurves as pc
 
-    index, bestmodel, bestparams, residuals, weights, modelfunction, helperargs, maxiter, maxfun, xtol, ftol, ndata, kw, verbose = inputs
-    shifteddata = bestmodel + np.concatenate((residuals[index::], residuals[0:index]))
-    shiftedweights = np.concatenate((weights[index::], weights[0:index]))
-    shifted_args = (modelfunction,) + helperargs + (shifteddata, shiftedweights, kw)
-
-    fmin_fit = fmin(pc.errfunc, bestparams, args=shifted_args, full_output=True, disp=False, maxiter=maxiter, maxfun=maxfun, xtol=xtol, ftol=ftol)
-    if verbose: print ("%i of %i." % (index+1, ndata)),
-    return fmin_fit[0]
+    sh = _pb_shared
+    fits = np.zeros((len(shifts), sh['bestparams'].size), dtype=float)
+    params = sh['bestparams']
+    for jj, index in enumerate(shifts):
+        shifteddata = sh['bestmodel'] + np.roll(sh['residuals'], -index)
+        shiftedweights = np.roll(sh['weights'], -index)
+        shifted_args = (sh['modelfunction'],) + sh['helperargs'] + (shifteddata, shiftedweights, sh['kw'])
+
+        fmin_fit = fmin(pc.errfunc, params, args=shifted_args, full_output=True, disp=False, maxiter=sh['maxiter'], maxfun=sh['maxfun'], xtol=sh['xtol'], ftol=sh['ftol'])
+        fits[jj] = fmin_fit[0]
+        if sh['warmstart']:
+            params = fits[jj]
+        if sh['verbose']: print ("%i of %i." % (index+1, sh['ndata'])),
+    return fits
 
 
 def morlet(scale, k, k0=6.0, retper=False, retcoi=False, retcdelta=False, retpsi0=False):   # From Wavelet.pro; still incomplete!
@@ -1022,6 +1022,79 @@ def lnprobfunc(*arg, **kw):
 
 
 
+def lnprobfunc_batch(*arg, **kw):
+    """Return natural logarithm of posterior probability (i.e.,
+    -chisq/2) for many parameter sets at once.
+
+    :INPUTS:
+       (fitparams, function, arg1, arg2, ... , depvar, weights)
+
+      OR:
+       
+       (fitparams, function, arg1, arg2, ... , depvar, weights, kw)
+
+      where 'fitparams' is of shape (N x Npar) and 'function' takes
+      the whole (N x Npar) array at once, returning N models (e.g.,
+      :func:`transit.modeltransit_general_batch`).  The
+      'gaussprior', 'ngaussprior', and 'uniformprior' keywords are
+      interpreted as in :func:`errfunc`.
+
+    :RETURNS:
+      N-vector of log-probabilities.  Non-finite values are returned
+      as -inf.
+
+    :NOTES:
+      This is suitable for samplers that evaluate an entire ensemble
+      in one call (e.g., emcee's 'vectorize=True' option).
+
+    :SEE ALSO:
+      :func:`lnprobfunc`, :func:`errfunc`
+    """
+    # 2026-10-16 10:45 IJMC: Created
+
+    params = np.array(arg[0], copy=False)
+    if params.ndim==1:
+        params = params.reshape(1, params.size)
+    nset = params.shape[0]
+
+    if isinstance(arg[-1], dict): 
+        # Surreptiously setting keyword arguments:
+        kw.update(arg[-1])
+        arg = arg[0:-1]
+
+    function = arg[1]
+    helperargs = arg[2:len(arg)-2]
+    depvar = arg[-2]
+    weights = arg[-1]
+
+    model = function(*((params,)+helperargs))
+    chisq = (weights * (model - depvar)**2).reshape(nset, -1).sum(1)
+
+    # Compute 1D and N-D gaussian, and uniform, prior penalties:
+    if kw.has_key('gaussprior') and kw['gaussprior'] is not None:
+        for ii, gprior in enumerate(kw['gaussprior']):
+            if gprior is not None:
+                chisq += ((params[:,ii] - gprior[0]) / gprior[1])**2
+
+    if kw.has_key('ngaussprior') and kw['ngaussprior'] is not None:
+        for triplet in kw['ngaussprior']:
+            if len(triplet)==3:
+                ind, mu, cov = triplet
+                dvec = params[:, ind] - mu
+                chisq += (np.dot(dvec, np.linalg.inv(cov)) * dvec).sum(1)
+
+    if kw.has_key('uniformprior') and kw['uniformprior'] is not None:
+        for ii, uprior in enumerate(kw['uniformprior']):
+            if uprior is not None:
+                outside = (params[:,ii] < uprior[0]) + (params[:,ii] > uprior[1])
+                chisq[outside] *= 1e9
+
+    ret = -0.5 * chisq
+    ret[np.logical_not(np.isfinite(ret))] = -np.inf
+
+    return ret
+
+
 def errfunc14xymult_cfix(*arg,**kw):
     """Generic function to give the chi-squared error on a generic function:
 
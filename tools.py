@@ -3922,6 +3922,60 @@ def gelman_rubin(chains, verbose=False):
     return R
 
 
+def autocorrtime(chains, c=5):
+    """Estimate the integrated autocorrelation time of MCMC chains.
+
+    :INPUTS:
+      chains : 3D NumPy array
+        N chains of L links for P parameters (e.g., the 'chain'
+        attribute of an emcee.sampler object), of shape NxLxP.
+
+      c : scalar
+        Window factor: the autocorrelation function is summed out to
+        the smallest lag M with M >= c * tau(M).
+
+    :OUTPUTS:
+      P-vector of autocorrelation times, in units of links.  A common
+      rule of thumb is that the chains should be at least ~50 times
+      longer than this.
+
+    :NOTES:
+      The normalized autocorrelation function of each parameter is
+      computed by FFT for each chain, and averaged over chains before
+      summing (cf. Goodman & Weare 2010; Sokal 1997).
+
+    :SEE_ALSO:
+      :func:`gelman_rubin`
+      """
+    # 2026-10-17 16:10 IJMC: Created
+
+    chains = np.array(chains, copy=False)
+    if chains.ndim<>3 or 0 in chains.shape:
+        print "Must input a nonempty 3D array! Returning 9e99."
+        return np.array([9e99])
+
+    nchain, nlink, npar = chains.shape
+    nfft = 1
+    while nfft < 2*nlink:
+        nfft *= 2
+    resid = chains - chains.mean(axis=1).reshape(nchain, 1, npar)
+    fresid = np.fft.rfft(resid, n=nfft, axis=1)
+    acf = np.fft.irfft(fresid * fresid.conj(), n=nfft, axis=1)[:, 0:nlink, :]
+    acf0 = acf[:, 0:1, :]
+    acf0[acf0==0] = 1.
+    acf = (acf / acf0).mean(axis=0)
+
+    taus = 2. * np.cumsum(acf, axis=0) - 1.
+    tau = np.zeros(npar, float)
+    for ii in xrange(npar):
+        window = np.nonzero(np.arange(nlink) >= c * taus[:, ii])[0]
+        if window.size>0:
+            tau[ii] = taus[window[0], ii]
+        else:
+            tau[ii] = taus[-1, ii]
+    return tau
+
+
 def get_emcee_start(bestparams, variations, nwalkers, maxchisq, args, homein=True, retchisq=False, depth=np.inf):
     """Get starting positions for EmCee walkers.
 
@@ -8,11 +8,17 @@ The Mandel & Agol (2002) transit light curve equations.
 
    :func:`occultquad` -- quadratic limb-darkening
 
+   :func:`occultquad_batch` -- quadratic limb-darkening, for many
+                               planets at once.
+
    :func:`occultnonlin` -- full (4-parameter) nonlinear limb-darkening
 
    :func:`occultnonlin_small` -- small-planet approximation with full
                                  nonlinear limb-darkening.
 
+   :class:`occultgrid` -- precomputed, interpolated grid for fast
+                          quadratic or nonlinear light curves.
+
    :func:`t2z` -- convert dates to transiting z-parameter for circular
                   orbits.
 
@@ -66,16 +72,31 @@ import numpy as np
 from scipy import special, misc
 import pdb
 import os
+import threading
+from collections import OrderedDict
 
 eps = np.finfo(float).eps
 zeroval = eps*1e6
 
+# Cached batman.TransitModel objects (see :func:`modeltransit_batman`).
+# Each thread keeps its own cache, since batman models store the
+# parameters of their most recent evaluation; forked worker processes
+# simply inherit (a copy of) the parent's cache.
+_batman_cache = threading.local()
+batman_cache_size = 8
+
 try:
     import _integral_smallplanet_nonlinear
     c_integral_smallplanet_nonlinear = True
 except:
     c_integral_smallplanet_nonlinear = False
 
+# Backend used by :func:`occultnonlin_small` for the limb-darkening
+# integrals: 'numpy' (closed-form antiderivative; the default) or 'c'
+# (the optional compiled _integral_smallplanet_nonlinear module, if
+# c_integral_smallplanet_nonlinear is True).
+smallplanet_backend = 'numpy'
+
 
 
 
@@ -83,7 +104,8 @@ def appellf1(a,b1,b2,c,z1,z2,**kwargs):
     """Give the Appell hypergeometric function of two variables.
 
     :INPUTS:
-       six parameters, all scalars.
+       six parameters, scalars or arrays (which must broadcast against
+       each other).
 
     :OPTIONS:
        eps -- scalar, machine tolerance precision.  Defaults to 1e-10.
@@ -132,19 +154,29 @@ def appellf1(a,b1,b2,c,z1,z2,**kwargs):
     #2011-04-22 10:15 IJMC: Adapted from mpmath, but using scipy Gauss
     #   hypergeo. function
     # 2013-03-11 13:34 IJMC: Added a small error-trap for 'nan' hypgf values
+    # 2026-10-16 13:05 IJMC: Vectorized: the series is summed for all array
+    #                        elements at once, with converged elements
+    #                        dropping out of the active set.
 
     if kwargs.has_key('eps'):
         eps = kwargs['eps']
     else:
         eps = 1e-9
 
+    # Broadcast all inputs against each other:
+    inputs = [np.array(val, dtype=float, copy=False) for val in (a,b1,b2,c,z1,z2)]
+    scalar_input = max([val.ndim for val in inputs])==0
+    a,b1,b2,c,z1,z2 = [np.array(val, dtype=float).ravel() for val in \
+                           np.broadcast_arrays(*inputs)]
+    outshape = np.broadcast(*inputs).shape
+
     # Assume z1 smaller
     # We will use z1 for the outer loop
-    if abs(z1) > abs(z2):
-        z1, z2 = z2, z1
-        b1, b2 = b2, b1
+    swap = np.abs(z1) > np.abs(z2)
+    z1[swap], z2[swap] = z2[swap], z1[swap]
+    b1[swap], b2[swap] = b2[swap], b1[swap]
     def ok(x):
-        return abs(x) < 0.99
+        return np.abs(x) < 0.99
     # IJMC: Ignore the finite cases for now....
     ## Finite cases
     #if ctx.isnpint(a):
@@ -157,30 +189,35 @@ def appellf1(a,b1,b2,c,z1,z2,**kwargs):
     #    #print z1, z2
     #    # Note: ok if |z2| > 1, because
     #    # 2F1 implements analytic continuation
-    if not ok(z1):
-        u1 = (z1-z2)/(z1-1)
-        if not ok(u1):
+    s = np.zeros(z1.shape, float)
+    cont = np.logical_not(ok(z1))
+    if cont.any():
+        u1 = (z1[cont]-z2[cont])/(z1[cont]-1)
+        if not ok(u1).all():
             raise ValueError("Analytic continuation not implemented")
         #print "Using analytic continuation"
-        return (1-z1)**(-b1)*(1-z2)**(c-a-b2)*\
-            appellf1(c-a,b1,c-b1-b2,c,u1,z2,**kwargs)
+        ac, b1c, b2c, cc, z1c, z2c = a[cont], b1[cont], b2[cont], c[cont], z1[cont], z2[cont]
+        s[cont] = (1-z1c)**(-b1c)*(1-z2c)**(cc-ac-b2c)*\
+            appellf1(cc-ac,b1c,cc-b1c-b2c,cc,u1,z2c,**kwargs)
 
     #print "inner is", a, b2, c
     ##one = ctx.one
-    s = 0
-    t = 1
+    # Sum the series for all remaining elements at once; elements
+    # drop out of the active set as soon as they converge.
+    active = np.nonzero(np.logical_not(cont))[0]
+    a, b1, b2, c, z1, z2 = a[active], b1[active], b2[active], c[active], z1[active], z2[active]
+    t = np.ones(active.size, float)
     k = 0
     
-    while 1:
+    while active.size > 0:
         #h = ctx.hyp2f1(a,b2,c,z2,zeroprec=ctx.prec,**kwargs)
-        #print a.__class__, b2.__class__, c.__class__, z2.__class__
-        h = special.hyp2f1(float(a), float(b2), float(c), float(z2))
-        if not np.isfinite(h):
-            break
+        h = special.hyp2f1(a, b2, c, z2)
         term = t * h 
-        if abs(term) < eps and abs(h) > 10*eps:
-            break
-        s += term
+        keep = np.isfinite(h) * np.logical_not((np.abs(term) < eps) * (np.abs(h) > 10*eps))
+        if not keep.all():
+            active, term = active[keep], term[keep]
+            a, b1, b2, c, z1, z2, t = a[keep], b1[keep], b2[keep], c[keep], z1[keep], z2[keep], t[keep]
+        s[active] += term
         k += 1
         t = (t*a*b1*z1) / (c*k)
         c += 1 # one
@@ -188,37 +225,53 @@ def appellf1(a,b1,b2,c,z1,z2,**kwargs):
         b1 += 1 # one
         #print k, h, term, s
 
+    if scalar_input:
+        s = s[0]
+    else:
+        s = s.reshape(outshape)
 
     return s
 
-def ellke2(k, tol=100*eps, maxiter=100):
+def ellke2(k, tol=100*eps, maxiter=100, dtype=float):
     """Compute complete elliptic integrals of the first kind (K) and
-    second kind (E) using the series expansions."""
-    # 2011-04-24 21:14 IJMC: Created
+    second kind (E) using the series expansions.
+
+    :OPTIONS:
+       tol -- convergence tolerance.  Each element stops summing
+              terms as soon as its own increment is below 'tol'.
+
+       maxiter -- maximum number of series terms.
 
-    k = np.array(k, copy=False)
-    ksum = 0*k
-    kprevsum = ksum.copy()
-    kresidual = ksum + 1
-    #esum = 0*k
-    #eprevsum = esum.copy()
-    #eresidual = esum + 1
+       dtype -- working precision (e.g., np.float32 for a faster but
+                less precise result; use a correspondingly larger
+                'tol').
+    """
+    # 2011-04-24 21:14 IJMC: Created
+    # 2026-10-17 09:20 IJMC: Converged elements now drop out of the sum;
+    #                        in-place updates; added 'dtype' option.
+
+    k = np.array(k, dtype=dtype, copy=False)
+    shape = k.shape
+    k = k.ravel()
+    ksum = np.zeros(k.size, dtype=dtype)
+    ksq = k * k
+    kpow = np.ones(k.size, dtype=dtype)  # k**(2*n)
+    term = np.empty(k.size, dtype=dtype)
+    index = np.arange(k.size)
+    coef = 1.   # ((2n-1)!! / (2n)!!)**2
     n = 0
-    sqrtpi = np.sqrt(np.pi)
-    #kpow = k**0
-    #ksq = k*k
-
-    while (np.abs(kresidual) > tol).any() and n <= maxiter:
-        #kpow *= (ksq)
-        #print kpow==(k**(2*n))
-        ksum += ((misc.factorial2(2*n - 1)/misc.factorial2(2*n))**2) * k**(2*n)
-        #ksum += (special.gamma(n + 0.5)/special.gamma(n + 1) / sqrtpi) * k**(2*n)
-        kresidual = ksum - kprevsum
-        kprevsum = ksum.copy()
+
+    while index.size > 0 and n <= maxiter:
+        np.multiply(kpow, coef, out=term)
+        ksum[index] += term
+        active = np.abs(term) > tol
+        if not active.all():
+            index, ksq, kpow, term = index[active], ksq[active], kpow[active], term[active]
+        kpow *= ksq
         n += 1
-        #print n, kresidual
+        coef *= ((2. * n - 1.) / (2. * n))**2
 
-    return ksum * (np.pi/2.)
+    return (ksum * (np.pi/2.)).reshape(shape)
 
 
 
@@ -272,7 +325,7 @@ def ellke(k):
     return ee1 + ee2, ek1 - ek2
          
 
-def ellpic_bulirsch(n, k, tol=1000*eps, maxiter=1e4):
+def ellpic_bulirsch(n, k, tol=None, maxiter=1e4, dtype=float):
     """Compute the complete elliptical integral of the third kind
     using the algorithm of Bulirsch (1965).
 
@@ -281,6 +334,16 @@ def ellpic_bulirsch(n, k, tol=1000*eps, maxiter=1e4):
 
        k-- scalar or Numpy array
 
+    :OPTIONS:
+       tol -- convergence tolerance; defaults to 1000 times the
+              machine precision of 'dtype'.  Each element stops
+              iterating as soon as it has converged.
+
+       maxiter -- maximum number of iterations.
+
+       dtype -- working precision: e.g., np.float32 for a faster, less
+              precise result.
+
     :NOTES:
        Adapted from the IDL function of the same name by J. Eastman (OSU).
        """
@@ -289,59 +352,71 @@ def ellpic_bulirsch(n, k, tol=1000*eps, maxiter=1e4):
     #                  to 1e-14), and fixed tolerance flag to the
     #                  maximum of all residuals.
     # 2013-04-13 21:31 IJMC: Changed 'max' call to 'any'; minor speed boost.
-    
-    # Make p, k into vectors:
-    #if not hasattr(n, '__iter__'):
-    #    n = array([n])
-    #if not hasattr(k, '__iter__'):
-    #    k = array([k])
-
-    if not hasattr(n,'__iter__'):
-        n = np.array([n])
-    if not hasattr(k,'__iter__'):
-        k = np.array([k])
-
-    if len(n)==0 or len(k)==0:
+    # 2026-10-17 09:20 IJMC: Converged elements now drop out of the
+    #                        iteration (so slow or ill-conditioned elements
+    #                        no longer corrupt the others); work arrays are
+    #                        updated in place; added 'dtype' option.
+
+    if tol is None:
+        tol = 1000 * np.finfo(dtype).eps
+
+    n = np.array(n, dtype=dtype, ndmin=1)
+    k = np.array(k, dtype=dtype, ndmin=1)
+    if n.size==0 or k.size==0:
         return np.array([])
 
+    n, k = np.broadcast_arrays(n, k)
+    shape = n.shape
+    n, k = n.ravel(), k.ravel()
+
     kc = np.sqrt(1. - k**2)
     p = n + 1.
     
-    if min(p) < 0:
+    if p.min() < 0:
         print "Negative p"
         
     # Initialize:
-    m0 = np.array(1.)
-    c = np.array(1.)
+    m0 = np.ones(n.size, dtype=dtype)
+    c = np.ones(n.size, dtype=dtype)
     p = np.sqrt(p)
     d = 1./p
     e = kc.copy()
+    f = np.empty(n.size, dtype=dtype)
+    g = np.empty(n.size, dtype=dtype)
+    result = np.empty(n.size, dtype=dtype)
+    index = np.arange(n.size)
 
-    outsideTolerance = True
     iter = 0
-    while outsideTolerance and iter<maxiter:
-        f = c.copy()
-        c = d/p + c
-        g = e/p
-        d = 2. * (f*g + d)
-        p = g + p; 
-        g = m0.copy()
-        m0 = kc + m0
-        if ((np.abs(1. - kc/g)) > tol).any():
-            kc = 2. * np.sqrt(e)
-            e = kc * m0
-            iter += 1
-        else:
-            outsideTolerance = False
-        #if (iter/10.) == (iter/10):
-        #    print iter, (np.abs(1. - kc/g))
-        ## For debugging:
-        #print min(np.abs(1. - kc/g)) > tol
-        #print 'tolerance>>', tol
-        #print 'minimum>>  ', min(np.abs(1. - kc/g))  
-        #print 'maximum>>  ', max(np.abs(1. - kc/g)) #, (np.abs(1. - kc/g))
+    while index.size > 0 and iter < maxiter:
+        f[:] = c
+        np.divide(d, p, out=g)
+        c += g
+        np.divide(e, p, out=g)
+        f *= g
+        d += f
+        d *= 2.
+        p += g
+        g[:] = m0
+        m0 += kc
+
+        np.divide(kc, g, out=f)
+        done = ~(np.abs(1. - f) > tol)
+        if done.any():
+            cd, md, dd, pd = c[done], m0[done], d[done], p[done]
+            result[index[done]] = .5 * np.pi * (cd*md + dd) / (md * (md + pd))
+            keep = ~done
+            index, kc, p, m0, c, d, e, f, g = index[keep], kc[keep], p[keep], \
+                m0[keep], c[keep], d[keep], e[keep], f[keep], g[keep]
+
+        np.sqrt(e, out=kc)
+        kc *= 2.
+        np.multiply(kc, m0, out=e)
+        iter += 1
 
-    return .5 * np.pi * (c*m0 + d) / (m0 * (m0 + p))
+    if index.size > 0:  # Never converged:
+        result[index] = .5 * np.pi * (c*m0 + d) / (m0 * (m0 + p))
+
+    return result.reshape(shape)
 
 def z2dt_circular(per, inc, ars, z):
     """ Convert transit crossing parameter z to a time offset for circular orbits.
@@ -385,7 +460,7 @@ def t2z(tt, per, inc, hjd, ars, ecc=0, longperi=0, transitonly=False, occultatio
 
         ecc -- scalar.  orbital eccentricity.
 
-        longperi=0 scalar.  longitude of periapse (in radians)
+        longperi=0 scalar.  argument of periapse (in radians)
 
         transitonly : bool
           If False, both transits and occultations have z=0.  But this
@@ -402,6 +477,13 @@ def t2z(tt, per, inc, hjd, ars, ecc=0, longperi=0, transitonly=False, occultatio
        At zero eccentricity, z relates to physical quantities by:
 
        z = (a/Rs) * sqrt(sin[w*(t-t0)]**2+[cos(i)*cos(w*[t-t0])]**2)
+
+       For eccentric orbits, mid-transit occurs at true anomaly f0 =
+       pi/2 - longperi; this sets the time of periapse passage.  The
+       true anomaly f at each time then follows from Kepler's
+       equation (see :func:`analysis.trueanomaly`), and
+
+       z = (a/Rs) * (1-e^2) * sqrt(1 - [sin(i)*sin(longperi+f)]**2) / (1 + e*cos(f))
        """
     # 2010-01-11 18:18 IJC: Created
     # 2011-04-19 15:20 IJMC: Updated documentation.
@@ -409,18 +491,15 @@ def t2z(tt, per, inc, hjd, ars, ecc=0, longperi=0, transitonly=False, occultatio
     # 2011-05-22 16:51 IJMC: Temporarily removed eccentricity
     #                        dependence... I'll deal with that later.
     # 2013-10-12 22:58 IJMC: Added transitonly, occultationonly options
+    # 2026-10-16 14:10 IJMC: Eccentric orbits re-enabled, using the
+    #                        vectorized Kepler solver; 'tt' is still the
+    #                        time of mid-transit.
 
 
     #if not p.transit:
     #    print "Must use a transiting exoplanet!"
     #    return False
-    from analysis import trueanomaly
-
-
-    if ecc <> 0:
-        ecc = 0
-        print "WARNING: setting ecc=0 for now until I get this function working"
-
+    from analysis import trueanomaly, eccentricanomaly
 
     if ecc==0:
         #omega_orb = 2*np.pi/per
@@ -434,15 +513,74 @@ def t2z(tt, per, inc, hjd, ars, ecc=0, longperi=0, transitonly=False, occultatio
             z[cosom>0] = 100.
 
     else:
-        print "WARNING: this hasn't been tested!!! Get it working someday."
         if longperi is None:
-            longperi = 180.
-        f = trueanomaly(ecc, (2*np.pi/per) * (hjd - tt))
-        z = ars * (1. - ecc**2) * np.sqrt(1. - (np.sin(longperi + f) * np.sin(inc*np.pi/180.))**2) / \
+            longperi = 0.
+        # Mean anomaly at mid-transit:
+        eanom0 = eccentricanomaly(ecc, tanom=0.5*np.pi - longperi)
+        manom0 = eanom0 - ecc * np.sin(eanom0)
+        f = trueanomaly(ecc, manom=manom0 + (2*np.pi/per) * (hjd - tt))
+        sinlf = np.sin(longperi + f)
+        z = ars * (1. - ecc**2) * np.sqrt(1. - (sinlf * np.sin(inc*np.pi/180.))**2) / \
             (1. + ecc * np.cos(f)) 
+        if transitonly:
+            z[sinlf<0] = 100.
+        if occultationonly:
+            z[sinlf>0] = 100.
 
     return z
 
+def t2z_deriv(tt, per, inc, hjd, ars, transitonly=False, occultationonly=False):
+    """Convert HJD (time) to transit crossing parameter z, and compute
+    the partial derivatives of z (circular orbits only).
+
+    :INPUTS:
+        tt, per, inc, hjd, ars, transitonly, occultationonly -- as for
+        :func:`t2z` (with ecc=0).
+
+    :RETURNS:
+        (z, dz/dtt, dz/dper, dz/dinc, dz/dars)
+
+        The inclination derivative is per degree.  Derivatives are
+        set to zero wherever z was replaced by 'transitonly' or
+        'occultationonly', and at z=0 (where z is not differentiable).
+
+    :NOTES:
+       With phi = 2 pi (t - tt) / per, z = (a/Rs) * sqrt(S), where
+       S = sin(phi)^2 + cos(i)^2 cos(phi)^2:
+
+         dz/dphi = (a/Rs) * sin(i)^2 sin(phi) cos(phi) / sqrt(S)
+
+    :SEE ALSO:
+       :func:`t2z`, :func:`occultquad_deriv`, :func:`modeltransit_general_jacobian`
+    """
+    # 2026-10-16 23:40 IJMC: Created
+    phi = (2*np.pi/per) * (hjd - tt)
+    sinphi, cosphi = np.sin(phi), np.cos(phi)
+    sini, cosi = np.sin(np.deg2rad(inc)), np.cos(np.deg2rad(inc))
+    sqrts = np.sqrt(sinphi**2 + (cosi*cosphi)**2)
+    z = ars * sqrts
+    z, sqrts, sinphi, cosphi = np.broadcast_arrays(z, sqrts, sinphi, cosphi)
+
+    invs = np.zeros(sqrts.shape, float)
+    invs[sqrts > 0] = 1. / sqrts[sqrts > 0]
+    dzdphi = ars * sini**2 * sinphi * cosphi * invs
+    dztt = dzdphi * (-2*np.pi/per)
+    dzper = dzdphi * (-phi/per)
+    dzinc = -ars * sini * cosi * cosphi**2 * invs * (np.pi/180.)
+    dzars = sqrts.copy()
+
+    if transitonly or occultationonly:
+        z = z.copy()
+        if transitonly:
+            bad = cosphi < 0
+        else:
+            bad = cosphi > 0
+        z[bad] = 100.
+        for deriv in [dztt, dzper, dzinc, dzars]:
+            deriv[bad] = 0.
+
+    return z, dztt, dzper, dzinc, dzars
+
 def uniform(*arg, **kw):
     """Placeholder for my old code; the new function is called
     :func:`occultuniform`.
@@ -460,7 +598,10 @@ def occultuniform(z, p, complement=False, verbose=False):
        z -- scalar or sequence; positional offset values of planet in
             units of the stellar radius.
 
-       p -- scalar;  planet/star radius ratio.
+       p -- scalar or array;  planet/star radius ratio.  If an
+            array, it must broadcast against z (e.g., shape (N,1) for
+            a z array of shape (N,M)) so that each z value has its own
+            radius ratio.
 
        complement : bool
          If True, return (1 - occultuniform(z, p))
@@ -476,14 +617,17 @@ def occultuniform(z, p, complement=False, verbose=False):
     #                        1st/4th contact point (credit to
     #                        S. Aigrain @ Oxford)
     # 2013-04-13 21:28 IJMC: Some code optimization; ~20% gain.
+    # 2026-10-16 09:12 IJMC: p can now be an array that broadcasts
+    #                        against z, for batched model evaluation.
 
     z = np.abs(np.array(z,copy=True))
+    p = np.array(p, copy=False)
+    parray = p.ndim > 0
+    if parray:  # one radius ratio per z value
+        z, p = [np.array(arr, dtype=float) for arr in np.broadcast_arrays(z, p)]
+    pneg = p < 0
+    p = np.abs(p)
     fsecondary = np.zeros(z.shape,float)
-    if p < 0:
-        pneg = True
-        p = np.abs(p)
-    else:
-        pneg = False
 
     p2 = p*p
 
@@ -501,18 +645,22 @@ def occultuniform(z, p, complement=False, verbose=False):
         if any2:
             zi2 = z[i2]
             zi2sq = zi2*zi2
-            arg1 = 1 - p2 + zi2sq
-            acosarg1 = (p2+zi2sq-1)/(2.*p*zi2)
+            if parray:
+                pi2, p2i2 = p[i2], p2[i2]
+            else:
+                pi2, p2i2 = p, p2
+            arg1 = 1 - p2i2 + zi2sq
+            acosarg1 = (p2i2+zi2sq-1)/(2.*pi2*zi2)
             acosarg2 = arg1/(2*zi2)
             acosarg1[acosarg1 > 1] = 1.  # quick fix for numerical precision errors
             acosarg2[acosarg2 > 1] = 1.  # quick fix for numerical precision errors
             k0 = np.arccos(acosarg1)
             k1 = np.arccos(acosarg2)
             k2 = 0.5*np.sqrt(4*zi2sq-arg1*arg1)
-            fsecondary[i2] = (1./np.pi)*(p2*k0 + k1 - k2)
+            fsecondary[i2] = (1./np.pi)*(p2i2*k0 + k1 - k2)
 
         fsecondary[i1] = 0.
-        if any3: fsecondary[i3] = p2
+        if any3: fsecondary[i3] = p2[i3] if parray else p2
         if any4: fsecondary[i4] = 1.
 
         if verbose:
@@ -537,7 +685,9 @@ def occultuniform(z, p, complement=False, verbose=False):
         elif z<=(p-1):
             fsecondary = 1.
         
-    if pneg:
+    if parray:
+        fsecondary[pneg] *= -1
+    elif pneg:
         fsecondary *= -1
 
     if complement:
@@ -546,24 +696,104 @@ def occultuniform(z, p, complement=False, verbose=False):
         return 1. - fsecondary
     
 
-def depthchisq(z, planet, data, ddepth=[-.1,.1], ndepth=20, w=None):
-    #z = transit.t2z(planet, planet.i, hjd, 0.211)
-    nobs = z.size
+def depthchisq(z, planet, data, ddepth=[-.1,.1], ndepth=20, w=None, retall=False):
+    """Compute chi-squared as a function of transit depth, for a
+    fixed transit geometry.
+
+    :INPUTS:
+      z : 1D or 2D NumPy array
+        Planet-star separation at each of M data points (e.g., from
+        :func:`t2z`); or an (Nz x M) array of separations for several
+        planets or trial ephemerides.
+
+      planet : :class:`analysis.planet` object, or scalar
+        Nominal transit depth (planet.depth, or the scalar itself),
+        used only to set the shape of the transit template.
+
+      data : 1D NumPy array
+        M data values.
+
+    :OPTIONS:
+      ddepth : 2-sequence
+        Range of transit depths to evaluate.
+
+      ndepth : int
+        Number of transit depths to evaluate.
+
+      w : None or 1D NumPy array
+        Weights (inverse variances) of the data.  If None, set from
+        the scatter of the data that are out of transit for every
+        template.
+
+      retall : bool
+        If True, also return the best-fit depth, its uncertainty, and
+        its chi-squared.
+
+    :RETURNS:
+      (depths, chisq), where 'chisq' has shape (ndepth) for 1D z and
+      (Nz x ndepth) for 2D z.
+
+      If retall: (depths, chisq, bestdepth, bestdepth_err, chisqmin)
+
+    :NOTES:
+      The model is baseline * (1 - depth * template), where the
+      template is the uniform-disk transit of the nominal depth
+      normalized to unit depth, and the baseline is the weighted mean
+      of the out-of-transit data.  The depth enters linearly, so
+      chi-squared is an exact quadratic in depth: a few weighted sums
+      per template give the whole chi-squared curve, and its minimum,
+      in closed form.
+    """
+    # 2026-10-17 14:00 IJMC: Rewritten: closed-form, linear-depth solution
+    #                        (the old version looped over depths and
+    #                        referred to undefined names); added support
+    #                        for 2D z and the 'retall' option.
+    # 2026-10-17 20:40 IJMC: Default weights use only points out of
+    #                        transit in every template; check depth > 0.
+
+    depth0 = getattr(planet, 'depth', planet)
+    if not depth0 > 0:
+        raise ValueError("The nominal transit depth must be positive (you set %s)." % depth0)
+    z = np.array(z, dtype=float, copy=False)
+    data = np.array(data, dtype=float, copy=False)
+    zshape = z.shape
+    z = z.reshape(-1, data.size)
+    nz = z.shape[0]
+
+    template = (1. - occultuniform(z.ravel(), np.sqrt(depth0))).reshape(z.shape) / depth0
+    oot = template==0
+    if w is None:
+        alloot = oot.all(0)
+        if not alloot.any():
+            raise ValueError("No data are out of transit for every template; set the weights 'w'.")
+        w = np.ones(data.size, float) / data[alloot].var()
+    w = np.array(w, dtype=float, copy=False).reshape(1, data.size)
+
+    wout = w * oot
+    baseline = (wout * data).sum(1) / wout.sum(1)
+
+    # chisq(depth) = A - 2 B depth + C depth^2
+    resid = baseline.reshape(nz, 1) - data
+    shape = baseline.reshape(nz, 1) * template
+    A = (w * resid**2).sum(1)
+    B = (w * resid * shape).sum(1)
+    C = (w * shape**2).sum(1)
+
     depths = np.linspace(ddepth[0],ddepth[1], ndepth)
-    print depths
-    chisq = np.zeros(ndepth, float)
-    for ii in range(ndepth):
-        tr = -(transit.occultuniform(z, np.sqrt(planet.depth))/depths[ii])
-        if w is None:
-            w = np.ones(nobs,float)/data[tr==0].std()
-        print 'w>>',w[0]
-        baseline = np.ones(nobs,float) * an.wmean(data[tr==0], w[tr==0])
-        print 'b>>',baseline[0]
-        print 'd[ii]>>',depths[ii]
-        model = baseline + tr*depths[ii]
-        plot(model)
-        chisq[ii] = (w*(model-data)**2).sum()
-    return depths, chisq
+    chisq = A.reshape(nz, 1) - 2 * B.reshape(nz, 1) * depths + C.reshape(nz, 1) * depths**2
+    if len(zshape)==1:
+        chisq = chisq[0]
+
+    if retall:
+        bestdepth = B / C
+        bestdepth_err = 1. / np.sqrt(C)
+        chisqmin = A - B**2 / C
+        if len(zshape)==1:
+            bestdepth, bestdepth_err, chisqmin = bestdepth[0], bestdepth_err[0], chisqmin[0]
+        ret = depths, chisq, bestdepth, bestdepth_err, chisqmin
+    else:
+        ret = depths, chisq
+    return ret
 
 
 
@@ -603,6 +833,7 @@ def eval_int_at_limit(limit, cn):
     """Evaluate the integral at a specified limit (upper or lower)"""
     # 2013-04-17 22:27 IJMC: Implemented some speed boosts; added a
     #                        bug; fixed it again.
+    # 2026-10-17 14:40 IJMC: Evaluate as a polynomial in sqrt(limit).
 
     # The old way:
     #term1 = cn[0] * (1. - 0.8 * np.sqrt(limit))
@@ -611,14 +842,22 @@ def eval_int_at_limit(limit, cn):
     #term4 = cn[3] * (1. - 0.5 * limit**2)
     #goodret = -(limit**2) * (1. - term1 - term2 - term3 - term4)
 
-    # The new, somewhat faster, way:
-    sqrtlimit = np.sqrt(limit)
-    sqlimit = limit*limit
-    total = 1. - cn[0] * (1. - 0.8 * sqrtlimit)
-    total -= cn[1] * (1. - (2./3.) * limit)
-    total -= cn[2] * (1. - (4./7.) * limit*sqrtlimit)
-    total -= cn[3] * (1. - 0.5 * sqlimit)
-    ret = -(sqlimit) * total
+    # The new, faster, way: -limit^2 * (a0 + a1 s + a2 s^2 + a3 s^3 + a4 s^4)
+    # with s = sqrt(limit).
+    a0 = 1. - cn[0] - cn[1] - cn[2] - cn[3]
+    a1, a2, a3, a4 = 0.8*cn[0], (2./3.)*cn[1], (4./7.)*cn[2], 0.5*cn[3]
+    s = np.sqrt(limit)
+    ret = a4 * s
+    ret += a3
+    ret *= s
+    ret += a2
+    ret *= s
+    ret += a1
+    ret *= s
+    ret += a0
+    ret *= limit
+    ret *= limit
+    ret *= -1.
 
     return ret
 
@@ -636,7 +875,7 @@ def smallplanet_nonlinear(*arg, **kw):
     return occultnonlin_small(*arg, **kw)
 
 
-def occultnonlin_small(z,p, cn):
+def occultnonlin_small(z,p, cn, backend=None):
     """Nonlinear limb-darkening light curve in the small-planet
     approximation (section 5 of Mandel & Agol 2002).
 
@@ -649,6 +888,11 @@ def occultnonlin_small(z,p, cn):
               a shorter sequence is entered, the later values will be
               set to zero.
 
+    :OPTIONS:
+        backend -- 'numpy' (closed-form antiderivative) or 'c' (the
+              optional compiled module).  If None, use the module-level
+              setting transit.smallplanet_backend.
+
     :NOTE: 
        I had to divide the effect at the near-edge of the light curve
        by pi for consistency; this factor was not in Mandel & Agol, so
@@ -675,17 +919,27 @@ def occultnonlin_small(z,p, cn):
     # 2011-05-24 14:00 IJMC: Now check the size of cn.
     # 2012-03-09 08:54 IJMC: Added a cheat for z very close to zero
     # 2013-04-17 10:51 IJMC: Mild code optimization
+    # 2026-10-17 14:40 IJMC: Added 'backend' option; the NumPy path skips
+    #                        the (zero) term at the limb.  No longer
+    #                        modifies the input z.
 
     #import pdb
 
+    if backend is None:
+        backend = smallplanet_backend
+    if backend=='c' and not c_integral_smallplanet_nonlinear:
+        raise ValueError("The compiled _integral_smallplanet_nonlinear module is not available; use backend='numpy'.")
+    elif backend not in ('c', 'numpy'):
+        raise ValueError("backend must be 'numpy' or 'c' (you set %s)" % backend)
+
     cn = np.array([cn], copy=False).ravel()
     if cn.size < 4:
         cn = np.concatenate((cn, [0.]*(4-cn.size)))
 
-    z = np.array(z, copy=False)
+    z = np.array(z, dtype=float, copy=False)
     F = np.ones(z.shape, float)
 
-    z[z==0] = zeroval # cheat!
+    z = np.where(z==0, zeroval, z) # cheat!
 
     a = (z - p)**2
     b = (z + p)**2
@@ -698,18 +952,15 @@ def occultnonlin_small(z,p, cn):
     # Need to specify limits of integration in terms of mu (not r)
     aind1 = 1. - a[ind1]
     zind1m1 = z[ind1] - 1.
-    if c_integral_smallplanet_nonlinear:
+    if backend=='c':
         #print 'do it the C way'
         Istar_edge = _integral_smallplanet_nonlinear.integral_smallplanet_nonlinear(cn, np.sqrt(aind1), np.array([0.])) / aind1
         Istar_inside = _integral_smallplanet_nonlinear.integral_smallplanet_nonlinear(cn, np.sqrt(1. - a[ind2]), np.sqrt(1. - b[ind2])) / z[ind2]
     else:
-        Istar_edge = integral_smallplanet_nonlinear(None, p, cn, \
-                                                    np.sqrt(aind1), np.array([0.])) / aind1
-        
-        Istar_inside = integral_smallplanet_nonlinear(None, p, cn, \
-                                              np.sqrt(1. - a[ind2]), \
-                                              np.sqrt(1. - b[ind2])) / \
-                                              (z[ind2])
+        # The antiderivative vanishes at the limb (mu=0):
+        Istar_edge = -eval_int_at_limit(np.sqrt(aind1), cn) / aind1
+        Istar_inside = (eval_int_at_limit(np.sqrt(1. - b[ind2]), cn) - \
+                        eval_int_at_limit(np.sqrt(1. - a[ind2]), cn)) / z[ind2]
 
 
     term1 = 0.25 * Istar_edge / (np.pi * Omega)
@@ -728,12 +979,16 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
     :INPUTS:
         z -- sequence of positional offset values
 
-        p0 -- planet/star radius ratio
+        p0 -- planet/star radius ratio.  This may also be an array
+           that broadcasts against z, giving each z value its own
+           radius ratio (see :func:`occultquad_batch`).
 
         gamma -- two-sequence.
            quadratic limb darkening coefficients.  (c1=c3=0; c2 =
            gamma[0] + 2*gamma[1], c4 = -gamma[1]).  If only a single
            gamma is used, then you're assuming linear limb-darkening.
+           The two elements may themselves be arrays that broadcast
+           against z.
 
     :OPTIONS:
         retall -- bool.  
@@ -799,15 +1054,13 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
     #                        a single parameter passed in.
     # 2013-04-13 21:06 IJMC: Various code tweaks; speed increased by
     #                        ~20% in some cases.
+    # 2026-10-16 09:40 IJMC: p0 and gamma can be arrays, for batched
+    #                        evaluation; removed unused 'k' computation.
     #import pdb
 
     # Initialize:
     z = np.array(z, copy=False)
-    lambdad = np.zeros(z.shape, float)
-    etad = np.zeros(z.shape, float)
-    F = np.ones(z.shape, float)
-
-    p = np.abs(p0) # Save the original input
+    p = np.abs(np.array(p0, copy=False)) # Save the original input
 
     # Define limb-darkening coefficients:
     if len(gamma) < 2 or not hasattr(gamma, '__iter__'):  # Linear limb-darkening
@@ -818,10 +1071,8 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
 
     c4 = -gamma[1]
 
-
-
     # Test the simplest case (a zero-sized planet):
-    if p==0:
+    if p.ndim==0 and p==0:
         if retall:
             ret = np.ones(z.shape, float), np.ones(z.shape, float), \
                   np.zeros(z.shape, float), np.zeros(z.shape, float)
@@ -829,26 +1080,39 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
             ret = np.ones(z.shape, float)
         return ret
 
+    # If p is an array, give every z value its own radius ratio so
+    # that a whole batch of planets can be handled in a single pass:
+    if p.ndim > 0:
+        z, p = [np.array(arr, dtype=float) for arr in np.broadcast_arrays(z, p)]
+        psub = lambda x, ind: x[ind]
+    else:
+        psub = lambda x, ind: x
+
+    lambdad = np.zeros(z.shape, float)
+    etad = np.zeros(z.shape, float)
+    F = np.ones(z.shape, float)
+
     # Define useful constants:
     fourOmega = 1. - gamma[0]/3. - gamma[1]/6. # Actually 4*Omega
     a = (z - p)*(z - p)
     b = (z + p)*(z + p)
-    k = 0.5 * np.sqrt((1. - a) / (z * p))  # 8%
     p2 = p*p
     z2 = z*z
     ninePi = 9*np.pi
 
     # Define the many necessary indices for the different cases:
     pgt0 = p > 0
+    plthalf = p < 0.5
+    pgthalf = p > 0.5
     
     i01 = pgt0 * (z >= (1. + p))
     i02 = pgt0 * (z > (.5 + np.abs(p - 0.5))) * (z < (1. + p))
-    i03 = pgt0 * (p < 0.5) * (z > p) * (z < (1. - p))
-    i04 = pgt0 * (p < 0.5) * (z == (1. - p))
-    i05 = pgt0 * (p < 0.5) * (z == p)
+    i03 = pgt0 * plthalf * (z > p) * (z < (1. - p))
+    i04 = pgt0 * plthalf * (z == (1. - p))
+    i05 = pgt0 * plthalf * (z == p)
     i06 = (p == 0.5) * (z == 0.5)
-    i07 = (p > 0.5) * (z == p)
-    i08 = (p > 0.5) * (z >= np.abs(1. - p)) * (z < p)
+    i07 = pgthalf * (z == p)
+    i08 = pgthalf * (z >= np.abs(1. - p)) * (z < p)
     i09 = pgt0 * (p < 1) * (z > 0) * (z < (0.5 - np.abs(p - 0.5)))
     i10 = pgt0 * (p < 1) * (z == 0)
     i11 = (p > 1) * (z >= 0.) * (z < (p - 1.))
@@ -893,7 +1157,9 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
 
     # Lambda_1:
     ilam1 = i02 + i08
-    q1 = p2 - z2[ilam1]
+    pilam1 = psub(p, ilam1)
+    p2ilam1 = psub(p2, ilam1)
+    q1 = p2ilam1 - z2[ilam1]
     ## This is what the paper says:
     #ellippi = ellpic_bulirsch(1. - 1./a[ilam1], k[ilam1])
     # ellipe, ellipk = ellke(k[ilam1])
@@ -905,15 +1171,16 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
     qq = np.sqrt((1. - a[ilam1]) / (b[ilam1] - a[ilam1]))
     ellippi = ellpic_bulirsch(1./a[ilam1] - 1., qq)
     ellipe, ellipk = ellke(qq)
-    lambdad[ilam1] = (1./ (ninePi*np.sqrt(p*z[ilam1]))) * \
+    lambdad[ilam1] = (1./ (ninePi*np.sqrt(pilam1*z[ilam1]))) * \
         ( ((1. - b[ilam1])*(2*b[ilam1] + a[ilam1] - 3) - \
                3*q1*(b[ilam1] - 2.)) * ellipk + \
-              4*p*z[ilam1]*(z2[ilam1] + 7*p2 - 4.) * ellipe - \
+              4*pilam1*z[ilam1]*(z2[ilam1] + 7*p2ilam1 - 4.) * ellipe - \
               3*(q1/a[ilam1])*ellippi)
 
     # Lambda_2:
     ilam2 = i03 + i09
-    q2 = p2 - z2[ilam2]
+    p2ilam2 = psub(p2, ilam2)
+    q2 = p2ilam2 - z2[ilam2]
 
     ## This is what the paper says:
     #ellippi = ellpic_bulirsch(1. - b[ilam2]/a[ilam2], 1./k[ilam2])
@@ -927,43 +1194,48 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
     ellipe, ellipk = ellke(np.sqrt((bilam2 - ailam2)/(omailam2)))
 
     lambdad[ilam2] = (2. / (ninePi*np.sqrt(omailam2))) * \
-        ((1. - 5*z2[ilam2] + p2 + q2*q2) * ellipk + \
-             (omailam2)*(z2[ilam2] + 7*p2 - 4.) * ellipe - \
+        ((1. - 5*z2[ilam2] + p2ilam2 + q2*q2) * ellipk + \
+             (omailam2)*(z2[ilam2] + 7*p2ilam2 - 4.) * ellipe - \
              3*(q2/ailam2)*ellippi)
 
 
     # Lambda_3:
     #ellipe, ellipk = ellke(0.5/ k)  # This is what the paper says
     if any07:
-        ellipe, ellipk = ellke(0.5/ p)  # Corrected typo (1/2k -> 1/2p), according to J. Eastman
-        lambdad[i07] = 1./3. + (16.*p*(2*p2 - 1.)*ellipe - 
-                                (1. - 4*p2)*(3. - 8*p2)*ellipk / p) / ninePi
+        pi07 = psub(p, i07)
+        p2i07 = psub(p2, i07)
+        ellipe, ellipk = ellke(0.5/ pi07)  # Corrected typo (1/2k -> 1/2p), according to J. Eastman
+        lambdad[i07] = 1./3. + (16.*pi07*(2*p2i07 - 1.)*ellipe - 
+                                (1. - 4*p2i07)*(3. - 8*p2i07)*ellipk / pi07) / ninePi
 
 
     # Lambda_4
     #ellipe, ellipk = ellke(2. * k)  # This is what the paper says
     if any05:
-        ellipe, ellipk = ellke(2. * p)  # Corrected typo (2k -> 2p), according to J. Eastman
-        lambdad[i05] = 1./3. + (2./ninePi) * (4*(2*p2 - 1.)*ellipe + (1. - 4*p2)*ellipk)
+        p2i05 = psub(p2, i05)
+        ellipe, ellipk = ellke(2. * psub(p, i05))  # Corrected typo (2k -> 2p), according to J. Eastman
+        lambdad[i05] = 1./3. + (2./ninePi) * (4*(2*p2i05 - 1.)*ellipe + (1. - 4*p2i05)*ellipk)
 
     # Lambda_5
     ## The following line is what the 2002 paper says:
     #lambdad[i04] = (2./(3*np.pi)) * (np.arccos(1 - 2*p) - (2./3.) * (3. + 2*p - 8*p2))
     # The following line is what J. Eastman's code says:
     if any04:
-        lambdad[i04] = (2./3.) * (np.arccos(1. - 2*p)/np.pi - \
-                                      (6./ninePi) * np.sqrt(p * (1.-p)) * \
-                                      (3. + 2*p - 8*p2) - \
-                                      float(p > 0.5))
+        pi04 = psub(p, i04)
+        lambdad[i04] = (2./3.) * (np.arccos(1. - 2*pi04)/np.pi - \
+                                      (6./ninePi) * np.sqrt(pi04 * (1.-pi04)) * \
+                                      (3. + 2*pi04 - 8*pi04*pi04) - \
+                                      (pi04 > 0.5))
 
     # Lambda_6
     if any10:
-        lambdad[i10] = -(2./3.) * (1. - p2)**1.5
+        lambdad[i10] = -(2./3.) * (1. - psub(p2, i10))**1.5
 
     # Eta_1:
     ilam3 = ilam1 + i07 # = i02 + i07 + i08
     z2ilam3  = z2[ilam3]    # pre-cache for better speed
     twoZilam3  = 2*z[ilam3] # pre-cache for better speed
+    p2ilam3 = psub(p2, ilam3)
     #kappa0 = np.arccos((p2+z2ilam3-1)/(p*twoZilam3))
     #kappa1 = np.arccos((1-p2+z2ilam3)/(twoZilam3))
     #etad[ilam3] = \
@@ -971,13 +1243,15 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
     #                    0.25*(1. + 5*p2 + z2ilam3) * \
     #                    np.sqrt((1. - a[ilam3]) * (b[ilam3] - 1.))) 
     etad[ilam3] = \
-        (0.5/np.pi) * ((np.arccos((1-p2+z2ilam3)/(twoZilam3))) + (np.arccos((p2+z2ilam3-1)/(p*twoZilam3)))*p2*(p2 + 2*z2ilam3) - \
-                        0.25*(1. + 5*p2 + z2ilam3) * \
+        (0.5/np.pi) * ((np.arccos((1-p2ilam3+z2ilam3)/(twoZilam3))) + (np.arccos((p2ilam3+z2ilam3-1)/(psub(p, ilam3)*twoZilam3)))*p2ilam3*(p2ilam3 + 2*z2ilam3) - \
+                        0.25*(1. + 5*p2ilam3 + z2ilam3) * \
                         np.sqrt((1. - a[ilam3]) * (b[ilam3] - 1.))) 
 
 
     # Eta_2:
-    etad[ilam2 + i04 + i05 + i10] = 0.5 * p2 * (p2 + 2. * z2[ilam2 + i04 + i05 + i10])
+    ieta2 = ilam2 + i04 + i05 + i10
+    p2ieta2 = psub(p2, ieta2)
+    etad[ieta2] = 0.5 * p2ieta2 * (p2ieta2 + 2. * z2[ieta2])
     
 
     # We're done!
@@ -1001,6 +1275,241 @@ def occultquad(z,p0, gamma, retall=False, verbose=False):
 
     return ret
 
+def occultquad_batch(z, p, gamma, retall=False):
+    """Quadratic limb-darkening light curves for many planets at once.
+
+    :INPUTS:
+        z -- 2D array of shape (N, M).  Positional offset values for
+             N different parameter sets (e.g., emcee walkers), each
+             evaluated at M times.  A 1D array of length M is taken to
+             be shared by all N parameter sets.
+
+        p -- N-sequence of planet/star radius ratios.
+
+        gamma -- (N x 2) array of quadratic limb-darkening
+             coefficients, or (N x 1) for linear limb-darkening.  A
+             single two-sequence will be used for all N sets.
+
+    :OPTIONS:
+        retall -- bool.  As for :func:`occultquad`.
+
+    :RETURNS:
+        (N x M) array of light curves, such that row 'i' is identical
+        to occultquad(z[i], p[i], gamma[i]).
+
+    :EXAMPLE:
+       ::
+
+         import transit
+         import numpy as np
+         p = np.array([0.08, 0.1, 0.12])
+         gamma = np.array([[.3, .2], [.35, .15], [.4, .1]])
+         z = np.abs(np.linspace(-1.3, 1.3, 500))
+         lcs = transit.occultquad_batch(np.tile(z, (3,1)), p, gamma)
+
+    :SEE ALSO:
+       :func:`occultquad`, :func:`modeltransit_general_batch`
+    """
+    # 2026-10-16 10:05 IJMC: Created
+
+    z = np.array(z, copy=False)
+    p = np.array(p, dtype=float, copy=False).ravel()
+    nset = p.size
+    if z.ndim==1:
+        z = z.reshape(1, z.size)
+
+    gamma = np.array(gamma, dtype=float, copy=False)
+    if gamma.ndim < 2:
+        gamma = np.tile(gamma.ravel(), (nset, 1))
+    if gamma.shape[1] < 2:  # Linear limb-darkening
+        gamma = np.hstack((gamma, np.zeros((nset, 1))))
+
+    return occultquad(z, p.reshape(nset, 1), \
+                          [gamma[:,0:1], gamma[:,1:2]], retall=retall)
+
+
+def _occultarc(z, p):
+    """Helper for :func:`occultquad_deriv` and :func:`occultuniform_deriv`.
+
+    Integrals along the arc of the planet's limb that lies inside the
+    stellar disk, parametrized by the angle psi from the planet-star
+    line (i.e., r^2 = z^2 + p^2 - 2 z p cos(psi), for |psi| <=
+    alpha).  Returns (J0, J1, J2, M0, M1):
+
+      J_n = Integral[ cos(psi)^n  dpsi]
+
+      M_n = Integral[ sqrt(1 - r^2) cos(psi)^n  dpsi]
+
+    where the M_n are given in terms of complete elliptic integrals.
+    """
+    # 2026-10-16 23:10 IJMC: Created
+    z, p = np.broadcast_arrays(np.abs(np.array(z, dtype=float, ndmin=1)), \
+                                   np.abs(np.array(p, dtype=float, copy=False)))
+    zp = z * p
+    a = 1. - z**2 - p**2
+    r2 = 1. - (z - p)**2   # (1 - r^2) at psi=0
+    overlap = (r2 > 0) * (zp > 0)
+
+    # Half-length of the arc inside the star:
+    alpha = np.pi * (a > 0)
+    cosalpha = -a[overlap] / (2. * zp[overlap])
+    alpha[overlap] = np.arccos(np.clip(cosalpha, -1., 1.))
+
+    J0 = 2. * alpha
+    J1 = 2. * np.sin(alpha)
+    J2 = alpha + np.sin(alpha) * np.cos(alpha)
+    M0 = np.zeros(z.shape, float)
+    M1 = np.zeros(z.shape, float)
+
+    # Planet centered on the star: no elliptic integrals needed.
+    center = (zp==0) * (a > 0)
+    M0[center] = 2. * np.pi * np.sqrt(a[center])
+
+    # With m = 4zp/(1-(z-p)^2), the arc integrals reduce to
+    #    M0 = 4 sqrt(1-(z-p)^2) Ep
+    #    M1 = 4 sqrt(1-(z-p)^2) (Ep - 2 S2)
+    # where Ep = E(phi|m), Fp = F(phi|m), S2 = [(2m-1)Ep + (1-m)Fp]/(3m),
+    # and phi=pi/2 if the planet is inside the disk; otherwise
+    # sin(phi)^2 = 1/m, and the reciprocal-modulus transformation
+    # again gives complete integrals.
+    if overlap.any():
+        m = 4. * zp[overlap] / r2[overlap]
+        sqrtr2 = np.sqrt(r2[overlap])
+        ep = np.zeros(m.shape, float)
+        onemfp = np.zeros(m.shape, float)   # (1 - m) * Fp
+        s2 = np.zeros(m.shape, float)
+
+        inside = m < 1
+        outside = m > 1
+        mi = m[inside]
+        ep[inside] = special.ellipe(mi)
+        onemfp[inside] = (1. - mi) * special.ellipkm1(1. - mi)
+        ep[m==1] = 1.
+
+        mo = m[outside]
+        sqrtmo = np.sqrt(mo)
+        ko, eo = special.ellipk(1. / mo), special.ellipe(1. / mo)
+        ep[outside] = sqrtmo * eo - (mo - 1.) / sqrtmo * ko
+        onemfp[outside] = (1. - mo) * ko / sqrtmo
+
+        s2 = ((2. * m - 1.) * ep + onemfp) / (3. * m)
+
+        # Avoid cancellation for nearly-concentric disks: series in m
+        small = m < 1e-3
+        if small.any():
+            ms = m[small]
+            coef, term, wallis = 1., np.zeros(ms.shape, float), np.pi / 4.
+            for kk in xrange(7):
+                term += coef * wallis
+                coef *= -ms * (0.5 - kk) / (kk + 1.)
+                wallis *= (2. * kk + 3.) / (2. * kk + 4.)
+            s2[small] = term
+
+        M0[overlap] = 4. * sqrtr2 * ep
+        M1[overlap] = 4. * sqrtr2 * (ep - 2. * s2)
+
+    return J0, J1, J2, M0, M1
+
+def occultuniform_deriv(z, p):
+    """Uniform-disk transit light curve and its partial derivatives.
+
+    :INPUTS:
+       z -- scalar or sequence; positional offset values of planet in
+            units of the stellar radius.
+
+       p -- scalar or array;  planet/star radius ratio (broadcasts
+            against z).
+
+    :RETURNS:
+       (F, dF/dz, dF/dp), where F is identical to occultuniform(z, p).
+
+    :NOTES:
+       As the planet's limb moves, the occulted area changes only
+       along the arc of the planet's limb inside the stellar disk.
+       For an arc of half-angle alpha:
+
+         dF/dp = -2 p alpha / pi,   dF/dz = 2 p sin(alpha) / pi
+
+    :SEE ALSO:
+       :func:`occultuniform`, :func:`occultquad_deriv`, :func:`t2z_deriv`
+    """
+    # 2026-10-16 23:10 IJMC: Created
+    J0, J1, J2, M0, M1 = _occultarc(z, p)
+    pp = np.abs(np.array(p, dtype=float, copy=False)) * np.ones(J0.shape)
+    F = occultuniform(z, p)
+    return F, pp * J1 / np.pi, -pp * J0 / np.pi
+
+def occultquad_deriv(z, p, gamma):
+    """Quadratic limb-darkening light curve, and its analytic partial
+    derivatives with respect to z, p, and both limb-darkening
+    coefficients.
+
+    :INPUTS:
+       z, p, gamma -- as for :func:`occultquad`.  If only a single
+                      gamma is given, linear limb-darkening is assumed
+                      (but both derivatives are still returned).
+
+    :RETURNS:
+       (F, dF/dz, dF/dp, dF/dgamma1, dF/dgamma2)
+
+    :EXAMPLE:
+       ::
+
+         import transit
+         import numpy as np
+         z = np.linspace(0, 1.2, 500)
+         F, dz, dp, dg1, dg2 = transit.occultquad_deriv(z, 0.1, [.3, .2])
+
+    :NOTES:
+       The flux is linear in gamma, so the limb-darkening derivatives
+       follow directly from the quantities returned by
+       occultquad(..., retall=True).
+
+       For z and p, the change in occulted flux comes only from the
+       arc of the planet's limb inside the stellar disk (the stellar
+       limb itself does not move).  Writing the intensity as I(r) = A
+       + B*mu + C*r^2 (with A = 1-g1-2g2, B = g1+2g2, C = g2), the
+       derivatives are closed-form sums of integrals along that arc;
+       the mu term gives complete elliptic integrals (see
+       :func:`_occultarc`).  Cf. Pal (2008, MNRAS 390, 281) for an
+       equivalent derivation.
+
+    :SEE ALSO:
+       :func:`occultquad`, :func:`occultuniform_deriv`,
+       :func:`t2z_deriv`, :func:`modeltransit_general_jacobian`
+    """
+    # 2026-10-16 23:10 IJMC: Created
+    if hasattr(gamma, '__iter__') and len(gamma) > 1:
+        g1, g2 = gamma[0], gamma[1]
+    else:
+        g1, g2 = (gamma[0] if hasattr(gamma, '__iter__') else gamma), 0.
+    g1 = np.array(g1, dtype=float, copy=False)
+    g2 = np.array(g2, dtype=float, copy=False)
+
+    z = np.array(z, dtype=float, copy=False)
+    p = np.array(p, dtype=float, copy=False)
+    F, L, lambdad, etad = occultquad(z, p, [g1, g2], retall=True)
+    F, L, lambdad, etad = np.broadcast_arrays(F, L, lambdad, etad)
+
+    # Limb-darkening derivatives:
+    omega = 1. - g1/3. - g2/6.
+    Q = lambdad + 2./3. * (np.abs(p) > z)
+    N = (1. - g1 - 2.*g2) * L + (g1 + 2.*g2) * Q + g2 * etad
+    dg1 = -((Q - L) / omega + N / (3. * omega**2))
+    dg2 = -((2.*(Q - L) + etad) / omega + N / (6. * omega**2))
+
+    # Geometric derivatives, from integrals along the planet's limb:
+    J0, J1, J2, M0, M1 = _occultarc(z, p)
+    pp = np.abs(p)
+    A, B, C = 1. - g1 - 2.*g2, g1 + 2.*g2, g2
+    zp2 = z**2 + p**2
+    norm = pp / (np.pi * omega)
+    dp = -norm * (A*J0 + B*M0 + C*(zp2*J0 - 2.*z*pp*J1))
+    dz = norm * (A*J1 + B*M1 + C*(zp2*J1 - 2.*z*pp*J2))
+    dz = dz * np.sign(z)
+
+    return F, dz, dp, dg1 * np.ones(F.shape), dg2 * np.ones(F.shape)
+
 def occultnonlin(z,p0, cn):
     """Nonlinear limb-darkening light curve; cf. Section 3 of Mandel & Agol (2002).
 
@@ -1030,10 +1539,11 @@ def occultnonlin(z,p0, cn):
     :NOTES: 
         Scipy is much faster than mpmath for computing the Beta and
         Gauss hypergeometric functions.  However, Scipy does not have
-        the Appell hypergeometric function -- the current version is
-        not vectorized.
+        the Appell hypergeometric function, so we use our own
+        (vectorized) :func:`appellf1`.
     """
     # 2011-04-15 15:58 IJC: Created; forking from occultquad
+    # 2026-10-16 13:05 IJMC: Now uses the vectorized appellf1.
     #import pdb
 
     # Initialize:
@@ -1089,19 +1599,17 @@ def occultnonlin(z,p0, cn):
     iM = i03 + i09
 
     # Compute N and M for the appropriate indices:
-    #  (Use the slow, non-vectorized appellf1 function:)
-    myappellf1 = np.frompyfunc(appellf1, 6, 1)
     N = np.zeros((5, z.size), float)
     M = np.zeros((3, z.size), float)
     if iN.any():
-        termN = myappellf1(0.5, 1., 0.5, 0.25*nn + 2.5, am1[iN]/a[iN], -am1[iN]/bma[iN])
+        termN = appellf1(0.5, 1., 0.5, 0.25*nn + 2.5, am1[iN]/a[iN], -am1[iN]/bma[iN])
         N[:, iN] = ((-am1[iN])**(0.25*nn + 1.5)) / np.sqrt(bma[iN]) * \
             special.beta(0.25*nn + 2., 0.5) * \
             (((z2[iN] - p2) / a[iN]) * termN - \
                  special.hyp2f1(0.5, 0.5, 0.25*nn + 2.5, -am1[iN]/bma[iN]))
 
     if iM.any():
-        termM = myappellf1(0.5, -0.25*nn[1:4] - 1., 1., 1., -bma[iM]/am1[iM], -bma[iM]/a[iM]) 
+        termM = appellf1(0.5, -0.25*nn[1:4] - 1., 1., 1., -bma[iM]/am1[iM], -bma[iM]/a[iM]) 
         M[:, iM] = ((-am1[iM])**(0.25*nn[1:4] + 1.)) * \
             (((z2[iM] - p2)/a[iM]) * termM - \
                  special.hyp2f1(-0.25*nn[1:4] - 1., 0.5, 1., -bma[iM]/am1[iM]))
@@ -1143,7 +1651,7 @@ def occultnonlin(z,p0, cn):
 
     # Case 8: (Gauss and Appell hypergeometric functions)
     F[i08a] = 0.
-    F[i08] =  -(1. / (np.pi*twoOmega)) * (N[:, i02] * cc/(nn + 4.) ).sum(0)
+    F[i08] =  -(1. / (np.pi*twoOmega)) * (N[:, i08] * cc/(nn + 4.) ).sum(0)
 
     # Case 9: (Gauss and Appell hypergeometric functions)
     F[i09] = (0.5/twoOmega) * \
@@ -1162,6 +1670,326 @@ def occultnonlin(z,p0, cn):
     return F
 
 
+class occultgrid:
+    """Precomputed, interpolated (z, p) grid for fast transit light curves.
+
+    Both :func:`occultquad` and :func:`occultnonlin` light curves are
+    linear combinations of a few terms that depend only on z and p
+    (e.g., the uniform-disk, lambda^d and eta^d terms returned by
+    occultquad(retall=True)); only the weights depend on the
+    limb-darkening coefficients.  This object computes those terms
+    once on a dense grid, after which each model evaluation is just a
+    bilinear interpolation -- no elliptic integrals or hypergeometric
+    functions are needed.
+
+    :INPUTS:
+      prange : 2-sequence
+        Minimum and maximum planet/star radius ratios to tabulate.
+
+    :OPTIONS:
+      law : str
+        'quadratic' (also handles linear and uniform limb-darkening)
+        or 'nonlinear' (4-parameter law of Mandel & Agol, Sec. 3;
+        also handles root-square and uniform limb-darkening).
+
+      nz, nk : ints
+        Number of grid points in z and in p, respectively.
+
+      zmax : scalar
+        Maximum tabulated z; defaults to 1 + prange[1] (beyond which
+        there is no transit).
+
+      checkerr : bool
+        If True, compute the exact terms at the center of every grid
+        cell and record the maximum interpolation error in each term
+        (attribute 'maxerr'; see :meth:`maxerror`).
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        import numpy as np
+        grid = transit.occultgrid([0.08, 0.12])
+        z = np.abs(np.linspace(-1.3, 1.3, 1e5))
+        f_grid = grid(z, 0.1, [.3, .2])
+        f_exact = transit.occultquad(z, 0.1, [.3, .2])
+        print grid.maxerror([.3, .2]), np.abs(f_grid - f_exact).max()
+
+    :NOTES:
+      Interpolation error scales as the square of the grid spacing,
+      except near the contact points (z = 1 +/- p) where the light
+      curve has a kink and the error is first-order.  With the
+      default grid (nz=2000, nk=100) and |prange| ~ 0.05, the maximum
+      error is typically a few times 1e-6 in relative flux; call
+      :meth:`maxerror` for an estimate on your grid.
+
+      The grid costs a few seconds to build for 'quadratic', but much
+      longer for 'nonlinear' (which uses :func:`occultnonlin`), so
+      build it once per fit.
+
+    :SEE ALSO:
+      :func:`occultquad`, :func:`occultnonlin`, :func:`modeltransit_general`
+    """
+    # 2026-10-16 11:20 IJMC: Created
+    # 2026-10-17 19:10 IJMC: Nodes at z = p and z = |1-p| now computed from
+    #                        one-sided values; check coefficient counts.
+
+    def __init__(self, prange, law='quadratic', nz=2000, nk=100, zmax=None, checkerr=True, verbose=False):
+        if law not in ('quadratic', 'nonlinear'):
+            raise ValueError("law must be 'quadratic' or 'nonlinear' (you set %s)" % law)
+        if nz < 2 or nk < 2 or not (prange[1] > prange[0] >= 0):
+            raise ValueError("Need nz>=2, nk>=2, and 0 <= prange[0] < prange[1].")
+
+        if zmax is None:
+            zmax = 1. + prange[1]
+
+        self.law = law
+        self.zgrid = np.linspace(0, zmax, nz)
+        self.pgrid = np.linspace(prange[0], prange[1], nk)
+        self.dz = self.zgrid[1] - self.zgrid[0]
+        self.dp = self.pgrid[1] - self.pgrid[0]
+
+        if verbose: print "Computing %i x %i %s grid..." % (nk, nz, law)
+        self.basis = self._computebasis(self.zgrid, self.pgrid)
+
+        if checkerr:
+            if verbose: print "Checking interpolation errors at cell centers..."
+            zmid = self.zgrid[0:-1] + 0.5*self.dz
+            pmid = self.pgrid[0:-1] + 0.5*self.dp
+            exact = self._computebasis(zmid, pmid)
+            interp = self.interpolate(zmid.reshape(1, nz-1), pmid.reshape(nk-1, 1))
+            self.maxerr = np.abs(interp - exact).reshape(exact.shape[0], -1).max(1)
+        else:
+            self.maxerr = None
+
+        return
+
+    def _computebasis(self, z, p, zsafe=1e-8):
+        """Compute the light-curve terms at all (p, z) pairs.
+
+        The direct calculations are unreliable exactly at (or within
+        rounding error of) z = p and z = |1-p|, where they switch
+        between special cases.  Such points are replaced by the mean
+        of the terms at z - zsafe and z + zsafe; the terms are
+        continuous there, so this costs an error of only ~zsafe.
+
+        Returns an array of shape (nterm, p.size, z.size)."""
+        basis = self._evalbasis(z, p)
+
+        pcol = p.reshape(p.size, 1)
+        special = (np.abs(z - pcol) < zsafe) + (np.abs(z - np.abs(1. - pcol)) < zsafe)
+        for ip, iz in zip(*special.nonzero()):
+            zpm = np.abs(z[iz] + np.array([-zsafe, zsafe]))
+            basis[:, ip, iz] = self._evalbasis(zpm, p[ip:ip+1])[:, 0].mean(1)
+
+        # Patch over any remaining non-finite values by interpolating
+        # along z:
+        bad = np.logical_not(np.isfinite(basis))
+        if bad.any():
+            for ii, jj in zip(*bad.any(2).nonzero()):
+                good = np.logical_not(bad[ii,jj])
+                basis[ii,jj] = np.interp(z, z[good], basis[ii,jj][good])
+
+        return basis
+
+    def _evalbasis(self, z, p):
+        """Directly compute the light-curve terms at all (p, z) pairs
+        (see :meth:`_computebasis`)."""
+        pcol = p.reshape(p.size, 1)
+        if self.law=='quadratic':
+            F, lambdae, lambdad, etad = occultquad(z, pcol, [0., 0.], retall=True)
+            # Tabulate the continuous combination that enters the flux:
+            basis = np.array([lambdae, lambdad + (2./3.) * (pcol > z), etad])
+        else:
+            basis = np.zeros((5, p.size, z.size), float)
+            for n in xrange(5):
+                cn = np.zeros(4, float)
+                if n>0: cn[n-1] = 1.
+                F = np.array([occultnonlin(z, pp, cn) for pp in p])
+                basis[n] = (1. - F) * 2. / (n + 4.)
+        return basis
+
+    def _weights(self, coef):
+        """Return (term weights, normalization) for limb-darkening
+        coefficients 'coef'."""
+        if coef is None:
+            coef = []
+        coef = np.array(coef, dtype=float, copy=False).ravel()
+        ncoef = dict(quadratic=2, nonlinear=4)[self.law]
+        if coef.size > ncoef:
+            raise ValueError("A '%s' grid takes at most %i limb-darkening coefficients (you passed %i)." % (self.law, ncoef, coef.size))
+        if self.law=='quadratic':
+            gamma = np.concatenate((coef, [0.]*(2-coef.size)))
+            c2 = gamma[0] + 2*gamma[1]
+            c4 = -gamma[1]
+            weights = np.array([1. - c2, c2, -c4])
+            norm = 1. - gamma[0]/3. - gamma[1]/6.
+        else:
+            cn = np.concatenate((coef, [0.]*(4-coef.size)))
+            weights = np.concatenate(([1. - cn.sum()], cn))
+            norm = (2. * weights / np.arange(4., 9.)).sum()
+        return weights, norm
+
+    def interpolate(self, z, p, basis=None):
+        """Bilinearly interpolate the tabulated terms to (z, p).
+
+        z and p must broadcast against each other; returns an array
+        of shape (nterm,) + z.shape.  If 'basis' is input (an array of
+        shape (nterm, nk, nz)), it is interpolated instead of the
+        stored terms."""
+        z = np.abs(np.array(z, dtype=float, copy=False))
+        p = np.abs(np.array(p, dtype=float, copy=False))
+        z, p = np.broadcast_arrays(z, p)
+        if (p < self.pgrid[0]).any() or (p > self.pgrid[-1]).any():
+            raise ValueError("Some p values lie outside the tabulated range [%s, %s]" % \
+                                 (self.pgrid[0], self.pgrid[-1]))
+
+        if basis is None:
+            basis = self.basis
+        nterm, nk, nz = basis.shape
+        ret = np.zeros((nterm,) + z.shape, float)
+        inside = z < self.zgrid[-1]
+        zf = z[inside] / self.dz
+        pf = (p[inside] - self.pgrid[0]) / self.dp
+        iz = np.minimum(zf.astype(int), nz-2)
+        ip = np.minimum(pf.astype(int), nk-2)
+        fz = zf - iz
+        fp = pf - ip
+        i00 = ip*nz + iz
+        flatbasis = basis.reshape(nterm, nk*nz)
+        ret[:, inside] = \
+            (flatbasis[:, i00] * (1. - fz) + flatbasis[:, i00+1] * fz) * (1. - fp) + \
+            (flatbasis[:, i00+nz] * (1. - fz) + flatbasis[:, i00+nz+1] * fz) * fp
+
+        return ret
+
+    def __call__(self, z, p, coef=None):
+        """Return the interpolated light curve at (z, p), for
+        limb-darkening coefficients 'coef' (None for a uniform disk).
+        Coefficients are as for :func:`occultquad` (law='quadratic')
+        or :func:`occultnonlin` (law='nonlinear'); missing trailing
+        coefficients are taken to be zero, and passing too many
+        raises a ValueError."""
+        weights, norm = self._weights(coef)
+        # Combine the terms on the grid first, so only one table need
+        # be interpolated:
+        deficit = np.tensordot(weights / norm, self.basis, axes=(0,0))
+        nk, nz = deficit.shape
+        return 1. - self.interpolate(z, p, deficit.reshape(1, nk, nz))[0]
+
+    def maxerror(self, coef=None):
+        """Estimate of the interpolation error (in relative flux) for
+        the given limb-darkening coefficients: the maximum error seen
+        at the grid-cell centers when the grid was built.  This is not
+        a strict bound; the error elsewhere in a cell may be larger."""
+        if self.maxerr is None:
+            return None
+        weights, norm = self._weights(coef)
+        return (np.abs(weights) * self.maxerr).sum() / np.abs(norm)
+
+
+class supersampler:
+    """Integrate light-curve models over finite exposure times.
+
+    The supersampled time grid is computed once, and the exposures
+    are indexed once (see :class:`ephemerisindex`).  Each model
+    evaluation then computes the model at every exposure midpoint,
+    and replaces it with the average over 'numint' sub-exposures only
+    for exposures that overlap a transit or eclipse (from first to
+    fourth contact).  Elsewhere a light curve is very nearly linear
+    in time over one exposure, so the midpoint value is already the
+    exposure average.
+
+    :INPUTS:
+      t : NumPy array
+        Midpoint times of the exposures.
+
+      exptime : scalar
+        Exposure duration, in the same units as 't'.
+
+      numint : int >= 1
+        Number of sub-exposures to average over.
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        ss = transit.supersampler(time, 30./1440, 15)  # Kepler long cadence
+        model = transit.modeltransit_general(params, time, 2, 1, supersample=ss)
+
+    :NOTES:
+      Pass the same supersampler to every model call for a given
+      time array (e.g., throughout a fit).  Sub-exposures are
+      centered in equal intervals spanning each exposure, as for
+      :func:`modeltransit_batman`.
+
+    :SEE ALSO:
+      :func:`modeltransit_general`, :func:`modeleclipse_simple`,
+      :func:`modellightcurve`
+    """
+    # 2026-10-17 13:10 IJMC: Created
+
+    def __init__(self, t, exptime, numint):
+        if numint < 1:
+            raise ValueError("numint must be >= 1 (you set %s)" % numint)
+        t = np.array(t, dtype=float, copy=False)
+        self.t = t
+        self.exptime = float(exptime)
+        self.numint = int(numint)
+        self.offsets = self.exptime * ((np.arange(self.numint) + 0.5) / self.numint - 0.5)
+        self.tgrid = t.reshape(t.size, 1) + self.offsets
+        self.index = ephemerisindex(t)
+
+    def select(self, windows=None):
+        """Indices of the exposures overlapping any of 'windows', a
+        list of (center, period, lo, hi): i.e., the intervals
+        [center + lo, center + hi] repeating every period.  If
+        'windows' is None, return all exposures."""
+        if windows is None or any([(hi - lo + self.exptime) >= per for center, per, lo, hi in windows]):
+            return np.arange(self.t.size)
+        self.index.events.clear()
+        for ii, (center, per, lo, hi) in enumerate(windows):
+            self.index.add(ii, center + 0.5*(lo + hi), per, (hi - lo) + self.exptime)
+        return np.nonzero(self.index.inwindow())[0]
+
+    def integrate(self, modelfunc, windows=None):
+        """Compute the exposure-averaged model.
+
+        :INPUTS:
+          modelfunc : function
+            Called as modelfunc(times, index), where 'index' gives
+            the exposure to which each of 'times' belongs (None if
+            'times' are the exposure midpoints themselves, in order).
+
+          windows : list or None
+            Intervals in which to supersample; see :meth:`select`.
+        """
+        model = modelfunc(self.t, None)
+        if not isinstance(model, np.ndarray):  # Error flag
+            return model
+        if self.numint > 1:
+            ind = self.select(windows)
+            if ind.size > 0:
+                submodel = modelfunc(self.tgrid[ind].ravel(), np.repeat(ind, self.numint))
+                model = np.array(model, dtype=float, copy=True)
+                model.ravel()[ind] = submodel.reshape(ind.size, self.numint).mean(1)
+        return model
+
+def _eventwindows(centers, per, inc, ars, k):
+    """Transit/eclipse intervals (first to fourth contact) for
+    :meth:`supersampler.select`, for a circular orbit with
+    conjunctions at 'centers'.  Returns None (i.e., supersample
+    everywhere) for unphysical parameters."""
+    # 2026-10-17 13:10 IJMC: Created
+    if not (per > 0 and ars > (1. + k) and k >= 0 and inc <= 90):
+        return None
+    with np.errstate(invalid='ignore'):
+        dt14 = z2dt_circular(per, inc, ars, 1. + k)
+    if not np.isfinite(dt14):  # No transit
+        return []
+    return [(center, per, -dt14, dt14) for center in centers]
+
+
 def modeltransit(params, func, per, t):
     """Model a transit light curve of arbitrary type to a flux time
     series, assuming zero eccentricity and a fixed, KNOWN period.
@@ -1220,7 +2048,7 @@ def modeltransit(params, func, per, t):
 
     return model
 
-def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=None):
+def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=None, table=None, supersample=None):
     """Model a transit light curve of arbitrary type to a flux time
     series, assuming zero eccentricity.
 
@@ -1291,6 +2119,19 @@ def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=
         the constant offset term), it is preferable that the state
         vectors are all mean-subtracted.
 
+      table : None or :class:`occultgrid` object
+        If set, interpolate the light curve from this precomputed
+        grid instead of computing it directly (much faster, at the
+        cost of a small interpolation error; see
+        :meth:`occultgrid.maxerror`).  For NL=1 or 2 the grid must use
+        law='quadratic'; for NL=-2, 3, or 4 it must use
+        law='nonlinear'.  If Rp/R* falls outside the tabulated range,
+        the light curve is computed directly.
+
+      supersample : None or :class:`supersampler` object
+        If set (for this 't'), integrate the model over each
+        exposure.
+
     :NOTES:      
 
       If quadratic or linear limb-darkening (L.D.) is used, the sum of
@@ -1310,6 +2151,11 @@ def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=
     # 2013-04-18 10:22 IJMC: Apply penalty scaling in 'sqrt' case if
     #                        coefficients give nonphysical intensity values.
     # 2013-04-22 17:43 IJMC: Fixed a few errors in the documentation.
+    # 2026-10-16 11:50 IJMC: Added 'table' option.
+    # 2026-10-17 13:10 IJMC: Added 'supersample' option.
+    # 2026-10-17 19:10 IJMC: Check that 'table' matches NL.
+    # 2026-10-17 20:50 IJMC: Apply the parameter constraints before
+    #                        computing supersampling windows.
 
 
     ecc = 0.
@@ -1321,6 +2167,7 @@ def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=
         if isinstance(svs, np.ndarray) and svs.ndim==1:
             svs = svs.reshape(1, svs.size)
         nsvs = len(svs)
+
     nparam = len(params) - nsvs
 
     verbose = False
@@ -1353,6 +2200,18 @@ def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=
         ra = 1e-6
         penalty_factor *= errscale
 
+    if supersample is not None:
+        # Each sub-exposure model applies the constraints (and
+        # penalties) above itself:
+        def model(time, index):
+            if index is None or nsvs==0:
+                ssvs = svs
+            else:
+                ssvs = [sv[index] for sv in svs]
+            return modeltransit_general(params, time, NL, NP=NP, errscale=errscale, smallplanet=smallplanet, svs=ssvs, table=table)
+        windows = _eventwindows([tc], per, inc, 1./ra, k)
+        return supersample.integrate(model, windows)
+
     # Enforce the constraint that cos(i) <= 1.
     #print ("%1.5f "*4) % (tc, per, inc, ra)
     z = t2z(tc, per, inc, t, 1./ra, ecc=ecc, longperi=longperi, transitonly=True)
@@ -1361,7 +2220,22 @@ def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=
     if NL<>0 and (sum(ld_params)>1 or sum(ld_params)<0):
         penalty_factor *= errscale
 
-    if NL==0:  # Uniform 
+    if table is not None:
+        if (NL in (1, 2) and table.law<>'quadratic') or \
+                (NL in (-2, 3, 4) and table.law<>'nonlinear'):
+            raise ValueError("NL=%i cannot use a '%s' occultgrid table." % (NL, table.law))
+        elif NL not in (0, 1, 2, -2, 3, 4):
+            raise ValueError("NL must be one of 0, 1, 2, -2, 3, or 4 (you set %s)." % NL)
+
+    if table is not None and table.pgrid[0] <= k <= table.pgrid[-1]:
+        if NL==0:
+            model = table(z, k)
+        elif NL==-2:
+            model = table(z, k, [ld_params[1], ld_params[0], 0., 0.])
+        else:
+            model = table(z, k, ld_params)
+
+    elif NL==0:  # Uniform 
         model = occultuniform(z, k)
 
     elif NL==2 or NL==1:  # Quadratic or Linear
@@ -1388,6 +2262,105 @@ def modeltransit_general(params, t, NL, NP=1, errscale=1, smallplanet=True, svs=
     return model
 
 
+def modeltransit_general_batch(params, t, NL, NP=1, errscale=1, svs=None):
+    """Model transit light curves for many parameter sets at once,
+    assuming zero eccentricity.
+
+    :INPUTS:
+      params -- (N x (5 + NP + NL + NS)) array.  Each row is a
+        parameter set as described in :func:`modeltransit_general`
+        (e.g., the positions of all walkers in an emcee ensemble).
+
+      t -- numpy array.  Time of observations.
+
+      NL -- int.  Number of limb-darkening parameters; only uniform
+        (NL=0), linear (NL=1), and quadratic (NL=2) limb-darkening
+        are supported.
+
+    :OPTIONS:
+      NP, errscale, svs -- as for :func:`modeltransit_general`
+
+    :RETURNS:
+      (N x M) array, where M is the number of elements in 't'; row
+      'i' is identical to modeltransit_general(params[i], t, ...).
+
+    :NOTES:
+      The same normalization constraints as in
+      :func:`modeltransit_general` are applied row-by-row.
+
+    :SEE ALSO:
+      :func:`occultquad_batch`, :func:`phasecurves.lnprobfunc_batch`
+    """
+    # 2026-10-16 10:30 IJMC: Created
+
+    params = np.array(params, dtype=float, copy=True)
+    if params.ndim==1:
+        params = params.reshape(1, params.size)
+    nset = params.shape[0]
+    t = np.array(t, copy=False)
+
+    if svs is None:
+        nsvs = 0
+    else:
+        if isinstance(svs, np.ndarray) and svs.ndim==1:
+            svs = svs.reshape(1, svs.size)
+        nsvs = len(svs)
+
+    # Column vectors, one value per parameter set:
+    tc, per, inc, ra, k = [params[:, ii:ii+1] for ii in range(5)]
+    if NP>0:
+        poly_params = params[:, 5:5+NP]
+    else:
+        poly_params = np.ones((nset, 1), float)
+
+    pNL = np.abs(NL)
+    if pNL>0:
+        ld_params = params[:, 5+NP:5+NP+pNL]
+
+    penalty_factor = np.ones((nset, 1), float)
+    # Enforce various normalization constraints:
+    bad = inc > 90
+    inc[bad] = 90.
+    penalty_factor[bad] *= errscale
+
+    bad = per < 0.01
+    per[bad] = 0.01
+    penalty_factor[bad] *= errscale
+
+    bad = k < 0
+    k[bad] = 0.
+    penalty_factor[bad] *= errscale
+
+    bad = ra <= 0
+    ra[bad] = 1e-6
+    penalty_factor[bad] *= errscale
+
+    z = t2z(tc, per, inc, t, 1./ra, transitonly=True)
+
+    if NL<>0:
+        ldsum = ld_params.sum(1)
+        penalty_factor[(ldsum > 1) + (ldsum < 0)] *= errscale
+
+    if NL==0:  # Uniform 
+        model = occultuniform(z, k)
+    elif NL==2 or NL==1:  # Quadratic or Linear
+        model = occultquad_batch(z, k, ld_params)
+    else:
+        print "Only NL=0, 1, or 2 are supported in batch mode (you set NL=%s)" % NL
+        return -1
+
+    # Evaluate the normalizing polynomials:
+    baseline = np.zeros(model.shape, float)
+    for jj in xrange(poly_params.shape[1]):
+        baseline = baseline * t + poly_params[:, jj:jj+1]
+    model *= baseline
+    for ii in xrange(nsvs): 
+        model += params[:, -ii-1:params.shape[1]-ii] * svs[-ii-1]
+
+    model *= penalty_factor
+    return model
+
+
 def modeleclipse(params, func, per, t):
     """Model an eclipse light curve of arbitrary type to a flux time
     series, assuming zero eccentricity and a fixed, KNOWN period.
@@ -1446,7 +2419,7 @@ def modeleclipse(params, func, per, t):
     return model
 
 
-def modellightcurve(params, t, tfunc=occultuniform, nlimb=0, nchan=0):
+def modellightcurve(params, t, tfunc=occultuniform, nlimb=0, nchan=0, supersample=None):
     """Model a full planetary light curve: transit, eclipse, and
     (sinusoidal) phase variation. Accept independent eclipse and
     transit times-of-center, but otherwise assume a circular orbit
@@ -1510,6 +2483,9 @@ def modellightcurve(params, t, tfunc=occultuniform, nlimb=0, nchan=0):
          number of photometric channel sensitivity perturbations;
          these should be the first 'nchan' values of params.
 
+      supersample : None or :class:`supersampler` object
+         If set (for this 't'), integrate the model over each exposure.
+
     :EXAMPLE:
        TBW
 
@@ -1520,6 +2496,7 @@ def modellightcurve(params, t, tfunc=occultuniform, nlimb=0, nchan=0):
     # 2011-06-10 11:10 IJMC: Created.
     # 2011-06-14 13:18 IJMC: Sped up with creation of z2dt()
     # 2011-06-30 21:00 IJMC: Fixed functional form of phase curve.
+    # 2026-10-17 13:10 IJMC: Added 'supersample' option.
     from scipy import optimize
     import pdb
 
@@ -1529,6 +2506,20 @@ def modellightcurve(params, t, tfunc=occultuniform, nlimb=0, nchan=0):
         params = params[nchan::].copy()
         cparams[0] = 1./(1. + cparams[1::]).prod() - 1.
 
+    if supersample is not None:
+        def model(time, index):
+            return modellightcurve(params, time, tfunc=tfunc, nlimb=nlimb)
+        tt, te, per, b, ra, k = params[0:6]
+        if np.abs(b * ra) > 1:
+            windows = None
+        else:
+            windows = _eventwindows([tt, te], per, (180./np.pi)*np.arccos(b * ra), 1./ra, k)
+        full_curve = supersample.integrate(model, windows)
+        if nchan>0 and isinstance(full_curve, np.ndarray):
+            full_curve = (full_curve.reshape(nchan, full_curve.size/nchan) * \
+                (1. + cparams.reshape(nchan, 1))).reshape(full_curve.shape)
+        return full_curve
+
     nparam = len(params)
     tt, te, per, b, ra, k, fstar, fbright, fdark, phi = params[0:10]
     if nparam > 10:
@@ -1641,7 +2632,7 @@ def modellightcurve(params, t, tfunc=occultuniform, nlimb=0, nchan=0):
     return full_curve
 
 
-def modeleclipse_simple(params, tparams, func, t):
+def modeleclipse_simple(params, tparams, func, t, supersample=None):
     """Model an eclipse light curve of arbitrary type to a flux time
     series, assuming zero eccentricity and a fixed, KNOWN orbit.
 
@@ -1665,11 +2656,25 @@ def modeleclipse_simple(params, tparams, func, t):
       func -- function to fit to data; presumably :func:`transit.occultuniform`
 
       t -- numpy array.  Time of observations.
+
+    :OPTIONS:
+      supersample -- None or :class:`supersampler` object.  If set
+        (for this 't'), integrate the model over each exposure.
     """
     # 2011-05-31 08:35 IJMC: Created anew, specifically for eclipses.
+    # 2026-10-17 13:10 IJMC: Added 'supersample' option.
 
     ecc = 0.
    
+    if supersample is not None:
+        def model(time, index):
+            return modeleclipse_simple(params, tparams, func, time)
+        cosi = tparams[0] * tparams[1]
+        if np.abs(cosi) > 1:
+            windows = None
+        else:
+            windows = _eventwindows([params[0], params[0] + 0.5*tparams[3]], tparams[3], (180./np.pi)*np.arccos(cosi), 1./tparams[1], tparams[2])
+        return supersample.integrate(model, windows)
 
     if (tparams[0] * tparams[1]) > 1:  # cos(i) > 1: impossible!
         return -1
@@ -2319,7 +3324,219 @@ def fiteclipse(data, sv, ords, tlc, edata=None, index=None, dotransit=True, dopb
 
 
 
-def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=None, dopb=False, domcmc=False, gaussprior=None, ngaussprior=None, uniformprior=None, nsigma=5, maxiter=10, parinfo=None, nthread=1, nstep=2000, nwalker_factor=8, GRmetric=1.03, xtol=1e-12, ftol=1e-10, errscale=1e6, svs=None, verbose=False, savefile=None, numint=None, ninterval=None):
+def modeltransit_general_jacobian(params, t, NL, NP=1, errscale=1, svs=None):
+    """Model a transit light curve (as :func:`modeltransit_general`)
+    along with its analytic Jacobian.
+
+    :INPUTS:
+      params, t, NL, NP, errscale, svs -- as for
+        :func:`modeltransit_general`.  Only uniform (NL=0), linear
+        (NL=1), and quadratic (NL=2) limb-darkening are supported, and
+        the orbit is circular.
+
+    :RETURNS:
+      (model, jacobian), where 'jacobian' has shape (Npar x M): row
+      'i' is the partial derivative of the model with respect to
+      params[i].  Parameters pinned by the normalization constraints
+      of :func:`modeltransit_general` have zero derivative.
+
+    :EXAMPLE:
+      ::
+
+        # Levenberg-Marquardt fit with analytic derivatives:
+        import transit
+        from scipy import optimize
+        NL, NP = 2, 1
+        sw = np.sqrt(weights)
+        def res(p):
+            return (transit.modeltransit_general(p, t, NL, NP) - data) * sw
+        def jac(p):
+            return transit.modeltransit_general_jacobian(p, t, NL, NP)[1] * sw
+        fit = optimize.leastsq(res, guess, Dfun=jac, col_deriv=1, full_output=True)
+
+    :SEE ALSO:
+      :func:`occultquad_deriv`, :func:`occultuniform_deriv`, :func:`t2z_deriv`
+    """
+    # 2026-10-16 23:40 IJMC: Created
+
+    params = np.array(params, dtype=float, copy=False)
+    t = np.array(t, dtype=float, copy=False)
+    npar = params.size
+
+    if svs is None:
+        nsvs = 0
+    else:
+        if isinstance(svs, np.ndarray) and svs.ndim==1:
+            svs = svs.reshape(1, svs.size)
+        nsvs = len(svs)
+
+    tc, per, inc, ra, k = params[0:5]
+    if NP>0:
+        poly_params = params[5:5+NP]
+    else:
+        poly_params = [1]
+
+    pNL = np.abs(NL)
+    if pNL>0:
+        ld_params = params[5+NP:5+NP+pNL]
+
+    # Normalization constraints, as in modeltransit_general:
+    penalty_factor = 1.
+    pinned = np.zeros(npar, bool)
+    if inc > 90:
+        inc, pinned[2] = 90., True
+        penalty_factor *= errscale
+    if per < 0.01:
+        per, pinned[1] = 0.01, True
+        penalty_factor *= errscale
+    if k < 0:
+        k, pinned[4] = 0., True
+        penalty_factor *= errscale
+    if ra <= 0:
+        ra, pinned[3] = 1e-6, True
+        penalty_factor *= errscale
+    if NL<>0 and (sum(ld_params)>1 or sum(ld_params)<0):
+        penalty_factor *= errscale
+
+    z, dztt, dzper, dzinc, dzars = t2z_deriv(tc, per, inc, t, 1./ra, transitonly=True)
+
+    if NL==0:  # Uniform 
+        F, dFdz, dFdk = occultuniform_deriv(z, k)
+        dFdld = []
+    elif NL==2 or NL==1:  # Quadratic or Linear
+        F, dFdz, dFdk, dFdg1, dFdg2 = occultquad_deriv(z, k, ld_params)
+        dFdld = [dFdg1, dFdg2][0:NL]
+    else:
+        print "Only NL=0, 1, or 2 are supported (you set NL=%s)" % NL
+        return -1
+
+    baseline = np.polyval(poly_params, t)
+    model = F * baseline
+    for ii in xrange(nsvs): 
+        model += params[-ii-1] * svs[-ii-1]
+
+    jacobian = np.zeros((npar, t.size), float)
+    jacobian[0] = dFdz * dztt * baseline
+    jacobian[1] = dFdz * dzper * baseline
+    jacobian[2] = dFdz * dzinc * baseline
+    jacobian[3] = dFdz * dzars * (-1. / ra**2) * baseline
+    jacobian[4] = dFdk * baseline
+    for jj in xrange(NP):
+        jacobian[5+jj] = F * t**(NP-1-jj)
+    for jj in xrange(len(dFdld)):
+        jacobian[5+NP+jj] = dFdld[jj] * baseline
+    for ii in xrange(nsvs):
+        jacobian[npar-ii-1] = svs[-ii-1]
+    jacobian[pinned] = 0.
+
+    return model * penalty_factor, jacobian * penalty_factor
+
+def modeltransit_channels(params, z, t, NL, NP=1, errscale=1, smallplanet=True):
+    """Model transit light curves in many wavelength channels that
+    share a single orbital geometry.
+
+    :INPUTS:
+      params -- (Nchan x (1 + NP + |NL|)) array.  Each row holds,
+        for one channel:
+
+          Rp/R*, the planet-to-star radius ratio,
+
+          the NP polynomial coefficients to normalize the data (as
+          in :func:`modeltransit_general`), and
+
+          the |NL| limb-darkening parameters (as in
+          :func:`modeltransit_general`).
+
+        A 1D array is treated as a single channel.
+
+      z -- 1D NumPy array.  Planet-star separation at each time,
+        e.g. from :func:`t2z`; it is computed once and shared by all
+        channels.
+
+      t -- 1D NumPy array.  Time of observations (only used for the
+        normalizing polynomials).
+
+      NL -- int.  Number (and type) of limb-darkening parameters, as
+        in :func:`modeltransit_general`.
+
+    :OPTIONS:
+      NP, errscale, smallplanet -- as for :func:`modeltransit_general`
+
+    :RETURNS:
+      (Nchan x M) array, where M is the number of elements in 'z'.
+      If 'params' is 1D, a 1D array of length M (so this can be used
+      with :func:`phasecurves.errfunc`, etc.).
+
+    :NOTES:
+      For uniform, linear and quadratic limb-darkening all channels
+      are computed in a single (channel x time) pass; for the
+      nonlinear laws, one call per channel is made.
+
+    :SEE ALSO:
+      :func:`analyzetransit_channels`, :func:`occultquad_batch`
+    """
+    # 2026-10-16 21:40 IJMC: Created
+
+    params = np.array(params, dtype=float, copy=True)
+    onechan = params.ndim==1
+    if onechan:
+        params = params.reshape(1, params.size)
+    nchan = params.shape[0]
+    z = np.array(z, copy=False)
+    t = np.array(t, copy=False)
+
+    k = params[:, 0:1]
+    if NP>0:
+        poly_params = params[:, 1:1+NP]
+    else:
+        poly_params = np.ones((nchan, 1), float)
+
+    pNL = np.abs(NL)
+    if pNL>0:
+        ld_params = params[:, 1+NP:1+NP+pNL]
+
+    penalty_factor = np.ones((nchan, 1), float)
+    bad = k < 0
+    k[bad] = 0.
+    penalty_factor[bad] *= errscale
+
+    if NL<>0:
+        ldsum = ld_params.sum(1)
+        penalty_factor[(ldsum > 1) + (ldsum < 0)] *= errscale
+
+    if NL==0:  # Uniform 
+        model = occultuniform(z, k)
+    elif NL==2 or NL==1:  # Quadratic or Linear
+        model = occultquad_batch(z, k, ld_params)
+    elif NL==-2 or NL==3 or NL==4:  # Root-square or nonlinear
+        if smallplanet:
+            func = occultnonlin_small
+        else:
+            func = occultnonlin
+        model = np.zeros((nchan, z.size), float)
+        for ii in xrange(nchan):
+            if NL==-2:
+                cn = [ld_params[ii,1], ld_params[ii,0], 0., 0.]
+            else:
+                cn = ld_params[ii]
+            model[ii] = func(z, k[ii,0], cn)
+    else:
+        print "Invalid limb-darkening type (NL=%s)" % NL
+        return -1
+
+    # Evaluate the normalizing polynomials:
+    baseline = np.zeros(model.shape, float)
+    for jj in xrange(poly_params.shape[1]):
+        baseline = baseline * t + poly_params[:, jj:jj+1]
+    model *= baseline
+    model *= penalty_factor
+
+    if onechan:
+        model = model[0]
+    return model
+
+
+def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=None, dopb=False, domcmc=False, gaussprior=None, ngaussprior=None, uniformprior=None, nsigma=5, maxiter=10, parinfo=None, nthread=1, nstep=2000, nwalker_factor=8, GRmetric=1.03, xtol=1e-12, ftol=1e-10, errscale=1e6, svs=None, verbose=False, savefile=None, numint=None, ninterval=None, checkpoint=None, checkevery=200, mintau=50):
     """
     Fit transit to data, and estimate uncertainties on the fit.
 
@@ -2373,13 +3590,38 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
        If True, run Markov Chain Monte Carlo error analysis (requires EmCee)
 
      GRmetric : scalar > 1
-       When Gelman-Rubin metric reaches this value or less, MCMC
-       analysis terminates.
+       When Gelman-Rubin metric reaches this value or less (and the
+       chains are long enough; see 'mintau'), MCMC analysis
+       terminates.  This is checked every 'checkevery' steps.
 
      nstep : int
        Number of steps for EmCee MCMC run.  This should be *at least*
        several thousand.
 
+     checkpoint : None or str
+       File in which to save the state of the MCMC (walker positions,
+       log-probabilities, random-number state, chains so far, data
+       weights and fitting keywords) every 'checkevery' steps.  If
+       this file exists when the MCMC starts, and was written by a
+       run with the same inputs (time, data, weights, priors,
+       starting parameters, nstep and number of walkers), the
+       initial fits (and prayer-bead analysis) are skipped and the
+       MCMC resumes from it; otherwise it is ignored.  The file is
+       deleted once the MCMC finishes.  If None and 'savefile' is
+       set, use savefile + '.checkpoint.pickle'.
+
+     checkevery : int
+       Number of MCMC steps between checkpoints and convergence checks.
+
+     mintau : scalar
+       Besides the Gelman-Rubin test, also require that the chains
+       be at least this many autocorrelation times long (see
+       :func:`tools.autocorrtime`) before stopping.  The default
+       follows the usual rule of thumb of ~50; autocorrelation times
+       estimated from short chains are biased low, so smaller values
+       risk stopping too early.  Set to 0 to use only the
+       Gelman-Rubin test.
+
      errscale: scalar
        See :func:`modeltransit_general`
 
@@ -2402,6 +3644,16 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
     #                        restarted.
     # 2013-10-09 06:51 IJMC: Added uniformprior option.
     # 2015-11-18 17:58 IJMC: Updated; also now uses BATMAN instead.
+    # 2026-10-17 16:10 IJMC: MCMC now runs in blocks of 'checkevery'
+    #                        steps: it checkpoints to disk (and resumes
+    #                        from a checkpoint), and stops as soon as
+    #                        Gelman-Rubin and autocorrelation tests pass.
+    # 2026-10-17 19:40 IJMC: Checkpoints now carry a fingerprint of the
+    #                        inputs and the fitting keywords, and are
+    #                        deleted when the MCMC finishes.
+    # 2026-10-17 20:25 IJMC: Resuming from a checkpoint now also restores
+    #                        the best fit (and prayer-bead results), and
+    #                        skips the initial fitting.
 
     import emcee
     #from kapteyn import kmpfit
@@ -2422,6 +3674,7 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
     nwalkers = nwalker_factor * ndim
     if nwalkers % 2: nwalkers += 1
     limb_dark, NL = get_ldtype(limb_dark)
+    fingerprint = _mcmcfingerprint(inputparams, time, data, weights, gaussprior, ngaussprior, uniformprior, limb_dark, NP, svs, nsigma, numint, ninterval, nstep, nwalkers, dopb, parinfo)
 
     # Set up State Vectors:
     if svs is None:
@@ -2465,6 +3718,26 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
         weights = np.array(weights, copy=True)
         scaleWeights = False
 
+    # If an interrupted run of this same fit left a checkpoint, restore
+    # its state and skip straight to the MCMC:
+    if domcmc and checkpoint is None and savefile is not None:
+        checkpoint = savefile + '.checkpoint.pickle'
+    ckpt = None
+    if domcmc and checkpoint is not None and os.path.isfile(checkpoint):
+        ckpt = tools.loadpickle(checkpoint, mode='dill')
+        if not isinstance(ckpt, dict) or ckpt.get('fingerprint')<>fingerprint:
+            print "Checkpoint file %s does not match this fit; ignoring it." % checkpoint
+            ckpt = None
+        else:
+            print "Resuming MCMC from checkpoint file %s (%s stage, %i steps)" % (checkpoint, ckpt['stage'], ckpt['nsteps'])
+            weights = ckpt['weights']
+            fitchisq = ckpt['fitchisq']
+            fitkw = ckpt['fitkw']
+            bestparams = ckpt['bestparams']
+            pb_fits = ckpt['pb_fits']
+            p0 = ckpt['p0']
+            newBadPixels = False
+
     ph = time % bestparams[1]
     while newBadPixels and niter <= maxiter:
         fitargs = (modeltransit_batman, time, NL, NP, None, numint, ninterval, data, weights, fitkw)
@@ -2523,10 +3796,13 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
 
     # Redefine fitting arguments, with outliers de-weighted:
     fitargs = (modeltransit_batman, time, NL, NP, None, numint, ninterval, data, weights, fitkw)
-    fitchisq = pc.errfunc(bestparams, *fitargs)
+    if ckpt is None:
+        fitchisq = pc.errfunc(bestparams, *fitargs)
 
     # Now run a prayer-bead analysis.
-    if dopb:
+    if ckpt is not None:
+        pass
+    elif dopb:
         print "Starting prayer-bead analysis"
         pb_fits = an.prayerbead(bestparams, *fitargs, parinfo=parinfo, xtol=xtol)
         bestparams = pb_fits[0].copy()
@@ -2539,6 +3815,8 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
         print "Starting MCMC analysis"
         # Initialize sampler:
         sampler = emcee.EnsembleSampler(nwalkers, ndim, pc.lnprobfunc, args=fitargs, threads=nthread)
+        if ckpt is not None:
+            _mcmcsetchain(sampler, ckpt['chain'], ckpt['lnprobability'], ckpt['naccepted'])
 
         if verbose:
             print '   Initial positions for chains are approximately:'
@@ -2546,11 +3824,23 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
                 print "%17s:  %1.7f +/- %1.7f" % (labs[jjj], np.median(p0[:,jjj]), np.std(p0[:,jjj]))
 
         # Run burn-in
-        pos1, prob1, state1 = sampler.run_mcmc(p0, nstep) #min(2000, nstep))
-        if verbose:
-            print '   Positions after burn-in is approximately:'
-            for jjj in xrange(nparams):
-                print "%17s:  %1.7f +/- %1.7f" % (labs[jjj], np.median(sampler.flatchain[:,jjj]), np.std(sampler.flatchain[:,jjj]))
+        if ckpt is None or ckpt['stage']=='burnin':
+            if ckpt is None:
+                pos1, prob1, state1 = p0, None, None
+            else:
+                pos1, prob1, state1 = ckpt['pos'], ckpt['lnprob'], ckpt['rstate']
+            ckptinfo = dict(stage='burnin', weights=weights, fitchisq=fitchisq, fitkw=fitkw, bestparams=bestparams, pb_fits=pb_fits, p0=p0, iter=0, fingerprint=fingerprint)
+            pos1, prob1, state1, junk = _mcmcblocks(sampler, pos1, nstep, prob1, state1, checkevery, checkpoint, ckptinfo) #min(2000, nstep))
+            if verbose:
+                print '   Positions after burn-in is approximately:'
+                for jjj in xrange(nparams):
+                    print "%17s:  %1.7f +/- %1.7f" % (labs[jjj], np.median(sampler.flatchain[:,jjj]), np.std(sampler.flatchain[:,jjj]))
+            sampler.reset()
+            iter = 0
+            pos2, prob2, state2 = pos1, prob1, state1
+        else:
+            iter = ckpt['iter']
+            pos2, prob2, state2 = ckpt['pos'], ckpt['lnprob'], ckpt['rstate']
         #for ii in range(2):
         #    pos, prob, state = sampler.run_mcmc(pos, max(1, (ii+1)*nstep/5))
         #    if (bestchisq + 2*max(prob)) > ftol: #-2*prob < bestchisq).any(): # Found a better fit! Optimize:
@@ -2574,20 +3864,17 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
         #
         #pos[badpos] = bestparams
 
-        # Run main MCMC run:
-        sampler.reset()
-        iter = 0
+        # Run main MCMC run, stopping as soon as it converges:
         converged = False
-        pos2 = pos1
         while iter < 10 and not converged:
-            pos2, prob2, state2 = sampler.run_mcmc(pos2, nstep)
+            ckptinfo = dict(stage='main', weights=weights, fitchisq=fitchisq, fitkw=fitkw, bestparams=bestparams, pb_fits=pb_fits, p0=p0, iter=iter, fingerprint=fingerprint)
+            pos2, prob2, state2, converged = _mcmcblocks(sampler, pos2, (iter+1)*nstep, prob2, state2, checkevery, checkpoint, ckptinfo, GRmetric=GRmetric, mintau=mintau)
             if verbose:
                 print '   Positions after MCMC-ing are approximately:'
                 for jjj in xrange(nparams):
                     print "%17s:  %1.7f +/- %1.7f" % (labs[jjj], np.median(sampler.flatchain[:,jjj]), np.std(sampler.flatchain[:,jjj]))
             if (np.abs(sampler.lnprobability)>1e6).sum() > (0.5*sampler.lnprobability.size): stop
             GRvalue = tools.gelman_rubin(sampler.chain).max()
-            converged = GRvalue < GRmetric
             iter += 1
             mcmc_params = sampler.chain[sampler.lnprobability==sampler.lnprobability.max()][0]
             mc_chisq1 = pc.errfunc(mcmc_params, *fitargs)
@@ -2610,11 +3897,16 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
                 pos2 = np.array(lightcurveFit[-1])[-nwalkers:]
                 if pos2.shape[0]<nwalkers:  pos2 = np.tile(p0, (nwalkers, 1))[0:nwalkers]
                 sampler.reset()
-                pos2, prob2, state2 = sampler.run_mcmc(pos2, nstep) 
+                ckptinfo = dict(stage='burnin', weights=weights, fitchisq=fitchisq, fitkw=fitkw, bestparams=bestparams, pb_fits=pb_fits, p0=p0, iter=0, fingerprint=fingerprint)
+                pos2, prob2, state2, junk = _mcmcblocks(sampler, pos2, nstep, None, state2, checkevery, checkpoint, ckptinfo)
                 sampler.reset()
                 iter = 0
                 converged = False
 
+        # The MCMC is finished, so the checkpoint is no longer needed:
+        if checkpoint is not None and os.path.isfile(checkpoint):
+            os.remove(checkpoint)
+
         ## Run main MCMC run:
         #pos, prob, state = sampler.run_mcmc(pos, max(1, (ii+1)*nstep/4))
         #sampler.reset()
@@ -2709,8 +4001,575 @@ def analyzetransit_general(params, time, data, limb_dark=None, NP=1, weights=Non
 
 
 
-def bls_simple(times, flux, prange, dlogper=0.0004, nbins=150, maxwid=10, nthreads=1):
-    """Implement a simple/stupid version of the Box-Least-Squares algorithm.
+def _mcmcblocks(sampler, pos, nstep, lnprob=None, rstate=None, checkevery=200, checkpoint=None, ckptinfo=None, GRmetric=None, mintau=0):
+    """Advance an emcee sampler (in blocks of 'checkevery' steps) until
+    its chains are 'nstep' steps long.  Helper function for
+    :func:`analyzetransit_general`.
+
+    After each block, write a checkpoint (if 'checkpoint' is a
+    filename) containing the dict 'ckptinfo' plus the sampler state.
+    If 'GRmetric' is set, stop early once the chains pass the
+    Gelman-Rubin test (:func:`tools.gelman_rubin`) and are at least
+    'mintau' autocorrelation times long (:func:`tools.autocorrtime`).
+
+    Returns (pos, lnprob, rstate, converged)"""
+    # 2026-10-17 16:10 IJMC: Created
+    import tools
+
+    while True:
+        ndone = sampler.chain.shape[1]
+        converged = False
+        if GRmetric is not None and ndone > sampler.chain.shape[0]:
+            converged = tools.gelman_rubin(sampler.chain).max() < GRmetric
+            if converged and mintau > 0:
+                converged = ndone >= mintau * tools.autocorrtime(sampler.chain).max()
+        if converged or ndone >= nstep:
+            break
+
+        nblock = min(checkevery, nstep - ndone)
+        pos, lnprob, rstate = sampler.run_mcmc(pos, nblock, rstate0=rstate, lnprob0=lnprob)
+
+        if checkpoint is not None:
+            state = dict(ckptinfo)
+            state.update(pos=pos, lnprob=lnprob, rstate=rstate, nsteps=ndone+nblock, chain=sampler.chain, lnprobability=sampler.lnprobability, naccepted=sampler.naccepted)
+            if tools.savepickle(state, checkpoint + '.tmp') <> -1:
+                os.rename(checkpoint + '.tmp', checkpoint)
+
+    return pos, lnprob, rstate, converged
+
+def _mcmcfingerprint(*items):
+    """Return a hash (hex string) of the inputs that determine an
+    MCMC run, so a checkpoint is only resumed by the same fit.
+    Helper function for :func:`analyzetransit_general`."""
+    # 2026-10-17 19:40 IJMC: Created
+    import hashlib
+    digest = hashlib.md5()
+    for item in items:
+        if isinstance(item, np.ndarray):
+            digest.update(repr((item.shape, item.dtype.str)))
+            digest.update(np.ascontiguousarray(item).tostring())
+        elif hasattr(item, '__iter__') and not isinstance(item, dict):
+            digest.update('[')
+            digest.update(_mcmcfingerprint(*item))
+            digest.update(']')
+        else:
+            digest.update(repr(item))
+        digest.update('|')
+    return digest.hexdigest()
+
+def _mcmcsetchain(sampler, chain, lnprobability, naccepted):
+    """Load saved chains into a freshly made emcee (v2)
+    EnsembleSampler, so it continues where a checkpointed run left
+    off.  Helper function for :func:`analyzetransit_general`."""
+    # 2026-10-17 16:10 IJMC: Created
+    sampler._chain = np.array(chain, copy=True)
+    sampler._lnprob = np.array(lnprobability, copy=True)
+    sampler.naccepted = np.array(naccepted, copy=True)
+    sampler.iterations = sampler._chain.shape[1]
+    return
+
+def analyzetransit_channels(geometry, time, data, guess, limb_dark=None, NP=1, weights=None, nthread=1, errscale=1e6, smallplanet=True, maxiter=100, xtol=1e-10, ftol=1e-10, verbose=False):
+    """
+    Fit spectroscopic (multi-channel) transit light curves that share
+    a single, fixed orbital geometry.
+
+    :INPUTS:
+     geometry : 4- or 6-sequence
+       [Tc, P, inc, a/R*] or [Tc, P, inc, a/R*, ecc, omega], in the
+       same units as for :func:`modeltransit_batman` (inclination
+       and omega in degrees) -- e.g., from a white-light fit with
+       :func:`analyzetransit_general`.  These are held fixed.
+
+     time : 1D sequence
+       time values, shared by all channels.
+
+     data : 2D sequence, (Nchan x M)
+       photometric values (i.e., the transit light curve) of each
+       channel.
+
+     guess : sequence
+       A guess at the best-fit parameters for each channel, in the
+       form used by :func:`modeltransit_channels`: either an (Nchan x
+       (1 + NP + |NL|)) array, or a single row to use for all
+       channels.
+
+     limb_dark : set to:
+          uniform, linear, quadratic, square-root, nonlinear
+          (uniform/0, linear/1, quadratic/2, sqrt/-2, nonlinear/4)
+
+     NP : int
+       number of normalizing polynomial coefficients.
+
+     weights : None or sequence
+       weights to the photometric values (of shape Nchan x M, or M).
+       If None, each channel's weights are set to the inverse
+       variance of its data, and then rescaled after the fit to give
+       a reduced chi-squared of unity.
+
+     nthread : int >0
+       Number of multiprocessing cores/threads to use; blocks of
+       channels are fit in parallel.
+
+     errscale, smallplanet : 
+       See :func:`modeltransit_general`
+
+     maxiter, xtol, ftol :
+       See :func:`fitchannels`
+
+    :OUTPUTS:
+      a dict with the following keys:
+        bestparams -- (Nchan x Npar) best-fit parameters
+        uncertainties -- (Nchan x Npar) formal 1-sigma uncertainties
+        chisq -- Nchan chi-squared values
+        model -- (Nchan x M) best-fit light curves
+        weights -- (Nchan x M) weights used in the fit
+        z -- the planet-star separation at each time
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        geom = [tc, per, inc, ars]
+        guess = [0.1, 1., 0.3, 0.2]   # Rp/R*, F0, gamma1, gamma2
+        out = transit.analyzetransit_channels(geom, time, specdata, guess, 'quadratic', nthread=4)
+        transmission_spectrum = out['bestparams'][:,0]
+
+    :NOTES:
+      The orbital geometry, z(t), is computed only once.  Within each
+      block of channels, :func:`fitchannels` advances all fits
+      together, so every model evaluation is a single (channel x
+      time) pass of :func:`modeltransit_channels`.
+
+    :SEE_ALSO:
+       :func:`analyzetransit_general`, :func:`modeltransit_channels`
+    """
+    # 2026-10-16 21:40 IJMC: Created
+
+    limb_dark, NL = get_ldtype(limb_dark)
+    time = np.array(time, dtype=float, copy=False)
+    data = np.array(data, dtype=float, copy=False)
+    if data.ndim==1:
+        data = data.reshape(1, data.size)
+    nchan, nobs = data.shape
+
+    tc, per, inc, ars = geometry[0:4]
+    if len(geometry) > 4:
+        ecc, omega = geometry[4:6]
+    else:
+        ecc, omega = 0., 0.
+    z = t2z(tc, per, inc, time, ars, ecc=ecc, longperi=omega*np.pi/180., transitonly=True)
+
+    guess = np.array(guess, dtype=float, copy=True)
+    if guess.ndim==1:
+        guess = np.tile(guess, (nchan, 1))
+
+    if weights is None:
+        weights = np.tile(1. / data.var(1).reshape(nchan, 1), (1, nobs))
+        scaleWeights = True
+    else:
+        weights = np.array(weights, dtype=float, copy=True) * np.ones(data.shape)
+        scaleWeights = False
+
+    nblock = max(1, min(nthread, nchan))
+    blocks = np.array_split(np.arange(nchan), nblock)
+    fitargs = [(guess[ind], z, time, NL, NP, data[ind], weights[ind], errscale, smallplanet, maxiter, xtol, ftol, scaleWeights) for ind in blocks]
+
+    if nblock>1:
+        from multiprocessing import Pool
+        pool = Pool(processes=nblock)
+        try:
+            fits = pool.map(fitchannels_helper, fitargs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        fits = map(fitchannels_helper, fitargs)
+
+    bestparams = np.vstack([fit[0] for fit in fits])
+    uncertainties = np.vstack([fit[1] for fit in fits])
+    chisq = np.concatenate([fit[2] for fit in fits])
+    weights = np.vstack([fit[3] for fit in fits])
+    model = modeltransit_channels(bestparams, z, time, NL, NP, errscale=errscale, smallplanet=smallplanet)
+
+    if verbose:
+        print "Fit %i channels; median chi-squared is %1.1f (%i points each)" % (nchan, np.median(chisq), nobs)
+
+    return dict(bestparams=bestparams, uncertainties=uncertainties, chisq=chisq, model=model, weights=weights, z=z)
+
+def fitchannels(params, z, t, NL, NP, data, weights, errscale=1e6, smallplanet=True, maxiter=100, xtol=1e-10, ftol=1e-10):
+    """Levenberg-Marquardt fit of many channels at once (in lockstep).
+
+    :INPUTS:
+      params -- (Nchan x Npar) initial guesses; see :func:`modeltransit_channels`
+
+      z, t, NL, NP -- see :func:`modeltransit_channels`
+
+      data, weights -- (Nchan x M) arrays of data and weights.
+
+    :OPTIONS:
+      errscale, smallplanet -- see :func:`modeltransit_general`
+
+      maxiter -- maximum number of iterations.
+
+      xtol, ftol -- a channel's fit stops once a step would change
+        its chi-squared by less than a fraction 'ftol', or its
+        parameters by less than a fraction 'xtol'.
+
+    :RETURNS:
+      (bestparams, uncertainties, chisq)
+
+    :NOTES:
+      Each iteration computes a finite-difference Jacobian for all
+      still-active channels with (Npar+1) calls to
+      :func:`modeltransit_channels`, then solves all the (Npar x Npar)
+      normal equations at once.  Converged channels drop out.
+    """
+    # 2026-10-16 21:40 IJMC: Created
+
+    params = np.array(params, dtype=float, copy=True)
+    nchan, npar = params.shape
+    sw = np.sqrt(weights)
+    modargs = (z, t, NL, NP, errscale, smallplanet)
+
+    def getchisq(p, ind):
+        return (((modeltransit_channels(p, *modargs) - data[ind]) * sw[ind])**2).sum(1)
+
+    def getjacobian(p, ind):
+        mod0 = modeltransit_channels(p, *modargs)
+        jac = np.zeros((ind.size, npar, z.size), float)
+        for jj in xrange(npar):
+            dp = 1e-7 * np.maximum(np.abs(p[:,jj]), 1e-3)
+            p1 = p.copy()
+            p1[:,jj] += dp
+            jac[:,jj] = (modeltransit_channels(p1, *modargs) - mod0) * sw[ind] / dp.reshape(ind.size, 1)
+        return jac, (mod0 - data[ind]) * sw[ind]
+
+    allind = np.arange(nchan)
+    chisq = getchisq(params, allind)
+    lam = 1e-3 * np.ones(nchan)
+    active = allind[np.isfinite(chisq)]
+    niter = 0
+    while active.size>0 and niter < maxiter:
+        pa = params[active]
+        jac, res = getjacobian(pa, active)
+        alpha = np.einsum('nim,njm->nij', jac, jac)
+        beta = -np.einsum('nim,nm->ni', jac, res)
+        diag = np.einsum('nii->ni', alpha)
+        while active.size>0:
+            curv = alpha + (lam[active].reshape(active.size, 1) * diag)[:,:,None] * np.eye(npar)
+            try:
+                step = np.linalg.solve(curv, beta[:,:,None])[:,:,0]
+            except np.linalg.LinAlgError:
+                step = np.array([np.linalg.lstsq(cc, bb, rcond=-1)[0] for cc, bb in zip(curv, beta)])
+            trial = pa + step
+            newchisq = getchisq(trial, active)
+            better = newchisq <= chisq[active]
+            lam[active[better]] /= 10.
+            lam[active[~better]] *= 10.
+            if better.any() or (lam[active] > 1e10).all():
+                break
+
+        dchisq = np.abs(chisq[active] - newchisq) / np.maximum(chisq[active], 1e-300)
+        dpar = np.abs(step) / np.maximum(np.abs(pa), xtol)
+        params[active[better]] = trial[better]
+        chisq[active[better]] = newchisq[better]
+        done = (dchisq <= ftol) + (dpar.max(1) <= xtol) + (lam[active] > 1e10)
+        active = active[~done]
+        niter += 1
+
+    # Formal uncertainties, from the curvature at the best fit:
+    jac, res = getjacobian(params, allind)
+    alpha = np.einsum('nim,njm->nij', jac, jac)
+    uncertainties = np.zeros(params.shape, float) + np.nan
+    for ii in xrange(nchan):
+        try:
+            uncertainties[ii] = np.sqrt(np.diag(np.linalg.inv(alpha[ii])))
+        except np.linalg.LinAlgError:
+            pass
+
+    return params, uncertainties, chisq
+
+def fitchannels_helper(args):
+    """Helper function for :func:`analyzetransit_channels` (for use
+    with Pool.map).  If the last element of args is True, weights are
+    rescaled so each channel has a reduced chi-squared of unity.
+    (This leaves the best fit unchanged, so no re-fit is needed.)
+
+    Returns (bestparams, uncertainties, chisq, weights)"""
+    # 2026-10-16 21:40 IJMC: Created
+    params, z, t, NL, NP, data, weights, errscale, smallplanet, maxiter, xtol, ftol, scaleWeights = args
+    bestparams, uncertainties, chisq = fitchannels(params, z, t, NL, NP, data, weights, errscale=errscale, smallplanet=smallplanet, maxiter=maxiter, xtol=xtol, ftol=ftol)
+    if scaleWeights:
+        factor = data.shape[1] / chisq
+        weights = weights * factor.reshape(data.shape[0], 1)
+        uncertainties = uncertainties / np.sqrt(factor).reshape(data.shape[0], 1)
+        chisq = chisq * factor
+    return bestparams, uncertainties, chisq, weights
+
+def analyzetransit_ttv(params, time, data, limb_dark=None, NP=1, weights=None, t14=None, window=2., nthread=1, maxiter=10, errscale=1e6, smallplanet=True, xtol=1e-10, ftol=1e-10, verbose=False):
+    """
+    Measure transit-timing variations: fit many individual transits
+    with a common shape but separate mid-transit times.
+
+    :INPUTS:
+     params : sequence
+       An initial guess in the form used by
+       :func:`modeltransit_general`, i.e. [Tc, P, inc, R*/a, Rp/R*,
+       (NP polynomial coefficients), (|NL| limb-darkening
+       coefficients)].  Tc and P define the reference ephemeris used
+       to number the epochs; the polynomial coefficients are ignored
+       (each epoch gets its own normalization).
+
+     time : 1D sequence
+       time values (covering many transits).
+
+     data : 1D sequence
+       photometric values (i.e., the transit light curve).
+
+     limb_dark : set to:
+          uniform, linear, quadratic, square-root, nonlinear
+          (uniform/0, linear/1, quadratic/2, sqrt/-2, nonlinear/4)
+
+    :OPTIONS:
+     NP : int
+       number of normalizing polynomial coefficients for each epoch.
+       These are polynomials in time relative to that epoch's
+       predicted mid-transit time.
+
+     weights : None or sequence
+       weights to the photometric values.  If None, weights are set
+       to the inverse variance of the data and then rescaled after
+       each iteration to give a reduced chi-squared of unity.
+
+     t14 : None or scalar
+       total transit duration.  If None, it is computed from 'params'.
+
+     window : scalar
+       width of the window fit around each transit, in units of t14.
+       Epochs with no data inside their window are skipped.
+
+     nthread : int >0
+       Number of multiprocessing processes used for the per-epoch fits.
+
+     maxiter : int
+       maximum number of (global shape, per-epoch) iterations.
+
+     errscale, smallplanet : 
+       See :func:`modeltransit_general`
+
+     xtol, ftol : 
+       Passed to scipy.optimize.leastsq.  'ftol' also sets when the
+       iterations stop: once the total chi-squared changes by less
+       than this fraction.
+
+    :OUTPUTS:
+      a dict with the following keys:
+        epoch -- integer epoch number of each fitted transit
+        tc, tc_err -- fitted mid-transit times and their uncertainties
+        oc, oc_err -- observed-minus-calculated times, relative to
+                      the best linear ephemeris
+        ephemeris, ephemeris_err -- (T0, P) of that ephemeris, with
+                      T0 at epoch zero
+        shapeparams -- best-fit [inc, R*/a, Rp/R*, (limb-darkening)]
+        epochparams -- (Nepoch x (1+NP)) array of [Tc, poly coefs]
+        chisq -- chi-squared of each epoch's window
+        model -- best-fit model (NaN outside the fitted windows)
+        weights -- weights used in the fit
+        index -- epoch number of each data point (-1 if unused)
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        guess = [tc, per, inc, 1./ars, rprs, 1., 0.3, 0.2]
+        out = transit.analyzetransit_ttv(guess, time, flux, 'quadratic', nthread=4)
+        py.errorbar(out['epoch'], out['oc']*24*60, out['oc_err']*24*60, fmt='o')
+
+    :NOTES:
+      The (global shape) x (per-epoch timing and normalization)
+      problem is block-sparse: the per-epoch parameters of different
+      transits do not interact.  So rather than fitting one monolithic
+      parameter vector, this alternates between (1) fitting the shape
+      to all windows at once, with every epoch's time and
+      normalization held fixed, and (2) fitting each epoch's time and
+      normalization independently (in parallel, if nthread>1), with
+      the shape held fixed.  The cost of each step grows only
+      linearly with the number of epochs.
+
+      The quoted timing uncertainties are conditional on the best-fit
+      shape; they neglect the (usually small) covariance between
+      mid-transit times and shape parameters.
+
+    :SEE_ALSO:
+       :func:`analyzetransit_general`, :class:`ephemerisindex`
+    """
+    # 2026-10-17 10:30 IJMC: Created
+
+    from scipy import optimize
+
+    limb_dark, NL = get_ldtype(limb_dark)
+    pNL = np.abs(NL)
+    params = np.array(params, dtype=float, copy=False)
+    time = np.array(time, dtype=float, copy=False)
+    data = np.array(data, dtype=float, copy=False)
+    tc0, per = params[0:2]
+    shape = np.concatenate((params[2:5], params[5+NP:5+NP+pNL]))
+
+    if t14 is None:
+        inc, ra, k = params[2:5]
+        b = np.cos(inc*np.pi/180.) / ra
+        t14 = per / np.pi * np.arcsin(min(1., ra * np.sqrt(max(0., (1.+k)**2 - b**2)) / np.sin(inc*np.pi/180.)))
+
+    # Assign data to epochs:
+    epochindex = ephemerisindex(time)
+    epochindex.add('transit', tc0, per, window*t14)
+    epochs = epochindex.windows('transit')[0]
+    windows = epochindex.windowindices('transit')
+    nepoch = epochs.size
+    tref = tc0 + epochs * per
+    index = epochindex.epoch('transit')
+    inwindow = index >= 0
+
+    if weights is None:
+        weights = np.ones(time.size) / data[inwindow].var()
+        scaleWeights = True
+    else:
+        weights = np.array(weights, dtype=float, copy=True)
+        scaleWeights = False
+
+    # Each window is fit in its own local time, t - tref:
+    tlocal = [time[ind] - tref[ii] for ii, ind in enumerate(windows)]
+    fitargs = [[tlocal[ii], data[ind], weights[ind]] for ii, ind in enumerate(windows)]
+    alltloc = np.concatenate(tlocal)
+    alldata = np.concatenate([data[ind] for ind in windows])
+    sortind = np.concatenate(windows)
+    nwin = np.array(map(len, windows))
+
+    def shapemodel(shapepar, tshift):
+        """Normalized model for all windows, with each epoch's
+        transit centered at zero."""
+        return modeltransit_general(np.concatenate(([0., per], shapepar[0:3], shapepar[3:])), alltloc - tshift, NL, NP=0, errscale=errscale, smallplanet=smallplanet)
+
+    # Starting values for each epoch: predicted time, and baseline
+    # from the out-of-transit data.
+    epochparams = np.zeros((nepoch, 1+NP), float)
+    flat = shapemodel(shape, 0.)
+    for ii, ind in enumerate(np.split(np.arange(alltloc.size), np.cumsum(nwin)[0:-1])):
+        if NP>0:
+            epochparams[ii,1:] = np.polyfit(alltloc[ind], alldata[ind] / flat[ind], NP-1)
+
+    if nthread>1:
+        from multiprocessing import Pool
+        pool = Pool(processes=nthread)
+    else:
+        pool = None
+
+    chisq = np.inf
+    niter = 0
+    try:
+        while niter < maxiter:
+            # Per-epoch fits, with the shape held fixed:
+            epochargs = [(epochparams[ii], fitargs[ii][0], fitargs[ii][1], fitargs[ii][2], per, shape, NL, NP, errscale, smallplanet, xtol, ftol) for ii in xrange(nepoch)]
+            if pool is None:
+                fits = map(fitttv_helper, epochargs)
+            else:
+                fits = pool.map(fitttv_helper, epochargs)
+            epochparams = np.array([fit[0] for fit in fits])
+            epochchisq = np.array([fit[2] for fit in fits])
+
+            # Global shape fit, with epoch times and baselines held fixed:
+            tshift = np.repeat(epochparams[:,0], nwin)
+            if NP>0:
+                baseline = np.concatenate([np.polyval(epochparams[ii,1:], tlocal[ii]) for ii in xrange(nepoch)])
+            else:
+                baseline = 1.
+            sw = np.sqrt(weights[sortind])
+            def shaperes(shapepar):
+                return (shapemodel(shapepar, tshift) * baseline - alldata) * sw
+            shape = optimize.leastsq(shaperes, shape, xtol=xtol, ftol=ftol)[0]
+
+            newchisq = (shaperes(shape)**2).sum()
+            if verbose:
+                print "Iteration %i: chi-squared is %1.2f for %i points in %i epochs" % (niter, newchisq, alldata.size, nepoch)
+            niter += 1
+            converged = np.abs(chisq - newchisq) <= ftol * newchisq
+            chisq = newchisq
+            if scaleWeights:
+                factor = (alldata.size - shape.size - nepoch*(1+NP)) / newchisq
+                weights *= factor
+                chisq *= factor
+                for ii, ind in enumerate(windows):
+                    fitargs[ii][2] = weights[ind]
+            if converged:
+                break
+
+        # Final per-epoch fits (with the final shape and weights) give
+        # the times and their uncertainties:
+        epochargs = [(epochparams[ii], fitargs[ii][0], fitargs[ii][1], fitargs[ii][2], per, shape, NL, NP, errscale, smallplanet, xtol, ftol) for ii in xrange(nepoch)]
+        if pool is None:
+            fits = map(fitttv_helper, epochargs)
+        else:
+            fits = pool.map(fitttv_helper, epochargs)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    epochparams = np.array([fit[0] for fit in fits])
+    tc = tref + epochparams[:,0]
+    tc_err = np.array([fit[1] for fit in fits])
+    epochchisq = np.array([fit[2] for fit in fits])
+
+    # Weighted linear ephemeris, and O-C:
+    good = np.isfinite(tc_err) * (tc_err > 0)
+    if good.sum() > 1:
+        ww = 1. / tc_err[good]**2
+        design = np.vstack((np.ones(good.sum()), epochs[good]))
+        cov = np.linalg.inv(np.dot(design * ww, design.T))
+        ephemeris = np.dot(cov, np.dot(design * ww, tc[good]))
+        ephemeris_err = np.sqrt(np.diag(cov))
+    else:
+        ephemeris = np.array([tc0, per])
+        ephemeris_err = np.zeros(2) + np.nan
+    oc = tc - (ephemeris[0] + epochs * ephemeris[1])
+
+    model = np.zeros(time.size) + np.nan
+    for ii, ind in enumerate(windows):
+        model[ind] = modeltransit_general(np.concatenate((epochparams[ii,0:1], [per], shape[0:3], epochparams[ii,1:], shape[3:])), tlocal[ii], NL, NP=NP, errscale=errscale, smallplanet=smallplanet)
+    epochparams[:,0] = tc
+
+    return dict(epoch=epochs, tc=tc, tc_err=tc_err, oc=oc, oc_err=tc_err, ephemeris=ephemeris, ephemeris_err=ephemeris_err, shapeparams=shape, epochparams=epochparams, chisq=epochchisq, model=model, weights=weights, index=index)
+
+def fitttv_helper(args):
+    """Helper function for :func:`analyzetransit_ttv` (for use with
+    Pool.map): fit one epoch's mid-transit time and normalization,
+    with the transit shape held fixed.
+
+    args are (epochparams, tlocal, data, weights, per, shape, NL, NP,
+    errscale, smallplanet, xtol, ftol), where 'epochparams' is
+    [Tc, (NP polynomial coefficients)] in local time and 'shape' is
+    [inc, R*/a, Rp/R*, (limb-darkening)].
+
+    Returns (epochparams, tc_err, chisq)"""
+    # 2026-10-17 10:30 IJMC: Created
+    from scipy import optimize
+
+    epochparams, tlocal, data, weights, per, shape, NL, NP, errscale, smallplanet, xtol, ftol = args
+    sw = np.sqrt(weights)
+    def res(epar):
+        allpar = np.concatenate((epar[0:1], [per], shape[0:3], epar[1:], shape[3:]))
+        return (modeltransit_general(allpar, tlocal, NL, NP=NP, errscale=errscale, smallplanet=smallplanet) - data) * sw
+
+    fit = optimize.leastsq(res, epochparams, full_output=True, xtol=xtol, ftol=ftol)
+    chisq = (fit[2]['fvec']**2).sum()
+    if fit[1] is None:
+        tc_err = np.nan
+    else:
+        tc_err = np.sqrt(fit[1][0,0])
+    return fit[0], tc_err, chisq
+
+def bls_simple(times, flux, prange, dlogper=0.0004, nbins=150, maxwid=10, nthreads=1, retall=False, topk=None, chunksize=None, pool=None):
+    """Implement a simple version of the Box-Least-Squares algorithm.
 
     :INPUTS:
       times : 1D NumPy array.
@@ -2736,70 +4595,267 @@ def bls_simple(times, flux, prange, dlogper=0.0004, nbins=150, maxwid=10, nthrea
         number of phase bins.  
 
       nthreads : positive int
-        Number of multiprocessing threads to use.
+        Number of multiprocessing threads to use.  The light curve is
+        placed in shared memory once, and chunks of the period grid
+        are sent to the worker processes; the pool is closed before
+        returning.
+
+      retall : bool
+        If True, also return the best-fitting box for each period.
+
+      topk : None or positive int
+        If set, only return the 'topk' highest peaks (local maxima)
+        of the periodogram, sorted from highest to lowest.  Each
+        chunk of the period grid only sends back its own top
+        candidates, so memory use stays small even for very large
+        period grids.
+
+      chunksize : None or positive int
+        Number of trial periods per chunk (default: at most 1000,
+        and at least four chunks per thread).
+
+      pool : None or multiprocessing Pool
+        A pool created with :func:`bls_pool` for these same 'times'
+        and 'flux', to reuse across several searches (e.g., several
+        period ranges).  It is *not* closed on return; 'nthreads' is
+        ignored.
 
     :OUTPUTS:
         (test_periods, reduction_in_dispersion)
 
+        if retall, (test_periods, reduction_in_dispersion, boxes)
+
+        where 'boxes' is an (N x 3) array; each row gives the (epoch,
+        depth, duration) of the best box at that period.  The epoch
+        is the mid-time of the first such box after times.min(), and
+        depth is positive for a dip.
+
     :NOTES:
         Transits shorter than (prange[0]/nbins) and longer than
         (maxwid*prange[1]/nbins) may not be correctly modelled.
 
-        This routine is my own crude attempt at a box-fitting
-        least-squares algorithm.  Note however that this is *NOT* the
-        well-publicized (and more rigorous) version of Kovacs et
-        al. (2002).  Here for each trial period, I bin the data and
-        construct simple box-shaped transit models for combinations of
-        ingress and egress times. For each model the reduction in the
-        standard deviation of (binned data - model) is calculated; for
-        each period, the greatest reduction value is reported.
+        For each trial period, the phase-folded data are binned and
+        every box of 1 to maxwid consecutive bins (including boxes
+        that wrap around phase zero) is tested at once, using
+        cumulative sums of the binned data.  For each box, the
+        reduction in the standard deviation of (data - model) is
+        computed from the signal residue of Kovacs et al. (2002); for
+        each period, the greatest reduction value is reported.  Cost
+        scales as O(N + nbins*maxwid) per period.
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        pool = transit.bls_pool(times, flux, 8)
+        try:
+            for prange in [[0.5, 1], [1, 10], [10, 50]]:
+                per, red = transit.bls_simple(times, flux, prange, topk=5, pool=pool)
+        finally:
+            pool.close()
+            pool.join()
+
+    :SEE ALSO:
+      :func:`bls_period`, :func:`bls_pool`
     """
     #2013-10-11 14:05 IJMC: Created
+    # 2026-10-16 17:30 IJMC: Rewritten around cumulative sums (see
+    #                        bls_period); added 'retall' option.
+    # 2026-10-16 19:00 IJMC: Added 'topk', 'chunksize', 'pool' options;
+    #                        data are shared with worker processes once,
+    #                        and the pool is closed when done.
 
     #prange = [0.43, .47]
     #nbins = 200
     #dlogper = 0.0002
     #maxwid = 10
 
-    if nthreads>1:
-        from multiprocessing import Pool
-        pool = Pool(processes=nthreads)
-
+    times = np.array(times, dtype=float, copy=False)
+    flux = np.array(flux, dtype=float, copy=False)
     nper = int(np.ceil(np.log10(prange[1] / prange[0]) / np.log10(1. + dlogper)))
     periods = prange[0] * (1.0+dlogper)**np.arange(nper)
     phasebins = np.linspace(0, 1, nbins+1)
 
-    if nthreads>1:
-        reduction = pool.map(get_reduction_factor, [[periods[ii], times, flux, phasebins, maxwid] for ii in xrange(nper)])
+    if pool is not None:
+        ownpool = False
+        nthreads = max(nthreads, 2)
+    elif nthreads>1:
+        ownpool = True
+        pool = bls_pool(times, flux, nthreads)
+    else:
+        ownpool = False
+
+    if chunksize is None:
+        chunksize = max(1, min(1000, int(np.ceil(nper / (4. * nthreads)))))
+
+    # Each chunk also evaluates one neighboring period on either side,
+    # so that peaks at chunk boundaries are correctly identified:
+    chunkargs = []
+    for i0 in xrange(0, nper, chunksize):
+        i1 = min(i0 + chunksize, nper)
+        chunkargs.append([periods[max(i0-1, 0):i1+1], i0, int(i0>0), int(i1<nper), \
+                              phasebins, maxwid, topk])
+
+    if pool is None:
+        results = (_bls_chunk(args + [times, flux]) for args in chunkargs)
+    else:
+        results = pool.imap_unordered(_bls_chunk, chunkargs)
+
+    try:
+        if topk is None:
+            allvals = np.zeros((nper, 4), dtype=float)
+            for index, vals in results:
+                allvals[index] = vals
+        else:
+            index, allvals = np.zeros(0, dtype=int), np.zeros((0, 4), dtype=float)
+            for cindex, cvals in results:
+                index = np.concatenate((index, cindex))
+                allvals = np.vstack((allvals, cvals))
+                keep = np.argsort(allvals[:,0])[::-1][0:topk]
+                index, allvals = index[keep], allvals[keep]
+            periods = periods[index]
+    finally:
+        if ownpool:
+            pool.close()
+            pool.join()
+
+    reduction = allvals[:,0]
+    if retall:
+        ret = periods, reduction, allvals[:,1:]
+    else:
+        ret = periods, reduction
+    return ret
+
+def bls_pool(times, flux, nthreads):
+    """Create a process pool for :func:`bls_simple`, with the light
+    curve placed in shared memory.
+
+    The pool can be reused for several searches of the same 'times'
+    and 'flux' (pass it in as bls_simple's 'pool' option); close it
+    with pool.close() and pool.join() when done.
+    """
+    # 2026-10-16 19:00 IJMC: Created
+    from multiprocessing import Pool, RawArray
+
+    times = np.array(times, dtype=float).ravel()
+    flux = np.array(flux, dtype=float).ravel()
+    stimes = RawArray('d', times.size)
+    sflux = RawArray('d', flux.size)
+    np.frombuffer(stimes, dtype=float)[:] = times
+    np.frombuffer(sflux, dtype=float)[:] = flux
+    return Pool(processes=nthreads, initializer=_bls_initworker, initargs=(stimes, sflux))
+
+_bls_shared = dict()
+def _bls_initworker(stimes, sflux):
+    """Pool initializer for :func:`bls_pool`: attach the shared light curve."""
+    # 2026-10-16 19:00 IJMC: Created
+    _bls_shared['times'] = np.frombuffer(stimes, dtype=float)
+    _bls_shared['flux'] = np.frombuffer(sflux, dtype=float)
+
+def _bls_chunk(args):
+    """Run :func:`bls_period` over a chunk of trial periods.
+
+    args = periods, i0, pad0, pad1, phasebins, maxwid, topk [, times, flux]
+
+    'periods' includes 'pad0' (or 'pad1') extra periods before (or
+    after) the chunk, used only to identify local maxima.  If times
+    and flux are not given, the shared light curve set up by
+    :func:`bls_pool` is used.
+
+    Returns (index, vals): the indices (into the full period grid) and
+    rows of (reduction, epoch, depth, duration).  If topk is not None,
+    only the 'topk' highest local maxima in the chunk are returned.
+    """
+    # 2026-10-16 19:00 IJMC: Created
+    periods, i0, pad0, pad1, phasebins, maxwid, topk = args[0:7]
+    if len(args) > 7:
+        times, flux = args[7:9]
+    else:
+        times, flux = _bls_shared['times'], _bls_shared['flux']
+
+    vals = np.array([bls_period([per, times, flux, phasebins, maxwid]) for per in periods])
+    red = np.concatenate(([-np.inf], vals[:,0], [-np.inf]))
+    npad = periods.size - pad0 - pad1
+    vals = vals[pad0:pad0+npad]
+    index = i0 + np.arange(npad)
+
+    if topk is not None:
+        red0 = red[pad0:pad0+npad]
+        red1 = red[pad0+1:pad0+npad+1]
+        red2 = red[pad0+2:pad0+npad+2]
+        peaks = np.nonzero((red1 >= red0) * (red1 > red2))[0]
+        peaks = peaks[np.argsort(vals[peaks,0])[::-1][0:topk]]
+        index, vals = index[peaks], vals[peaks]
+
+    return index, vals
+
+def bls_period(args):
+    """Box-Least-Squares search at a single trial period.
+
+    args = thisperiod, times, flux, phasebins, maxwid
+
+    Returns (reduction, epoch, depth, duration) for the best box.  See
+    :func:`bls_simple` for details.
+    """
+    # 2026-10-16 17:30 IJMC: Created, from get_reduction_factor.
+
+    thisperiod, times, flux, phasebins, maxwid = args
+
+    # Bin the phase-folded data (bin counts, and sums of mean-subtracted flux):
+    nbins = len(phasebins) - 1
+    phase = (times / thisperiod) % 1.0
+    ind = np.searchsorted(phasebins, phase, side='right') - 1
+    good = (ind >= 0) * (ind < nbins)
+    ind = ind[good]
+    fmean = flux[good] - flux[good].mean()
+    npts = ind.size
+    ss0 = (fmean**2).sum()
+    nbin = np.bincount(ind, minlength=nbins).astype(float)
+    sbin = np.bincount(ind, weights=fmean, minlength=nbins)
+
+    # Cumulative sums (wrapping around phase zero) give all boxes at once:
+    maxwid = min(maxwid, nbins)
+    ncum = np.concatenate(([0.], np.cumsum(np.concatenate((nbin, nbin[0:maxwid])))))
+    scum = np.concatenate(([0.], np.cumsum(np.concatenate((sbin, sbin[0:maxwid])))))
+    i1 = np.arange(nbins).reshape(nbins, 1)
+    i2 = i1 + np.arange(1, maxwid+1)
+    nin = ncum[i2] - ncum[i1]
+    sin = scum[i2] - scum[i1]
+
+    # Signal residue: the reduction in chi-squared from fitting a box:
+    valid = (nin > 0) * (nin < npts)
+    nin[~valid] = 1.
+    dchisq = sin**2 * npts / (nin * (npts - nin))
+    dchisq[~valid] = 0.
+    best = dchisq.argmax()
+    ibest, wbest = best // maxwid, best % maxwid + 1
+
+    if ss0 > 0 and dchisq.flat[best] < ss0:
+        reduction = np.sqrt(ss0 / (ss0 - dchisq.flat[best]))
+    elif ss0 > 0:
+        reduction = np.inf
     else:
-        reduction = np.array([get_reduction_factor([periods[ii], times, flux, phasebins, maxwid]) for ii in xrange(nper)])
+        reduction = 1.
 
-    return periods, reduction
+    depth = -sin.flat[best] * npts / (nin.flat[best] * (npts - nin.flat[best]))
+    duration = wbest * thisperiod / nbins
+    epoch = thisperiod * (phasebins[ibest] + 0.5 * wbest / nbins)
+    epoch += thisperiod * np.ceil((times.min() - epoch) / thisperiod)
+
+    return reduction, epoch, depth, duration
 
 def get_reduction_factor(args):
     """ Helper function for bls_simple.
 
-    args = thisperiod, times, flux, phasebins, maxwid):"""
+    args = thisperiod, times, flux, phasebins, maxwid):
+
+    Returns only the reduction in dispersion; see :func:`bls_period`."""
     # 2013-10-11 15:27 IJMC: Created
-    from tools import errxy
+    # 2026-10-16 17:30 IJMC: Now a thin wrapper around bls_period.
+    return bls_period(args)[0]
 
-    thisperiod, times, flux, phasebins, maxwid = args
 
-    tbin, fbin, junk1, junk2 = errxy((times / thisperiod) % 1.0, flux, phasebins, xerr=None, yerr=None)
-    nbins = tbin.size
-    model = np.zeros(nbins, dtype=float)
-    myvals = np.ones((nbins, nbins))
-    for i1 in range(0, nbins-1):
-      for i2 in range(i1+1, min(nbins, i1+1+maxwid)):
-        model[i1:i2] = np.mean(fbin[i1:i2])
-        oot_val = np.mean(np.concatenate((fbin[0:i1], fbin[i2:])))
-        model[0:i1] = oot_val
-        model[i2:] = oot_val
-        myvals[i1,i2] = (fbin - model).std()
-    return (fbin.std()/myvals).max()
-
-
-def modhaze_radspec_simple(params, wmod, rmod, rstar, retspec=False, filter_splines=None, w_star=None, f_star=None):
+def modhaze_radspec_simple(params, wmod, rmod, rstar, retspec=False, filter_splines=None, w_star=None, f_star=None, filtmatrix=None):
     """Add a simple ad-hoc haze model to a planet's radius spectrum.
 
     :INPUTS:
@@ -2834,13 +4890,21 @@ def modhaze_radspec_simple(params, wmod, rmod, rstar, retspec=False, filter_spli
         Photon flux density of stellar flux at wavelengths specified
         in w_star.
 
+      filtmatrix : None or 2D NumPy array
+        Filter-weighting matrix from :func:`modhaze_filtermatrix`; if
+        given, 'filter_splines', 'w_star' and 'f_star' are not needed.
+
     :NOTES:
       Because this routine makes use of the numpy.interp function,
       using a smaller input model grid can significantly speed things
-      up.
+      up -- or precompute 'filtmatrix' once.
+
+    :SEE_ALSO:
+      :func:`modhaze_radspec_batch`
     """
     # 2013-12-20 16:37 IJMC: Created 2-3 weeks before this for GJ3470b
     #                        analysis.
+    # 2026-10-17 16:50 IJMC: Added 'filtmatrix' option.
     
     from analysis import rsun
 
@@ -2850,10 +4914,93 @@ def modhaze_radspec_simple(params, wmod, rmod, rstar, retspec=False, filter_spli
     if retspec:
         ret = newmod
     else:
-        ret = np.zeros(len(filter_splines))
-        for jj, spline in enumerate(filter_splines):
-            spline_interp = spline(wmod) * np.interp(wmod, w_star, f_star)
-            ret[jj] = (newmod * spline_interp).sum() / spline_interp.sum()
+        if filtmatrix is None:
+            filtmatrix = modhaze_filtermatrix(wmod, filter_splines, w_star, f_star)
+        ret = np.dot(filtmatrix, newmod)
+    return ret
+
+def modhaze_filtermatrix(wmod, filter_splines, w_star, f_star):
+    """Precompute the filter-weighting matrix used by
+    :func:`modhaze_radspec_simple` and :func:`modhaze_radspec_batch`.
+
+    :INPUTS:
+      wmod, filter_splines, w_star, f_star -- see :func:`modhaze_radspec_simple`
+
+    :RETURNS:
+      (Nfilter x Nwavelength) array; row 'j' holds the weights
+      spline_j(wmod) * f_star(wmod), normalized to unit sum.  The
+      filter-averaged values of a spectrum 'r' are then simply
+      numpy.dot(matrix, r).
+    """
+    # 2026-10-17 16:50 IJMC: Created
+    fstar_interp = np.interp(wmod, w_star, f_star)
+    filtmatrix = np.zeros((len(filter_splines), len(wmod)), float)
+    for jj, spline in enumerate(filter_splines):
+        filtmatrix[jj] = spline(wmod) * fstar_interp
+        filtmatrix[jj] /= filtmatrix[jj].sum()
+    return filtmatrix
+
+def modhaze_radspec_batch(params, wmod, rmod, rstar, retspec=False, filter_splines=None, w_star=None, f_star=None, filtmatrix=None, chunksize=None):
+    """Evaluate :func:`modhaze_radspec_simple` for many sets of haze
+    parameters at once.
+
+    :INPUTS:
+      params : 2D NumPy array
+        (N x 3) array: each row is [offset, slope, scaling factor],
+        as for :func:`modhaze_radspec_simple`.
+
+      wmod, rmod, rstar, retspec, filter_splines, w_star, f_star, filtmatrix :
+        As for :func:`modhaze_radspec_simple`.  Compute 'filtmatrix'
+        once (with :func:`modhaze_filtermatrix`) when calling this
+        repeatedly.
+
+      chunksize : None or int
+        Number of parameter sets to evaluate per matrix product
+        (to limit memory use).  If None, chosen so that each chunk
+        holds about four million spectral values.
+
+    :RETURNS:
+      If retspec, an (N x Nwavelength) array of model spectra.
+      Otherwise, an (N x Nfilter) array of filter-averaged values.
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        off, slope = np.meshgrid(np.linspace(0, 1e4, 100), np.linspace(-1e3, 0, 100))
+        grid = np.vstack((off.ravel(), slope.ravel(), np.ones(off.size))).T
+        fmat = transit.modhaze_filtermatrix(wmod, splines, w_star, f_star)
+        models = transit.modhaze_radspec_batch(grid, wmod, rmod, rstar, filtmatrix=fmat)
+        chisq = (((models - rp_obs) / rp_err)**2).sum(1)
+    """
+    # 2026-10-17 16:50 IJMC: Created
+    from analysis import rsun
+
+    params = np.array(params, dtype=float, ndmin=2)
+    wmod = np.array(wmod, dtype=float, copy=False)
+    rmod = np.array(rmod, dtype=float, copy=False)
+    nbatch, nwave = params.shape[0], wmod.size
+    if not retspec and filtmatrix is None:
+        filtmatrix = modhaze_filtermatrix(wmod, filter_splines, w_star, f_star)
+    if chunksize is None:
+        chunksize = max(1, 2**22 / nwave)
+
+    logw = np.log(wmod) / (rstar*rsun)
+    if retspec:
+        ret = np.zeros((nbatch, nwave), float)
+    else:
+        ret = np.zeros((nbatch, filtmatrix.shape[0]), float)
+
+    for i0 in xrange(0, nbatch, chunksize):
+        offset, hscale, mscale = params[i0:i0+chunksize].T.reshape(3, -1, 1)
+        newmod = hscale * logw
+        newmod += offset / (rstar*rsun)
+        np.maximum(newmod, mscale * rmod, out=newmod)
+        if retspec:
+            ret[i0:i0+chunksize] = newmod
+        else:
+            ret[i0:i0+chunksize] = np.dot(newmod, filtmatrix.T)
+
     return ret
 
 def createJKTEBOPinput(*args, **kw):
@@ -3347,7 +5494,10 @@ def JKTEBOP_lightcurve(v, vary, ldtype, nsine, psine, npoly, ppoly, time, dtype1
 
 
     :OPTIONS:
-      None (so far!)
+      nthreads : int
+        If >1, split 'time' into this many chunks and compute them in
+        parallel with a multiprocessing Pool (closed when done).  Only
+        worthwhile for long light curves.
 
     :NOTES:
       See the JKTEBOP documentation for more details.  JKTEBOP is
@@ -3361,6 +5511,11 @@ def JKTEBOP_lightcurve(v, vary, ldtype, nsine, psine, npoly, ppoly, time, dtype1
           OR
         f2py-2.7 -c --debug -m jktebop_mod jktebop.f90
 
+      If the compiled library (jktebop_f2py or, failing that,
+      jktebop_mod) contains the array routine 'getmodelarray', all
+      times are passed to Fortran in a single call.  Otherwise
+      'getmodel' is called once per time, which is much slower.
+
     :EXAMPLE:
       ::
 
@@ -3393,15 +5548,24 @@ def JKTEBOP_lightcurve(v, vary, ldtype, nsine, psine, npoly, ppoly, time, dtype1
 
       """
     # 2014-08-09 09:49 IJMC: Created.
-    
+    # 2026-10-16 20:30 IJMC: Use the array routine 'getmodelarray' when
+    #                        available; nthreads>1 now computes chunks of
+    #                        times in parallel, and closes its pool.
 
     # Do some basic error-trapping:
-    try:
-        import jktebop_f2py
-    except:
-        jktebop_f2py = -1
+    jktebop_lib = None
+    for libname in ['jktebop_f2py', 'jktebop_mod']:
+        try:
+            lib = __import__(libname)
+        except:
+            continue
+        if hasattr(lib, 'getmodelarray'):
+            jktebop_lib = lib
+            break
+        elif jktebop_lib is None and hasattr(lib, 'getmodel'):
+            jktebop_lib = lib
 
-    if not hasattr(jktebop_f2py, 'getmodel'):
+    if jktebop_lib is None:
         print "Could not load F2Py-compiled library 'jktebop_f2py', or it does"
         print "  not contain the necessary function 'getmodel.'  Aborting..."
         return -1
@@ -3415,28 +5579,28 @@ def JKTEBOP_lightcurve(v, vary, ldtype, nsine, psine, npoly, ppoly, time, dtype1
     
     if not hasattr(time, '__iter__'):
         time = np.array([time])
+    time = np.array(time, dtype=float, copy=False)
 
-    if nthreads>1:
+    if nthreads>1 and time.size>1:
         from multiprocessing import Pool
-        pool = Pool(processes=nthreads)
-
-
-    # Define a helper function:
-    def helper(all_args):
-        return jktebop_f2py.getmodel(*all_args)
+        chunks = [chunk for chunk in np.array_split(time, nthreads) if chunk.size>0]
+        pool = Pool(processes=min(nthreads, len(chunks)))
+        try:
+            magout = pool.map(JKTEBOP_lightcurve_helper, [(v, vary, ldtype, nsine, psine, npoly, ppoly, chunk, dtype1, la, lb, numint, ninterval) for chunk in chunks])
+        finally:
+            pool.close()
+            pool.join()
+        return np.concatenate(magout)
 
     # Now, run the code:
-    magout = np.zeros(time.size, dtype=float)
-    #magout2 = np.zeros(time.size, dtype=float)
-    for ii in xrange(time.size):
-        magout[ii] = jktebop_f2py.getmodel(v, vary, ldtype, nsine, psine, npoly, ppoly, time[ii], dtype1, la, lb, numint, ninterval)
-        #magout2[ii] = helper((v, vary, ldtype, nsine, psine, npoly, ppoly, time[ii], dtype1, la, lb, numint, ninterval))
-        
-    
-    #magout4 = np.array(pool.map(helper, [(v, vary, ldtype, nsine, psine, npoly, ppoly, time0, dtype1, la, lb, numint, ninterval) for time0 in time]))
-    
+    if hasattr(jktebop_lib, 'getmodelarray'):
+        magout = np.array(jktebop_lib.getmodelarray(v, vary, ldtype, nsine, psine, npoly, ppoly, time, dtype1, la, lb, numint, ninterval, time.size), dtype=float)
+    else:
+        magout = np.zeros(time.size, dtype=float)
+        for ii in xrange(time.size):
+            magout[ii] = jktebop_lib.getmodel(v, vary, ldtype, nsine, psine, npoly, ppoly, time[ii], dtype1, la, lb, numint, ninterval)
 
-    return magout#, magout2, magout3
+    return magout
 
 def JKTEBOP_lightcurve_helper(all_args):
     """
@@ -3461,7 +5625,9 @@ def JKTEBOP_lightcurve_helper(all_args):
 4  0.228  3.006  30.7
 
 
-    This method doesn't seem any faster!
+    This method doesn't seem any faster!  (Per-time calls are
+    dominated by Python overhead; JKTEBOP_lightcurve(..., nthreads=N)
+    now uses this helper on whole chunks of times instead.)
 
     """
     # 2014-08-10 10:30 IJMC: Created.
@@ -3470,12 +5636,171 @@ def JKTEBOP_lightcurve_helper(all_args):
 
 
 def computeInTransitIndex(time, period, tt, t14):
-    """REturn a boolean mask, True wherever the planet is in transit."""
+    """REturn a boolean mask, True wherever the planet is in transit.
+
+    For repeated queries, several planets, or very long time series,
+    see :class:`ephemerisindex`."""
     # 2014-08-11 17:39 IJMC: Created.
     modT = (time - tt) % period
     return (modT < t14/2.) + (modT > (period - t14/2.))
 
 
+class ephemerisindex:
+    """Precomputed index of transit (or eclipse) windows in a time series.
+
+    The windows of every event (each a linear ephemeris, e.g. the
+    transits or the secondary eclipses of one planet) are located in
+    the sorted time array with searchsorted, once.  Masks and epoch
+    numbers are then filled in from those index ranges; no modulo
+    arithmetic is done over the full time array.
+
+    :INPUTS:
+      time : 1D sequence
+        Time values; they need not be sorted.
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        ind = transit.ephemerisindex(time)
+        ind.add('b', tt_b, per_b, t14_b)
+        ind.add('b_ecl', tt_b, per_b, t14_b, phase=0.5)
+        ind.add('c', tt_c, per_c, t14_c)
+        oot = ind.outofwindow()           # out of all windows
+        epoch_b = ind.epoch('b')          # -1 if not in a 'b' transit
+        oot_c = ind.outofwindow('c')
+
+    :NOTES:
+      Building the index costs one sort of the time array (skipped if
+      it is already sorted), plus O(Nepoch log N) per event.  Each
+      mask or epoch query costs O(N + Nepoch).
+
+      Windows are open intervals, (Tc - duration/2, Tc + duration/2),
+      as in :func:`computeInTransitIndex`.
+
+    :SEE ALSO:
+      :func:`computeInTransitIndex`
+    """
+    # 2026-10-17 12:20 IJMC: Created
+    # 2026-10-17 21:05 IJMC: Added windowindices; look up epochs in
+    #                        indices() by bisection.
+
+    def __init__(self, time):
+        time = np.array(time, dtype=float, copy=False).ravel()
+        self.size = time.size
+        if time.size>1 and (np.diff(time) < 0).any():
+            self.order = np.argsort(time, kind='mergesort')
+            self.stime = time[self.order]
+        else:
+            self.order = None
+            self.stime = time
+        self.events = OrderedDict()
+
+    def add(self, label, tt, per, duration, phase=0.):
+        """Add an event: windows of the given duration centered on
+        times tt + per * (n + phase), for all integer n overlapping
+        the time series.  Returns the number of windows containing
+        any data."""
+        if duration >= per:
+            raise ValueError("Window duration (%s) must be shorter than the period (%s)." % (duration, per))
+        tcen = tt + per * phase
+        if self.size==0:
+            epochs = np.zeros(0, int)
+        else:
+            n0 = np.ceil((self.stime[0] - tcen - duration/2.) / per)
+            n1 = np.floor((self.stime[-1] - tcen + duration/2.) / per)
+            epochs = np.arange(n0, n1 + 1).astype(int)
+        centers = tcen + per * epochs
+        i0 = np.searchsorted(self.stime, centers - duration/2., 'right')
+        i1 = np.searchsorted(self.stime, centers + duration/2., 'left')
+        keep = i1 > i0
+        self.events[label] = dict(tt=tt, per=per, duration=duration, phase=phase, epochs=epochs[keep], i0=i0[keep], i1=i1[keep])
+        return keep.sum()
+
+    def _labels(self, label):
+        if label is None:
+            return self.events.keys()
+        elif isinstance(label, (list, tuple)):
+            return label
+        else:
+            return [label]
+
+    def _unsort(self, sorted_values):
+        if self.order is None:
+            return sorted_values
+        ret = np.empty(sorted_values.shape, sorted_values.dtype)
+        ret[self.order] = sorted_values
+        return ret
+
+    def windows(self, label):
+        """Return (epochs, i0, i1) for one event; points in window
+        'k' are sortedtime[i0[k]:i1[k]]."""
+        ev = self.events[label]
+        return ev['epochs'], ev['i0'], ev['i1']
+
+    def inwindow(self, label=None):
+        """Boolean mask: True wherever time falls inside a window of
+        the given event(s) -- one label, a list of labels, or (if
+        None) all events."""
+        marks = np.zeros(self.size + 1, int)
+        for lab in self._labels(label):
+            ev = self.events[lab]
+            np.add.at(marks, ev['i0'], 1)
+            np.add.at(marks, ev['i1'], -1)
+        return self._unsort(np.cumsum(marks[0:-1]) > 0)
+
+    def outofwindow(self, label=None):
+        """Boolean mask: True wherever time falls outside all windows
+        of the given event(s); see :meth:`inwindow`."""
+        return ~self.inwindow(label)
+
+    def epoch(self, label):
+        """Integer array: the epoch number of each time's window for
+        the given event, or -1 if it is in no window."""
+        ev = self.events[label]
+        ret = -np.ones(self.size, int)
+        ret[self._sortedindex(ev['i0'], ev['i1'])] = np.repeat(ev['epochs'], ev['i1'] - ev['i0'])
+        return self._unsort(ret)
+
+    def indices(self, label, epoch=None):
+        """Indices (into the original time array) of the points in the
+        windows of the given event -- all of them, or only those of
+        the given epoch(s)."""
+        epochs, i0, i1 = self.windows(label)
+        if epoch is not None:
+            # Epoch labels are sorted, so look them up by bisection:
+            epoch = np.unique(epoch)
+            pos = np.searchsorted(epochs, epoch).clip(0, max(0, epochs.size-1))
+            sel = pos[epochs[pos]==epoch] if epochs.size else pos[0:0]
+            i0, i1 = i0[sel], i1[sel]
+        ind = self._sortedindex(i0, i1)
+        if self.order is not None:
+            ind = np.sort(self.order[ind])
+        return ind
+
+    def windowindices(self, label):
+        """List of index arrays (into the original time array), one
+        per window of the given event, in the order of
+        :meth:`windows`.  Equivalent to calling :meth:`indices` once
+        per epoch, but done in a single pass."""
+        epochs, i0, i1 = self.windows(label)
+        counts = i1 - i0
+        ind = self._sortedindex(i0, i1)
+        if self.order is not None:
+            # Restore time order within each window with one sort
+            # keyed on (window, original index):
+            ind = self.order[ind]
+            ind = ind[np.lexsort((ind, np.repeat(np.arange(epochs.size), counts)))]
+        if epochs.size==0:
+            return []
+        return np.split(ind, np.cumsum(counts)[0:-1])
+
+    def _sortedindex(self, i0, i1):
+        """Concatenation of arange(i0[k], i1[k]) for all k."""
+        counts = i1 - i0
+        offsets = np.repeat(i0 - np.cumsum(counts) + counts, counts)
+        return np.arange(counts.sum()) + offsets
+
 def pldEclipse(params, tparams, time, vecs):
     """Simple toy model for Pixel-Level-Decorrelation testing.
 
@@ -3559,10 +5884,15 @@ def analyze_jktebop(guess_params, times, NL, NP, data2fit, weights=None, nwalker
     """
     Determine best fit and uncertainties on transits, eclipses, phasecurves.
 
-    
+    :NOTES:
+      Each model is computed by :func:`JKTEBOP_lightcurve`, which
+      evaluates all times in one call when the compiled library has
+      'getmodelarray'.  Parallelize over walkers with 'pool' (and
+      leave JKTEBOP_lightcurve's 'nthreads' at 1): pool workers
+      cannot start pools of their own.
 
     :SEE_ALSO:
-      :doc:`blender.modeltransit_jktebop`
+      :doc:`blender.modeltransit_jktebop`, :func:`JKTEBOP_lightcurve`
 
     returns:  bestfit, sampler, weights, bestmod
     """
@@ -3853,7 +6183,45 @@ def photoeccentric_maxprob(rho_circ, err_rho_circ, rho_star, err_rho_star, rho_s
 
     return ret
 
-def modeltransit_batman(params, time, limb_dark, NP=1, svs=None, numint=1, ninterval=0.):
+def _getbatmanmodel(batParams, time, numint=1, ninterval=0.):
+    """Return a batman.TransitModel for the given times, supersampling,
+    and limb-darkening type -- reusing a cached model if possible.
+
+    :NOTES:
+      Models are cached per thread (at most 'batman_cache_size' of
+      them) and keyed on limb_dark, numint, ninterval, and the time
+      array; a cache hit is only accepted if the stored time array
+      exactly matches 'time'.  For limb-darkening laws requiring
+      numerical integration, batman calibrates its integration step
+      size when the model is created, i.e. using the first set of
+      parameters passed in.
+    """
+    # 2026-10-16 16:05 IJMC: Created
+    import batman
+
+    try:
+        cache = _batman_cache.models
+    except AttributeError:
+        cache = _batman_cache.models = OrderedDict()
+
+    time = np.asarray(time)
+    key = (batParams.limb_dark, int(numint), float(ninterval), \
+               time.shape, time.dtype.str, hash(time.tostring()))
+
+    if key in cache:
+        tcache, m = cache[key]
+        if np.array_equal(tcache, time):
+            return m
+
+    m = batman.TransitModel(batParams, time, supersample_factor=numint, \
+                                exp_time=ninterval/86400.)
+    cache[key] = (time.copy(), m)
+    while len(cache) > batman_cache_size:
+        cache.popitem(last=False)
+
+    return m
+
+def modeltransit_batman(params, time, limb_dark, NP=1, svs=None, numint=1, ninterval=0., cache=True):
     """
     :INPUTS:
       params -- (8 + NP + NL + NS)-sequence with the following:
@@ -3908,11 +6276,19 @@ def modeltransit_batman(params, time, limb_dark, NP=1, svs=None, numint=1, ninte
       the numerical integration occupies a total time interval of
       NINTERVAL seconds.
 
+    cache : bool
+      If True, reuse the batman.TransitModel object from previous
+      calls with the same 'time', 'numint', 'ninterval', and
+      limb-darkening type (so that only the light curve itself is
+      recomputed).  Caches are kept separately for each thread.  See
+      :func:`_getbatmanmodel`.
+
     """
     # 2015-10-29 16:19 IJMC: Created from my previous JKTEBOP version.
     # 2015-11-05 17:06 IJMC: Added second-light constraints
     # 2015-11-18 13:08 IJMC: Moved into `transit.py`
     # 2015-11-19 10:02 IJMC: dilution is now entered as log10
+    # 2026-10-16 16:05 IJMC: Added 'cache' option.
     import batman
 
     nbasic = 8
@@ -3949,7 +6325,10 @@ def modeltransit_batman(params, time, limb_dark, NP=1, svs=None, numint=1, ninte
     nparam = len(params) - nsvs
 
     try:
-        m = batman.TransitModel(batParams, time, supersample_factor=numint, exp_time=ninterval/86400.)
+        if cache:
+            m = _getbatmanmodel(batParams, time, numint, ninterval)
+        else:
+            m = batman.TransitModel(batParams, time, supersample_factor=numint, exp_time=ninterval/86400.)
         lightCurve = m.light_curve(batParams)
     except:
         lightCurve = -np.ones(time.shape)
@@ -4011,28 +6390,207 @@ def get_ldtype(limb_dark):
     return limb_dark, NL
 
     
-def quickEclipseLimit(time, data, t0, per, t14, ntrials=100, transitModel=None):
+def quickEclipseLimit(time, data, t0, per, t14, ntrials=100, transitModel=None, retall=False):
     """Quick 'n' Dirty computation of 3-sigma upper limit to eclipse depth.
+
+    A box-shaped eclipse of duration t14 is fit (with a free
+    baseline) at each of 'ntrials' orbital phases, using only
+    out-of-transit data; the limit is the 99.865th percentile of the
+    resulting depths.
+
+    :INPUTS:
+      time, data -- 1D arrays: the light curve.
+
+      t0, per, t14 -- transit ephemeris and duration (transits are
+                      masked out).
+
+    :OPTIONS:
+      ntrials -- number of trial eclipse phases.
+
+      transitModel -- if not None, the data are divided by this
+                      (e.g., a best-fit transit model) first.
+
+      retall -- if True, return (limit, trial phases, trial depths)
+
+    :NOTES:
+      All trial fits are solved at once: the least-squares depth of a
+      box with a free baseline is just the mean of the out-of-box
+      data minus the mean of the in-box data, and these are
+      evaluated for every trial from cumulative sums of the
+      phase-sorted data.  Trials with no data in (or out of) the box
+      are ignored.
+
+    :SEE ALSO:
+      :func:`eclipseInjectionRecovery`
     """
     # 2015-12-07 17:00 IJMC: Created
-    from analysis import lsq, dumbconf
+    # 2026-10-17 11:30 IJMC: All trials now solved at once, in closed form;
+    #                        trial boxes are centered on their trial phase
+    #                        (measured from t0).  Added 'retall' option.
+
+    phase, vdata = _eclipsevalid(time, data, t0, per, t14, transitModel)
+    sphase, csum, ccount = _eclipsecumsum(phase, vdata)
+
+    t0trials = np.linspace(phase.min(), phase.max(), ntrials)
+    edepths = _eclipseboxdepths(sphase, csum, ccount, per, t0trials - t14/2., t0trials + t14/2.)
+    limit = _eclipselimit(edepths)
+
+    if retall:
+        ret = limit, t0trials, edepths
+    else:
+        ret = limit
+    return ret
+
+def eclipseInjectionRecovery(time, data, t0, per, t14, depths, durations=None, ntrials=100, transitModel=None):
+    """Injection-recovery test for box-shaped secondary eclipses.
+
+    For each combination of eclipse depth and duration, an eclipse is
+    injected in turn at each of 'ntrials' orbital phases.  Each time,
+    the light curve is then searched at all of those phases (as in
+    :func:`quickEclipseLimit`).  An injected eclipse counts as
+    recovered if the deepest eclipse found exceeds the 3-sigma
+    limit from the un-injected data (at that duration), and lies
+    within half a duration of the injected phase.
+
+    :INPUTS:
+      time, data -- 1D arrays: the light curve.
+
+      t0, per, t14 -- transit ephemeris and duration (transits are
+                      masked out).
+
+      depths -- sequence of eclipse depths to inject (in units of
+                the normalized flux).
+
+    :OPTIONS:
+      durations -- sequence of eclipse durations.  Defaults to [t14].
+
+      ntrials -- number of trial eclipse phases.
+
+      transitModel -- if not None, the data are divided by this
+                      (e.g., a best-fit transit model) first.
+
+    :RETURNS:
+      a dict with the following keys:
+        depths, durations -- as input
+        phases -- the trial phases, measured from t0
+        fraction -- (Ndepth x Nduration) fraction recovered
+        limit -- (Nduration) 3-sigma limits from un-injected data
+        detected -- (Ndepth x Nduration x Ntrials) boolean array
+        recovered -- (Ndepth x Nduration x Ntrials) fitted depth at
+                     the injected phase
+
+    :EXAMPLE:
+      ::
+
+        import transit
+        depths = np.linspace(0, 1e-3, 21)
+        durs = np.array([0.5, 1., 1.5]) * t14
+        out = transit.eclipseInjectionRecovery(time, flux, t0, per, t14, depths, durs)
+        py.contourf(durs, depths, out['fraction'])
+
+    :NOTES:
+      Nothing is actually re-fit: the box fits are linear, so the
+      fitted depths with an eclipse injected follow exactly from those
+      without it plus the number of points shared by the injected
+      and trial boxes.  All (depth, duration, injection, trial)
+      combinations are thus evaluated with array operations.
+    """
+    # 2026-10-17 11:30 IJMC: Created
+
+    depths = np.array(depths, dtype=float, ndmin=1)
+    if durations is None:
+        durations = [t14]
+    durations = np.array(durations, dtype=float, ndmin=1)
+
+    phase, vdata = _eclipsevalid(time, data, t0, per, t14, transitModel)
+    sphase, csum, ccount = _eclipsecumsum(phase, vdata)
+    ntot, stot = ccount[-1], csum[-1]
+    phases = np.linspace(phase.min(), phase.max(), ntrials)
+    trials = np.arange(ntrials)
+
+    ndep, ndur = depths.size, durations.size
+    limit = np.zeros(ndur, float)
+    detected = np.zeros((ndep, ndur, ntrials), bool)
+    recovered = np.zeros((ndep, ndur, ntrials), float)
+
+    for jj in xrange(ndur):
+        lo, hi = phases - durations[jj]/2., phases + durations[jj]/2.
+        nin, sin = _eclipseboxsums(sphase, csum, ccount, per, lo, hi)
+        limit[jj] = _eclipselimit(_eclipseboxdepths(sphase, csum, ccount, per, lo, hi))
+
+        # Points shared by injected box (rows) and trial box (columns):
+        shift = per * np.round((phases.reshape(ntrials, 1) - phases) / per)
+        olo = np.maximum(lo.reshape(ntrials, 1), lo + shift)
+        ohi = np.maximum(olo, np.minimum(hi.reshape(ntrials, 1), hi + shift))
+        nshared = _eclipseboxsums(sphase, csum, ccount, per, olo, ohi)[0]
+
+        nout = ntot - nin
+        usable = (nin > 0) * (nout > 0)
+        nin1, nout1 = np.maximum(nin, 1), np.maximum(nout, 1)
+        null = (stot - sin) / nout1 - sin / nin1
+        # Fitted depth per unit injected depth:
+        response = nshared / nin1 - (nin.reshape(ntrials, 1) - nshared) / nout1
+        for ii in xrange(ndep):
+            fitdepths = null + depths[ii] * response
+            fitdepths[:, ~usable] = -np.inf
+            best = fitdepths.argmax(1)
+            dphase = np.abs(phases[best] - phases)
+            dphase = np.minimum(dphase, per - dphase)
+            detected[ii,jj] = usable * (fitdepths[trials, best] > limit[jj]) * (dphase <= durations[jj]/2.)
+            recovered[ii,jj] = np.where(usable, fitdepths[trials, trials], np.nan)
+
+    nusable = np.isfinite(recovered[0]).sum(-1)
+    fraction = detected.sum(-1) / np.maximum(nusable, 1).astype(float)
+
+    return dict(depths=depths, durations=durations, phases=phases, fraction=fraction, limit=limit, detected=detected, recovered=recovered)
+
+def _eclipsevalid(time, data, t0, per, t14, transitModel):
+    """Out-of-transit orbital phases and normalized data, for
+    :func:`quickEclipseLimit` and :func:`eclipseInjectionRecovery`."""
+    # 2026-10-17 11:30 IJMC: Split out of quickEclipseLimit
+    from analysis import dumbconf
 
     phase = ((time - t0) % per ) 
     oot = (phase > (1.5*t14)) * (phase < (per-1.5*t14))
     if transitModel is None: transitModel = np.ones(data.size)*np.median(data[oot])
     valid = oot * ((time - time.min()) > (t14/2.)) * ((time.max() - time) > (t14/2.)) * \
             (np.abs(data / transitModel - 1.) <= (5 * dumbconf(data/transitModel, .683)[0]))
-    nvalid  = valid.sum()
-    baseline = np.ones(nvalid, float)
-    vdata = (data/transitModel)[valid]
-
-    t0trials = np.linspace(phase.min(), phase.max(), ntrials)
-    edepths = np.zeros(ntrials, float)
-
-    for ii in xrange(ntrials):
-        model = np.zeros(nvalid, float)
-        model[(np.abs(time[valid] - t0trials[ii]) % per) <= t14/2.] = -1.
-        out, junk = lsq(np.vstack((baseline, model)).T, vdata, checkvals=False)
-        edepths[ii] = out[1]
-
-    return dumbconf(edepths, .00135, 'lower')[0]
+    return phase[valid], (data/transitModel)[valid]
+
+def _eclipsecumsum(phase, vdata):
+    """Sorted phases and cumulative sums (with a leading zero) of data
+    and counts."""
+    # 2026-10-17 11:30 IJMC: Created
+    order = np.argsort(phase)
+    csum = np.concatenate(([0.], np.cumsum(vdata[order])))
+    ccount = np.arange(phase.size + 1)
+    return phase[order], csum, ccount
+
+def _eclipseboxsums(sphase, csum, ccount, per, lo, hi):
+    """Number and sum of data points with phases in [lo, hi), for
+    arrays of box edges 'lo' and 'hi' (wrapping in phase as needed)."""
+    # 2026-10-17 11:30 IJMC: Created
+    def cumulative(x):
+        nwrap = np.floor(x / per)
+        ind = np.searchsorted(sphase, x - nwrap * per)
+        return ccount[ind] + nwrap * ccount[-1], csum[ind] + nwrap * csum[-1]
+    nlo, slo = cumulative(lo)
+    nhi, shi = cumulative(hi)
+    return nhi - nlo, shi - slo
+
+def _eclipseboxdepths(sphase, csum, ccount, per, lo, hi):
+    """Least-squares depths of boxes [lo, hi) with a free baseline;
+    NaN where a box contains all or none of the data."""
+    # 2026-10-17 11:30 IJMC: Created
+    nin, sin = _eclipseboxsums(sphase, csum, ccount, per, lo, hi)
+    nout = ccount[-1] - nin
+    edepths = np.zeros(nin.shape, float) + np.nan
+    ok = (nin > 0) * (nout > 0)
+    edepths[ok] = (csum[-1] - sin[ok]) / nout[ok] - sin[ok] / nin[ok]
+    return edepths
+
+def _eclipselimit(edepths):
+    """3-sigma (99.865th percentile) limit from a set of trial depths."""
+    # 2026-10-17 11:30 IJMC: Created
+    from analysis import dumbconf
+    return dumbconf(edepths[np.isfinite(edepths)], .00135, 'lower')[0]
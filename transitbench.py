@@ -0,0 +1,317 @@
+"""
+Speed and accuracy benchmarks for the transit light-curve models in
+:doc:`transit`.
+
+Each model is timed over a grid of array sizes and planet/star
+radius ratios, and compared against a high-precision reference light
+curve computed by direct numerical integration of the limb-darkened
+intensity over the occulted area (:func:`reference_lightcurve`).
+Every (model, p) case runs in a separate process with a time limit,
+so cases that hang (cf. the warning about p<0.09 and p>0.5 in
+:doc:`transit`) are reported as timeouts rather than stalling the
+benchmark.
+
+:EXAMPLE:
+   ::
+
+     import transitbench
+     results = transitbench.runbenchmarks(outfile='bench.json')
+
+   or, from the command line::
+
+     python transitbench.py bench.json
+
+   Each line of the output file is a JSON record with keys 'model',
+   'size', 'p', 'seconds' (per call), 'throughput' (points per
+   second), 'maxdev' (maximum absolute deviation from the reference)
+   and 'status' ('ok', 'timeout', 'skipped', or an error message).
+
+:REQUIREMENTS:
+   `numpy <http://www.numpy.org/>`_
+
+   `scipy <http://www.scipy.org/>`_
+
+   :doc:`transit`
+
+   `batman <https://github.com/lkreidberg/batman>`_ (optional)
+"""
+# 2026-10-17 15:20 IJMC: Created
+
+import numpy as np
+import time
+import transit
+
+
+default_sizes = [10**2, 10**3, 10**4, 10**5, 10**6, 10**7]
+default_pvalues = [0.01, 0.05, 0.085, 0.1, 0.2, 0.5, 0.6, 0.9]
+default_models = ['occultuniform', 'occultquad', 'occultnonlin', 'occultnonlin_small', 'modeltransit_general', 'modeltransit_batman']
+
+# Limb-darkening coefficients used for all benchmarks:
+quadcoef = [0.4, 0.25]
+nonlincoef = [0.6, -0.3, 0.5, -0.2]
+
+# Orbit used for modeltransit_general and modeltransit_batman:
+# [Tc, P, inc, a/R*]
+orbit = [0., 3., 89., 10.]
+
+
+def intensity(r, law, coefs):
+    """Stellar intensity profile at radius r (in units of R*)."""
+    mu = np.sqrt(np.maximum(0., 1. - r*r))
+    if law=='uniform':
+        return np.ones(np.shape(r))
+    elif law=='quadratic':
+        return 1. - coefs[0] * (1. - mu) - coefs[1] * (1. - mu)**2
+    elif law=='nonlinear':
+        ret = 1.
+        for ii in xrange(4):
+            ret = ret - coefs[ii] * (1. - mu**(0.5*(ii+1)))
+        return ret
+    else:
+        raise ValueError("law must be 'uniform', 'quadratic', or 'nonlinear' (you set %s)" % law)
+
+
+def reference_lightcurve(z, p, law='uniform', coefs=None, epsabs=1e-13, epsrel=1e-12):
+    """High-precision transit light curve by direct integration.
+
+    :INPUTS:
+      z -- sequence of star-planet separations (in units of R*)
+
+      p -- planet/star radius ratio
+
+      law -- 'uniform', 'quadratic', or 'nonlinear'
+
+      coefs -- limb-darkening coefficients (2 or 4 of them)
+
+    :NOTES:
+      The flux blocked is the integral over stellar radius r of
+      I(r) * 2 r * alpha(r), where 2 alpha(r) is the angle of the
+      annulus at radius r covered by the planet.  This is computed
+      with adaptive quadrature, splitting at the kinks at r = |z-p|.
+      It is slow (about a millisecond per point), but independent of
+      all the elliptic-integral machinery in :doc:`transit`.
+    """
+    # 2026-10-17 15:20 IJMC: Created
+    from scipy import integrate
+
+    z = np.array(z, dtype=float, ndmin=1)
+    norm = integrate.quad(lambda r: intensity(r, law, coefs) * 2 * np.pi * r, 0., 1., epsabs=epsabs, epsrel=epsrel)[0]
+
+    def annulus(r, zz):
+        if zz==0:
+            return np.pi * (r < p)
+        cosalpha = (r*r + zz*zz - p*p) / (2. * r * zz)
+        return np.arccos(min(1., max(-1., cosalpha)))
+
+    F = np.ones(z.size, float)
+    for ii, zz in enumerate(z):
+        rmin, rmax = max(0., zz - p), min(1., zz + p)
+        if rmin >= rmax:
+            continue
+        edges = [rmin, rmax]
+        if rmin < abs(p - zz) < rmax:
+            edges.insert(1, abs(p - zz))
+        blocked = 0.
+        for r0, r1 in zip(edges[0:-1], edges[1:]):
+            blocked += integrate.quad(lambda r: intensity(r, law, coefs) * 2 * r * annulus(r, zz), r0, r1, epsabs=epsabs, epsrel=epsrel, limit=200)[0]
+        F[ii] = 1. - blocked / norm
+    return F
+
+
+def zgrid(size, p):
+    """Star-planet separations spanning a full transit."""
+    return np.abs(np.linspace(-(1. + p) * 1.1, (1. + p) * 1.1, size))
+
+
+def tgrid(size, p):
+    """Times spanning a full transit, for the orbit in
+    transitbench.orbit."""
+    tc, per, inc, ars = orbit
+    b = ars * np.cos(inc * np.pi / 180.)
+    t14 = per / np.pi * np.arcsin(min(1., np.sqrt(max(0., (1. + p)**2 - b**2)) / ars))
+    return np.linspace(tc - 0.75*t14, tc + 0.75*t14, size)
+
+
+def getcase(model, size, p):
+    """Return (function, args, law, coefs, z) for one benchmark; 'z'
+    are the separations at which the model is evaluated."""
+    # 2026-10-17 15:20 IJMC: Created
+    if model=='occultuniform':
+        z = zgrid(size, p)
+        return transit.occultuniform, (z, p), 'uniform', None, z
+    elif model=='occultquad':
+        z = zgrid(size, p)
+        return transit.occultquad, (z, p, quadcoef), 'quadratic', quadcoef, z
+    elif model=='occultnonlin':
+        z = zgrid(size, p)
+        return transit.occultnonlin, (z, p, nonlincoef), 'nonlinear', nonlincoef, z
+    elif model=='occultnonlin_small':
+        z = zgrid(size, p)
+        return transit.occultnonlin_small, (z, p, nonlincoef), 'nonlinear', nonlincoef, z
+    elif model=='modeltransit_general':
+        tc, per, inc, ars = orbit
+        t = tgrid(size, p)
+        z = transit.t2z(tc, per, inc, t, ars, transitonly=True)
+        params = [tc, per, inc, 1./ars, p, 1.] + quadcoef
+        return transit.modeltransit_general, (params, t, 2, 1), 'quadratic', quadcoef, z
+    elif model=='modeltransit_batman':
+        tc, per, inc, ars = orbit
+        t = tgrid(size, p)
+        z = transit.t2z(tc, per, inc, t, ars, transitonly=True)
+        params = [tc, per, inc, ars, p, 0., 90., -16., 1.] + quadcoef
+        return transit.modeltransit_batman, (params, t, 'quadratic', 1), 'quadratic', quadcoef, z
+    else:
+        raise ValueError("Unknown model: %s" % model)
+
+
+def timecase(model, size, p, mintime=0.2, nref=200):
+    """Time one (model, size, p) case and measure its accuracy.
+
+    :INPUTS:
+      model -- name of the model (one of transitbench.default_models)
+
+      size -- number of points per model evaluation
+
+      p -- planet/star radius ratio
+
+    :OPTIONS:
+      mintime -- repeat the model call until at least this many
+                 seconds have elapsed.
+
+      nref -- number of points (spread evenly through the light
+              curve) compared with :func:`reference_lightcurve`.
+
+    :RETURNS:
+      a dict; see :doc:`transitbench`.
+    """
+    # 2026-10-17 15:20 IJMC: Created
+    if model=='modeltransit_batman':
+        try:
+            import batman
+        except ImportError:
+            return dict(model=model, size=size, p=p, seconds=None, throughput=None, maxdev=None, status='skipped: batman not installed')
+
+    func, args, law, coefs, z = getcase(model, size, p)
+    ncall = 0
+    tic = time.time()
+    while True:
+        flux = func(*args)
+        ncall += 1
+        elapsed = time.time() - tic
+        if elapsed >= mintime:
+            break
+    seconds = elapsed / ncall
+
+    ind = np.unique(np.linspace(0, size - 1, min(nref, size)).astype(int))
+    flux = np.array(flux, dtype=float, copy=False).ravel()
+    ref = reference_lightcurve(z[ind], p, law, coefs)
+    dev = np.abs(flux[ind] - ref)
+    if np.isfinite(dev).all():
+        maxdev = float(dev.max())
+    else:
+        maxdev = float('nan')
+
+    return dict(model=model, size=size, p=p, seconds=seconds, throughput=size / seconds, maxdev=maxdev, status='ok')
+
+
+def _timecase_helper(args):
+    """Helper for :func:`runbenchmarks` (runs in a worker process)."""
+    model, size, p, mintime, nref = args
+    try:
+        res = timecase(model, size, p, mintime=mintime, nref=nref)
+    except Exception, e:
+        res = dict(model=model, size=size, p=p, seconds=None, throughput=None, maxdev=None, status='error: %s' % e)
+    return res
+
+
+def runbenchmarks(models=None, sizes=None, pvalues=None, timeout=120., maxcall=5., mintime=0.2, nref=200, outfile=None, verbose=True):
+    """Run the benchmark matrix.
+
+    :OPTIONS:
+      models -- names of models to run (default: transitbench.default_models)
+
+      sizes -- array sizes (default: 10^2 through 10^7)
+
+      pvalues -- planet/star radius ratios (default:
+                 transitbench.default_pvalues, which include p<0.09
+                 and p>0.5)
+
+      timeout -- time limit (seconds) for each (model, size, p)
+                 case.  A case that exceeds it is reported as a
+                 'timeout', and larger sizes are skipped.
+
+      maxcall -- once a single model call takes longer than this
+                 (seconds), larger sizes are skipped.  If a case fails
+                 (or is skipped), larger sizes are reported with the
+                 same status.
+
+      mintime, nref -- see :func:`timecase`
+
+      outfile -- if not None, write the results to this file, one
+                 JSON record per line.
+
+      verbose -- if True, print a summary line for each result.
+
+    :RETURNS:
+      a list of dicts, one per (model, size, p); see :doc:`transitbench`.
+    """
+    # 2026-10-17 15:20 IJMC: Created
+    # 2026-10-17 19:55 IJMC: Failed cases no longer reported as 'too slow'.
+    from multiprocessing import Pool, TimeoutError
+    import json
+
+    if models is None:
+        models = default_models
+    if sizes is None:
+        sizes = default_sizes
+    if pvalues is None:
+        pvalues = default_pvalues
+    sizes = sorted(sizes)
+
+    results = []
+    for model in models:
+        for p in pvalues:
+            # Each (model, p) gets its own worker process, in increasing
+            # order of size, until a call is too slow or hangs:
+            pool = Pool(processes=1)
+            status = None
+            for size in sizes:
+                if status is None:
+                    job = pool.apply_async(_timecase_helper, ((model, size, p, mintime, nref),))
+                    try:
+                        res = job.get(timeout)
+                        if res['status']<>'ok':
+                            # Errors and missing dependencies won't
+                            # go away at larger sizes:
+                            status = res['status']
+                        elif res['seconds'] > maxcall:
+                            status = 'skipped: too slow'
+                    except TimeoutError:
+                        res = dict(model=model, size=size, p=p, seconds=None, throughput=None, maxdev=None, status='timeout')
+                        status = 'skipped: timed out at smaller size'
+                else:
+                    res = dict(model=model, size=size, p=p, seconds=None, throughput=None, maxdev=None, status=status)
+                results.append(res)
+                if verbose:
+                    if res['status']=='ok':
+                        print "%-22s p=%-6g N=%-9i %10.3g pts/s  maxdev=%8.2g" % (model, p, size, res['throughput'], res['maxdev'])
+                    else:
+                        print "%-22s p=%-6g N=%-9i %s" % (model, p, size, res['status'])
+            pool.terminate()
+            pool.join()
+
+    if outfile is not None:
+        f = open(outfile, 'w')
+        for res in results:
+            f.write(json.dumps(res) + '\n')
+        f.close()
+
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        runbenchmarks(outfile=sys.argv[1])
+    else:
+        runbenchmarks()